@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Measures singer-check-tap validation throughput in records/sec.
+
+Replays the records in samples/fixerio-valid-initial.json until the
+requested number of records has been produced and times
+summarize_output over the result.
+
+    python benchmarks/bench_check_tap.py --records 100000 --workers 4
+"""
+
+import argparse
+import os
+import time
+
+from singertools import messages
+from singertools.check_tap import summarize_output
+
+SAMPLE = os.path.join(os.path.dirname(__file__), '..', 'samples',
+                      'fixerio-valid-initial.json')
+
+
+def build_lines(num_records):
+    with open(SAMPLE) as sample:
+        lines = sample.readlines()
+    schemas = [l for l in lines if '"SCHEMA"' in l]
+    records = [l for l in lines if '"RECORD"' in l]
+    out = list(schemas)
+    while len(out) - len(schemas) < num_records:
+        out.extend(records)
+    return out[:len(schemas) + num_records]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--records', type=int, default=50000)
+    parser.add_argument('-w', '--workers', type=int, default=1)
+    parser.add_argument('--decoder', choices=sorted(messages.DECODERS),
+                        default=messages.DECODER)
+    args = parser.parse_args()
+    messages.set_decoder(args.decoder)
+
+    lines = build_lines(args.records)
+    start = time.perf_counter()
+    summary = summarize_output(lines, args.workers)
+    elapsed = time.perf_counter() - start
+    print('{} records in {:.2f}s: {:.0f} records/sec'.format(
+        summary.num_records(), elapsed, summary.num_records() / elapsed))
+    print('decoding ({}) {:.2f}s, validation {:.2f}s'.format(
+        messages.DECODER, summary.parse_seconds, summary.validation_seconds))
+
+
+if __name__ == '__main__':
+    main()
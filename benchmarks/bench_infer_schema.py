@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Measures singer-infer-schema throughput in records/sec.
+
+Replays the valid RECORD messages from the files in samples/ until the
+requested number of records has been produced and times infer_schemas
+over the result.
+
+    python benchmarks/bench_infer_schema.py --records 100000 --workers 4
+"""
+
+import argparse
+import glob
+import io
+import os
+import time
+from contextlib import redirect_stdout
+
+from singertools import messages
+from singertools.infer_schema import infer_schemas
+
+SAMPLES = os.path.join(os.path.dirname(__file__), '..', 'samples')
+
+
+def build_lines(num_records):
+    records = []
+    for path in sorted(glob.glob(os.path.join(SAMPLES, 'fixerio-valid-*.json'))):
+        with open(path) as sample:
+            records.extend(l for l in sample if '"RECORD"' in l)
+    out = []
+    while len(out) < num_records:
+        out.extend(records)
+    return out[:num_records]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--records', type=int, default=50000)
+    parser.add_argument('-w', '--workers', type=int, default=1)
+    parser.add_argument('--decoder', choices=sorted(messages.DECODERS),
+                        default=messages.DECODER)
+    args = parser.parse_args()
+    messages.set_decoder(args.decoder)
+
+    lines = build_lines(args.records)
+    start = time.perf_counter()
+    for line in lines:
+        messages.loads(line)
+    print('decoding ({}) {:.2f}s'.format(messages.DECODER, time.perf_counter() - start))
+
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        infer_schemas(lines, None, workers=args.workers)
+    elapsed = time.perf_counter() - start
+    print('{} records in {:.2f}s: {:.0f} records/sec'.format(
+        len(lines), elapsed, len(lines) / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""Micro-benchmark for infer_schema's add_observations on deeply nested
+and on wide records.
+
+    python benchmarks/bench_observations.py --depth 200 --width 1000
+"""
+
+import argparse
+import time
+
+from singertools.infer_schema import add_observations
+
+
+def nested_record(depth):
+    record = {"leaf": 1, "items": [1, 2, 3]}
+    for i in range(depth):
+        record = {"level{}".format(i): record, "value": "x"}
+    return record
+
+
+def wide_record(width):
+    return {"field{}".format(i): i if i % 2 else "x" for i in range(width)}
+
+
+def bench(name, record, repeat):
+    acc = {}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        add_observations(acc, [], record)
+    elapsed = time.perf_counter() - start
+    print('{}: {} records in {:.2f}s: {:.0f} records/sec'.format(
+        name, repeat, elapsed, repeat / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--depth', type=int, default=200)
+    parser.add_argument('--width', type=int, default=1000)
+    parser.add_argument('-n', '--records', type=int, default=2000)
+    args = parser.parse_args()
+
+    bench('nested (depth {})'.format(args.depth), nested_record(args.depth), args.records)
+    bench('wide (width {})'.format(args.width), wide_record(args.width), args.records)
+
+
+if __name__ == '__main__':
+    main()
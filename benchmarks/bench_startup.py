@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Checks that the console scripts' modules import quickly.
+
+Each module is imported in a fresh interpreter under `python -X
+importtime`, a few times, and the fastest cumulative import time is
+compared against its budget. The run fails if any module is over budget,
+or if importing it pulls in one of the slow modules that should only be
+imported when they're used.
+
+    python benchmarks/bench_startup.py --runs 5 --scale 1.5
+"""
+
+import argparse
+import subprocess
+import sys
+
+# Milliseconds each entry point's module may take to import, including
+# everything it imports
+BUDGETS_MS = {
+    'singertools.check_tap': 120,
+    'singertools.infer_schema': 90,
+    'singertools.diff_jsonl': 80,
+    'singertools.release': 40,
+}
+
+# Modules that are slow to import and only needed on some code paths
+DEFERRED = ['asyncio', 'concurrent.futures.process', 'dateutil', 'jsonschema', 'singer',
+            'terminaltables', 'zstandard']
+
+
+def import_times(module):
+    """Imports module in a new interpreter and returns the cumulative
+    import time of each module it imported, in microseconds."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                            stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--runs', type=int, default=5,
+                        help='Imports of each module to take the fastest of')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='Multiply the budgets by this, for slower machines')
+    args = parser.parse_args()
+
+    failed = False
+    for module, budget in sorted(BUDGETS_MS.items()):
+        runs = [import_times(module) for _ in range(args.runs)]
+        fastest = min(times[module] for times in runs) / 1000
+        allowed = budget * args.scale
+        deferred = sorted(name for name in runs[0]
+                          if any(name == d or name.startswith(d + '.') for d in DEFERRED))
+        ok = fastest <= allowed and not deferred
+        failed = failed or not ok
+        print('{:28} {:7.1f}ms (budget {:.0f}ms) {}'.format(
+            module, fastest, allowed, 'ok' if ok else 'FAILED'))
+        if deferred:
+            print('    imports {}'.format(', '.join(deferred)))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""A stand-in tap for benchmarking singer-check-tap without a network.
+
+Takes the usual --config and --state arguments. The config selects what
+to emit:
+
+    {"replay": "samples/fixerio-valid-initial.json", "repeat": 100}
+
+replays a captured tap output file, repeated, while
+
+    {"synthetic": {"records": 100000, "streams": 3, "width": 20, "depth": 2}}
+
+generates records with `width` fields per level and `depth` levels of
+nested objects, spread round-robin over `streams` streams. Synthetic
+streams are bookmarked by id: with --state, each stream resumes from
+(and re-emits) its bookmarked record.
+
+Optional config keys:
+
+    rate         records per second to emit at most (default unlimited)
+    state_every  emit a STATE message every this many records (default 1000)
+    stats_path   write {"records", "seconds", "blocked_seconds"} here on
+                 exit, where blocked_seconds is time spent waiting to
+                 write to stdout, i.e. pipe backpressure from the checker
+"""
+
+import argparse
+import json
+import sys
+import time
+
+FLUSH_EVERY = 100
+
+
+def synthetic_schema(width, depth):
+    properties = {'field{}'.format(i): {'type': ['null', 'string']} for i in range(width)}
+    if depth > 1:
+        properties['nested'] = synthetic_schema(width, depth - 1)
+    return {'type': ['null', 'object'], 'properties': properties}
+
+
+def synthetic_value(width, depth, i):
+    value = {'field{}'.format(j): 'value-{}-{}'.format(i, j) for j in range(width)}
+    if depth > 1:
+        value['nested'] = synthetic_value(width, depth - 1, i)
+    return value
+
+
+def synthetic_lines(spec, state):
+    num_streams = spec.get('streams', 1)
+    width = spec.get('width', 10)
+    depth = spec.get('depth', 1)
+    names = ['stream{}'.format(i) for i in range(num_streams)]
+    schema = synthetic_schema(width, depth)
+    schema['properties']['id'] = {'type': 'integer'}
+    schema['properties']['updated_at'] = {'type': 'string', 'format': 'date-time'}
+
+    bookmarks = dict((state or {}).get('bookmarks', {}))
+    for name in names:
+        yield json.dumps({'type': 'SCHEMA', 'stream': name, 'schema': schema,
+                          'key_properties': ['id'], 'bookmark_properties': ['id']}), None
+
+    for i in range(spec.get('records', 1000)):
+        name = names[i % num_streams]
+        if i < bookmarks.get(name, 0):
+            continue
+        record = synthetic_value(width, depth, i)
+        record['id'] = i
+        record['updated_at'] = '2017-01-01T00:00:00Z'
+        bookmarks[name] = i
+        yield json.dumps({'type': 'RECORD', 'stream': name, 'record': record}), bookmarks
+
+
+def replay_lines(path, repeat):
+    for _ in range(repeat):
+        with open(path) as replay_file:
+            for line in replay_file:
+                line = line.rstrip('\n')
+                yield line, None if '"RECORD"' not in line else {}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--config', required=True)
+    parser.add_argument('-s', '--state')
+    args = parser.parse_args()
+
+    with open(args.config) as config_file:
+        config = json.load(config_file)
+    state = None
+    if args.state:
+        with open(args.state) as state_file:
+            state = json.load(state_file)
+
+    if 'synthetic' in config:
+        lines = synthetic_lines(config['synthetic'], state)
+    else:
+        lines = replay_lines(config['replay'], config.get('repeat', 1))
+
+    rate = config.get('rate')
+    state_every = config.get('state_every', 1000)
+    out = sys.stdout
+    start = time.perf_counter()
+    blocked = 0.0
+    records = 0
+    bookmarks = None
+    pending = []
+    for line, record_bookmarks in lines:
+        pending.append(line)
+        if record_bookmarks is not None:
+            records += 1
+            bookmarks = record_bookmarks
+            if records % state_every == 0:
+                pending.append(json.dumps({'type': 'STATE', 'value': {'bookmarks': bookmarks}}))
+            if rate:
+                ahead = records / rate - (time.perf_counter() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+        if len(pending) >= FLUSH_EVERY or rate:
+            write_start = time.perf_counter()
+            out.write('\n'.join(pending) + '\n')
+            out.flush()
+            blocked += time.perf_counter() - write_start
+            pending = []
+
+    if bookmarks is not None:
+        pending.append(json.dumps({'type': 'STATE', 'value': {'bookmarks': bookmarks}}))
+    write_start = time.perf_counter()
+    if pending:
+        out.write('\n'.join(pending) + '\n')
+    out.flush()
+    blocked += time.perf_counter() - write_start
+
+    if config.get('stats_path'):
+        with open(config['stats_path'], 'w') as stats_file:
+            json.dump({'records': records,
+                       'seconds': time.perf_counter() - start,
+                       'blocked_seconds': blocked}, stats_file)
+
+
+if __name__ == '__main__':
+    main()
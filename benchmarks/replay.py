@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Replays recorded and synthetic tap output through singer-check-tap.
+
+Each scenario runs benchmarks/fake_tap.py as the tap, through the same
+run_and_summarize/summarize_output path as a real tap, in
+a fresh process so that peak RSS is measured per scenario. Reports
+checker records/sec, peak RSS and how long the tap spent blocked on a
+full stdout pipe (backpressure). Use --json to save the results and
+compare them between commits.
+
+    python benchmarks/replay.py --records 200000 --width 20 --depth 2 --streams 4
+    python benchmarks/replay.py --rate 5000 --json before.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+from terminaltables import AsciiTable
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FAKE_TAP = os.path.join(HERE, 'fake_tap.py')
+SAMPLES = os.path.join(HERE, '..', 'samples')
+
+
+def scenarios(args):
+    for path in sorted(glob.glob(os.path.join(SAMPLES, 'fixerio-valid-*.json'))):
+        yield os.path.basename(path), {'replay': path, 'repeat': args.repeat}
+    name = 'synthetic w={} d={} s={}'.format(args.width, args.depth, args.streams)
+    yield name, {'synthetic': {'records': args.records, 'width': args.width,
+                               'depth': args.depth, 'streams': args.streams}}
+
+
+def run_scenario(config, workers, with_state, result_path):
+    """Runs in a child process: checks the fake tap's output and writes
+    the results to result_path."""
+    from singertools.check_tap import run_and_summarize # pylint: disable=import-outside-toplevel
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config['stats_path'] = os.path.join(tmp_dir, 'stats.json')
+        config_path = os.path.join(tmp_dir, 'config.json')
+        with open(config_path, 'w') as config_file:
+            json.dump(config, config_file)
+
+        runs = {}
+        summary = run_and_summarize(FAKE_TAP, config_path, workers=workers)
+        with open(config['stats_path']) as stats_file:
+            runs['without_state'] = dict(summary.report(), tap=json.load(stats_file))
+
+        if with_state and summary.latest_state:
+            state_path = os.path.join(tmp_dir, 'state.json')
+            with open(state_path, 'w') as state_file:
+                json.dump(summary.latest_state, state_file)
+            summary = run_and_summarize(FAKE_TAP, config_path, state=state_path,
+                                        workers=workers)
+            with open(config['stats_path']) as stats_file:
+                runs['with_state'] = dict(summary.report(), tap=json.load(stats_file))
+
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    with open(result_path, 'w') as result_file:
+        json.dump({'runs': runs, 'peak_rss_mb': peak_rss_mb}, result_file)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=1000,
+                        help='Times to replay each file in samples/')
+    parser.add_argument('--records', type=int, default=100000)
+    parser.add_argument('--width', type=int, default=10)
+    parser.add_argument('--depth', type=int, default=1)
+    parser.add_argument('--streams', type=int, default=1)
+    parser.add_argument('--rate', type=int,
+                        help='Records per second for the fake tap to emit at most')
+    parser.add_argument('-w', '--workers', type=int, default=1)
+    parser.add_argument('--with-state', action='store_true',
+                        help='Also run the tap again with the state from the first run')
+    parser.add_argument('--json', help='Write the results to this file as JSON')
+    parser.add_argument('--run-scenario', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        run_scenario(json.loads(args.run_scenario), args.workers, args.with_state,
+                     args.result)
+        return
+
+    results = {}
+    rows = [['scenario', 'run', 'records', 'records/sec', 'tap blocked (s)',
+             'peak RSS (MB)']]
+    for name, config in scenarios(args):
+        if args.rate:
+            config['rate'] = args.rate
+        with tempfile.NamedTemporaryFile(suffix='.json') as result_file:
+            cmd = [sys.executable, __file__, '--run-scenario', json.dumps(config),
+                   '--result', result_file.name, '--workers', str(args.workers)]
+            if args.with_state:
+                cmd.append('--with-state')
+            subprocess.check_call(cmd, stdout=subprocess.DEVNULL)
+            with open(result_file.name) as result_in:
+                result = json.load(result_in)
+        results[name] = result
+
+        for run, report in result['runs'].items():
+            rows.append([name, run, report['records'],
+                         '{:.0f}'.format(report['records'] / report['elapsed_seconds']),
+                         '{:.2f}'.format(report['tap']['blocked_seconds']),
+                         '{:.1f}'.format(result['peak_rss_mb'])])
+
+    print(AsciiTable(rows).table)
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(results, json_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,7 @@ setup(name='singer-tools',
       author='Stitch',
       url='http://singer.io',
       classifiers=['Programming Language :: Python :: 3 :: Only'],
+      python_requires='>=3.7',
       install_requires=[
           'attrs==16.3.0',
           'jsonschema==2.6.0',
@@ -20,6 +21,12 @@ setup(name='singer-tools',
               'ipdb==0.11',
               'pylint==2.5.3',
               'nose'
+          ],
+          'zstd': [
+              'zstandard'
+          ],
+          'fast': [
+              'orjson'
           ]
       },
       packages=['singertools'],
@@ -1,26 +1,50 @@
 #!/usr/bin/env python3
+# pylint: disable=too-many-lines
 
 import argparse
-import copy
+import contextlib
+from collections import deque
 from datetime import datetime
 import json
 import os
+import queue
+import re
 import subprocess
-from subprocess import Popen
 import sys
 import threading
+import time
 
 from strict_rfc3339 import rfc3339_to_timestamp
 import attr
-from jsonschema import Draft4Validator, validators, FormatChecker
-import singer
 
-from terminaltables import AsciiTable
+from singertools import errors, inputs, messages, stats, validation
+
+# jsonschema, singer-python, terminaltables, asyncio (through runner) and
+# process pools take longer to import than checking a small file does, so
+# they are only imported once they're needed.
 
 
 
 WORKING_DIR_NAME = 'singer-check-tap-data'
 
+# Number of lines handed to a worker process at a time when running with
+# --workers.
+BATCH_SIZE = 1000
+
+# Validators built by a worker process, keyed by schema version.
+_WORKER_VALIDATORS = {}
+
+
+class RecordBeforeSchemaError(Exception):
+
+    def __init__(self, stream):
+        self.stream = stream
+        super().__init__(stream)
+
+    def __str__(self):
+        return 'I saw a record for stream {} before the schema'.format(
+            self.stream)
+
 
 def extend_with_default(validator_class):
     validate_properties = validator_class.VALIDATORS["properties"]
@@ -38,26 +62,150 @@ def extend_with_default(validator_class):
                         raise Exception('Error parsing property {}, value {}'
                                         .format(prop, instance[prop]))
 
+    from jsonschema import validators # pylint: disable=import-outside-toplevel
     return validators.extend(validator_class, {"properties": set_defaults})
 
 
+def build_jsonschema_validator(schema):
+    from jsonschema import Draft4Validator, FormatChecker # pylint: disable=import-outside-toplevel
+    validator_fn = extend_with_default(Draft4Validator)
+    return validator_fn(schema, format_checker=FormatChecker())
+
+
+def build_validator(schema):
+    """Returns a validator for schema: compiled if the schema only uses
+    keywords validation.compile_schema supports, otherwise jsonschema's.
+
+    Building a validator is expensive relative to validating a single
+    record, so callers should hold on to the result for as long as the
+    schema stays the same.
+    """
+    try:
+        check = validation.compile_schema(schema)
+    except validation.UnsupportedSchema:
+        return build_jsonschema_validator(schema)
+    return validation.CompiledValidator(check, lambda: build_jsonschema_validator(schema))
+
+
 @attr.s # pylint: disable=too-few-public-methods
-class StreamAcc(object):
+class StreamAcc(object): # pylint: disable=too-many-instance-attributes
 
     name = attr.ib()
     num_records = attr.ib(default=0)
     num_schemas = attr.ib(default=0)
     latest_schema = attr.ib(default=None, repr=False)
+    validator = attr.ib(default=None, repr=False, cmp=False)
+    # Whether the schema holds non-integral numbers, in which case records
+    # are decoded with Decimals to compare exactly against them
+    exact_numbers = attr.ib(default=False, repr=False, cmp=False)
+    num_bytes = attr.ib(default=0, repr=False, cmp=False)
+    first_record_at = attr.ib(default=None, repr=False, cmp=False)
+    last_record_at = attr.ib(default=None, repr=False, cmp=False)
+    key_properties = attr.ib(default=None, repr=False, cmp=False)
+    bookmark_properties = attr.ib(default=None, repr=False, cmp=False)
+    # Fingerprints of the records seen and the greatest replication key
+    # value among them, collected only for --verify-resume
+    fingerprints = attr.ib(default=None, repr=False, cmp=False)
+    max_replication_value = attr.ib(default=None, repr=False, cmp=False)
+    # A stats.StreamStats, collected only for --stats
+    stats = attr.ib(default=None, repr=False, cmp=False)
+
+    def update_schema(self, schema):
+        """Records a SCHEMA message, rebuilding the validator only if the
+        schema differs from the one already in force."""
+        self.num_schemas += 1
+        if self.validator is None or schema != self.latest_schema:
+            self.validator = build_validator(schema)
+            self.exact_numbers = messages.has_decimals(schema)
+        self.latest_schema = schema
+
+    def records_per_second(self):
+        if self.first_record_at is None or self.last_record_at <= self.first_record_at:
+            return None
+        return self.num_records / (self.last_record_at - self.first_record_at)
+
+    def bytes_per_second(self):
+        if self.first_record_at is None or self.last_record_at <= self.first_record_at:
+            return None
+        return self.num_bytes / (self.last_record_at - self.first_record_at)
+
+    def add_fingerprint(self, record):
+        fingerprint, replication_value = record_fingerprint(
+            record, self.key_properties, self.bookmark_properties)
+        if self.fingerprints is None:
+            self.fingerprints = set()
+        self.fingerprints.add(fingerprint)
+        self.max_replication_value = stats.max_value(
+            self.max_replication_value, replication_value)
+
+
+def record_fingerprint(record, key_properties, bookmark_properties):
+    """Returns a fingerprint for a version of a record, and its replication
+    key value.
+
+    The fingerprint hashes the record's key properties together with its
+    replication key (the stream's bookmark properties), so a record that
+    is emitted again unchanged has the same fingerprint, while an update to
+    it has a new one. Records of streams without key properties are
+    fingerprinted whole. The replication key value is a tuple, or None if
+    the stream has no bookmark properties.
+
+    Fingerprints are stable across processes, unlike hash().
+    """
+    replication_value = None
+    if bookmark_properties:
+        replication_value = tuple(record.get(prop) for prop in bookmark_properties)
+    if key_properties:
+        identity = [[record.get(prop) for prop in key_properties], replication_value]
+    else:
+        identity = record
+    return stats.hash64(identity), replication_value
+
+
+def record_errors(stream, record, error):
+    """Returns every error the stream's validator finds in record, given
+    error, the first one it raised."""
+    iter_errors = getattr(stream.validator, 'iter_errors', None)
+    if iter_errors is None:
+        return [error]
+    try:
+        found = list(iter_errors(record))
+    except Exception: # pylint: disable=broad-except
+        # Such as a date-time that doesn't parse, which raises
+        return [error]
+    return found or [error]
+
+
+def _is_singer(message, class_name):
+    """Returns whether message is one of singer-python's message classes.
+    A message can only be one if singer has already been imported, so this
+    doesn't import it."""
+    singer = sys.modules.get('singer')
+    return singer is not None and isinstance(message, getattr(singer, class_name))
 
 
 @attr.s
-class OutputSummary(object):
+class OutputSummary(object): # pylint: disable=too-many-instance-attributes
 
     streams = attr.ib(default=attr.Factory(dict))
     num_states = attr.ib(default=0)
+    latest_state = attr.ib(default=None, repr=False)
 
-    def __init__(self):
-        self.latest_state = None
+    # Timings. Points in time are from time.time(), so that they can be
+    # compared across worker processes; durations are in seconds.
+    started_at = attr.ib(default=attr.Factory(time.time), repr=False, cmp=False)
+    finished_at = attr.ib(default=None, repr=False, cmp=False)
+    parse_seconds = attr.ib(default=0.0, repr=False, cmp=False)
+    validation_seconds = attr.ib(default=0.0, repr=False, cmp=False)
+    first_state_at = attr.ib(default=None, repr=False, cmp=False)
+    last_state_at = attr.ib(default=None, repr=False, cmp=False)
+    max_state_gap = attr.ib(default=None, repr=False, cmp=False)
+    collect_fingerprints = attr.ib(default=False, repr=False, cmp=False)
+    collect_stats = attr.ib(default=False, repr=False, cmp=False)
+    # Whether to collect errors into errors, an errors.ErrorCollector made
+    # at the first one, rather than raise them
+    collect_errors = attr.ib(default=False, repr=False, cmp=False)
+    errors = attr.ib(default=None, repr=False, cmp=False)
 
     def ensure_stream(self, stream_name):
         if stream_name not in self.streams: # pylint: disable=unsupported-membership-test
@@ -65,28 +213,143 @@ class OutputSummary(object):
         return self.streams[stream_name] # pylint: disable=unsubscriptable-object
 
     def add(self, message):
-        if isinstance(message, singer.RecordMessage):
+        if isinstance(message, messages.Record) or _is_singer(message, 'RecordMessage'):
             stream = self.ensure_stream(message.stream)
-            if stream.latest_schema:
-                validator_fn = extend_with_default(Draft4Validator)
-                validator = validator_fn(
-                    stream.latest_schema, format_checker=FormatChecker())
-                validator.validate(copy.deepcopy(message.record))
-            else:
-                print('I saw a record for stream {} before the schema'.format(
-                    message.stream))
-                exit(1)
+            try:
+                if stream.latest_schema:
+                    stream.validator.validate(message.record)
+                else:
+                    raise RecordBeforeSchemaError(message.stream)
+            except Exception as exc: # pylint: disable=broad-except
+                if not self.collect_errors:
+                    raise
+                self.add_errors(message.stream, record_errors(stream, message.record, exc),
+                                message.record)
+                return
             stream.num_records += 1
+            if self.collect_fingerprints:
+                stream.add_fingerprint(message.record)
+            if self.collect_stats:
+                self.ensure_stats(stream).add(
+                    message.record, stream.key_properties, stream.bookmark_properties)
 
-        elif isinstance(message, singer.SchemaMessage):
+        elif isinstance(message, messages.Schema) or _is_singer(message, 'SchemaMessage'):
             stream = self.ensure_stream(message.stream)
-            stream.num_schemas += 1
-            stream.latest_schema = message.schema
+            try:
+                stream.update_schema(message.schema)
+            except Exception as exc: # pylint: disable=broad-except
+                if not self.collect_errors:
+                    raise
+                self.add_errors(message.stream, [exc])
+                return
+            stream.key_properties = message.key_properties
+            stream.bookmark_properties = message.bookmark_properties
+            if self.collect_stats:
+                self.ensure_stats(stream).add_fields(message.schema.get('properties', {}))
 
-        elif isinstance(message, singer.StateMessage):
+        elif isinstance(message, messages.State) or _is_singer(message, 'StateMessage'):
             self.latest_state = message.value
             self.num_states += 1
 
+    def add_errors(self, stream_name, exceptions, record=None):
+        if self.errors is None:
+            self.errors = errors.ErrorCollector()
+        self.errors.add(stream_name, exceptions, record)
+
+    @staticmethod
+    def ensure_stats(stream):
+        if stream.stats is None:
+            stream.stats = stats.StreamStats()
+        return stream.stats
+
+    def add_line(self, line, received_at=None):
+        """Parses and adds a line of output, recording how long parsing and
+        validation took and when the line was received. Returns the parsed
+        message."""
+        start = time.perf_counter()
+        try:
+            message = messages.parse_message(line)
+        except Exception as exc: # pylint: disable=broad-except
+            if not self.collect_errors:
+                raise
+            self.add_errors(None, [exc])
+            return None
+        if isinstance(message, messages.Record):
+            stream = self.streams.get(message.stream) # pylint: disable=no-member
+            if stream is not None and stream.exact_numbers:
+                message = messages.parse_message(line, exact=True)
+        parsed = time.perf_counter()
+        self.add(message)
+        self.validation_seconds += time.perf_counter() - parsed
+        self.parse_seconds += parsed - start
+
+        if received_at is None:
+            received_at = time.time()
+        if isinstance(message, messages.Record):
+            stream = self.streams[message.stream] # pylint: disable=unsubscriptable-object
+            # Lines read as text are counted in encoded bytes, as they were
+            # received
+            size = len(line.encode('utf-8')) if isinstance(line, str) else len(line)
+            stream.num_bytes += size
+            if stream.stats is not None:
+                stream.stats.add_size(size)
+            if stream.first_record_at is None:
+                stream.first_record_at = received_at
+            stream.last_record_at = received_at
+        elif isinstance(message, messages.State):
+            self._add_state_time(received_at, received_at)
+        return message
+
+    def _add_state_time(self, first_state_at, last_state_at, max_state_gap=None):
+        gaps = [max_state_gap, self.max_state_gap]
+        if self.last_state_at is not None:
+            gaps.append(first_state_at - self.last_state_at)
+        else:
+            self.first_state_at = first_state_at
+        self.last_state_at = last_state_at
+        gaps = [gap for gap in gaps if gap is not None]
+        self.max_state_gap = max(gaps) if gaps else None
+
+    def finish(self):
+        self.finished_at = time.time()
+
+    def merge(self, other):
+        """Folds in the summary of output that immediately followed the
+        output summarized by self."""
+        for name, acc in other.streams.items():
+            stream = self.ensure_stream(name)
+            stream.num_records += acc.num_records
+            stream.num_bytes += acc.num_bytes
+            if acc.first_record_at is not None:
+                if stream.first_record_at is None:
+                    stream.first_record_at = acc.first_record_at
+                stream.last_record_at = acc.last_record_at
+            if acc.num_schemas:
+                stream.num_schemas += acc.num_schemas
+                stream.latest_schema = acc.latest_schema
+                stream.key_properties = acc.key_properties
+                stream.bookmark_properties = acc.bookmark_properties
+            if acc.fingerprints:
+                if stream.fingerprints is None:
+                    stream.fingerprints = set()
+                stream.fingerprints |= acc.fingerprints
+                stream.max_replication_value = stats.max_value(
+                    stream.max_replication_value, acc.max_replication_value)
+            if acc.stats is not None:
+                self.ensure_stats(stream).merge(acc.stats)
+        if other.errors is not None:
+            if self.errors is None:
+                self.errors = errors.ErrorCollector()
+            self.errors.merge(other.errors)
+        if other.num_states:
+            self.num_states += other.num_states
+            self.latest_state = other.latest_state
+        if other.first_state_at is not None:
+            self._add_state_time(other.first_state_at, other.last_state_at,
+                                 other.max_state_gap)
+        self.parse_seconds += other.parse_seconds
+        self.validation_seconds += other.validation_seconds
+
     def num_records(self):
         return sum([stream.num_records for stream in self.streams.values()]) # pylint: disable=no-member
 
@@ -96,41 +359,275 @@ class OutputSummary(object):
     def num_messages(self):
         return self.num_records() + self.num_schemas() + self.num_states
 
+    def elapsed_seconds(self):
+        return (self.finished_at or time.time()) - self.started_at
+
+    def report(self):
+        """Returns the counts and timings, and any errors collected, as a
+        dict for --report-json."""
+        streams = {}
+        for stream in self.streams.values(): # pylint: disable=no-member
+            streams[stream.name] = {
+                'records': stream.num_records,
+                'schemas': stream.num_schemas,
+                'bytes': stream.num_bytes,
+                'records_per_second': stream.records_per_second(),
+                'bytes_per_second': stream.bytes_per_second(),
+                'time_to_first_record': (None if stream.first_record_at is None
+                                         else stream.first_record_at - self.started_at),
+            }
+            if stream.stats is not None:
+                streams[stream.name]['stats'] = stream.stats.report(stream.key_properties)
+        return {
+            'messages': self.num_messages(),
+            'records': self.num_records(),
+            'schemas': self.num_schemas(),
+            'states': self.num_states,
+            'elapsed_seconds': self.elapsed_seconds(),
+            'parse_seconds': self.parse_seconds,
+            'validation_seconds': self.validation_seconds,
+            'max_seconds_between_states': self.max_state_gap,
+            'streams': streams,
+            'errors': None if self.errors is None else self.errors.report(),
+        }
+
+
+@attr.s # pylint: disable=too-few-public-methods
+class ResumeAcc(object):
+
+    name = attr.ib()
+    num_records = attr.ib(default=0)
+    num_reemitted = attr.ib(default=0)
+    num_new = attr.ib(default=0)
+    # Re-emitted records whose replication key is less than the greatest
+    # one from the first run, i.e. from before the bookmark
+    num_before_bookmark = attr.ib(default=0)
+    has_replication_key = attr.ib(default=False)
+
+    def resumed(self):
+        """Returns whether the stream resumed from its bookmark, or None if
+        it has no replication key to tell by."""
+        if not self.has_replication_key:
+            return None
+        return self.num_before_bookmark == 0
+
+
+@attr.s
+class ResumeCheck(object):
+    """Compares the records of a run with state against the fingerprints
+    collected from the run that produced the state."""
+
+    first_run = attr.ib(repr=False)
+    limit = attr.ib(default=0)
+    streams = attr.ib(default=attr.Factory(dict))
+    stopped_early = attr.ib(default=False)
+
+    def add_record(self, stream, record):
+        """Classifies record, of the StreamAcc stream from the second run,
+        as re-emitted or new."""
+        acc = self.streams.get(stream.name) # pylint: disable=no-member
+        if acc is None:
+            acc = self.streams[stream.name] = ResumeAcc( # pylint: disable=unsupported-assignment-operation
+                stream.name, has_replication_key=bool(stream.bookmark_properties))
+        acc.num_records += 1
+
+        first = self.first_run.get(stream.name) # pylint: disable=no-member
+        fingerprint, replication_value = record_fingerprint(
+            record, stream.key_properties, stream.bookmark_properties)
+        if first is None or not first.fingerprints or fingerprint not in first.fingerprints:
+            acc.num_new += 1
+            return
+
+        acc.num_reemitted += 1
+        try:
+            if (replication_value is not None and first.max_replication_value is not None
+                    and replication_value < first.max_replication_value):
+                acc.num_before_bookmark += 1
+        except TypeError:
+            pass
+
+    def done(self):
+        """Returns True once limit records have been checked for every
+        stream that had records in the first run. Never True if limit is
+        0."""
+        if not self.limit:
+            return False
+        for name, first in self.first_run.items(): # pylint: disable=no-member
+            if not first.num_records:
+                continue
+            acc = self.streams.get(name) # pylint: disable=no-member
+            if acc is None or acc.num_records < self.limit:
+                return False
+        return True
 
-class StdoutReader(threading.Thread):
+    def resumed(self):
+        return all(acc.resumed() is not False for acc in self.streams.values()) # pylint: disable=no-member
 
-    def __init__(self, process):
-        self.process = process
-        self.summary = None
-        super().__init__()
+    def report(self):
+        return {
+            'stopped_early': self.stopped_early,
+            'resumed': self.resumed(),
+            'streams': {
+                acc.name: {
+                    'records': acc.num_records,
+                    're_emitted': acc.num_reemitted,
+                    'new': acc.num_new,
+                    'before_bookmark': acc.num_before_bookmark,
+                    'resumed': acc.resumed(),
+                } for acc in self.streams.values() # pylint: disable=no-member
+            },
+        }
+
+
+class BatchReader(threading.Thread):
+    """Drains output into (received_at, lines) batches of BATCH_SIZE lines
+    on batch_queue, followed by None once output is exhausted. received_at
+    is when the first line of the batch was read."""
+
+    def __init__(self, output, batch_queue):
+        self.output = output
+        self.batch_queue = batch_queue
+        super().__init__(daemon=True)
 
     def run(self):
-        self.summary = summarize_output(self.process.stdout)
-
-    def finish_reading_logs(self):
-        """Joins the thread with a timeout.
-
-        Intended to be called on the parent thread.
-        """
-        print('Joining on thread {}'.format(self.name))
-        self.join(timeout=5)
-        if self.is_alive():
-            print(
-                'Thread {} did not finish within timeout'.format(self.name))
-        else:
-            print('Thread {} finished'.format(self.name))
+        batch = []
+        received_at = None
+        for line in self.output:
+            if not batch:
+                received_at = time.time()
+            batch.append(line)
+            if len(batch) >= BATCH_SIZE:
+                self.batch_queue.put((received_at, batch))
+                batch = []
+        if batch:
+            self.batch_queue.put((received_at, batch))
+        self.batch_queue.put(None)
+
+
+def summarize_batch(lines, schemas, received_at, options):
+    """Summarizes a batch of lines in a worker process.
 
+    schemas maps each stream to the (version, SCHEMA message) in force at
+    the start of the batch. Validators are cached per version so each
+    worker only builds one per schema. Every line is treated as having
+    been received at received_at. options are passed on to OutputSummary.
+    """
+    summary = OutputSummary(**options)
+    for stream_name, (version, schema_message) in schemas.items():
+        if version not in _WORKER_VALIDATORS:
+            _WORKER_VALIDATORS[version] = build_validator(schema_message.schema)
+        summary.streams[stream_name] = StreamAcc(
+            stream_name,
+            latest_schema=schema_message.schema,
+            validator=_WORKER_VALIDATORS[version],
+            exact_numbers=messages.has_decimals(schema_message.schema),
+            key_properties=schema_message.key_properties,
+            bookmark_properties=schema_message.bookmark_properties)
 
-def summarize_output(output):
-    summary = OutputSummary()
-    for line in output:
-        summary.add(singer.parse_message(line))
+    for line in lines:
+        summary.add_line(line, received_at)
+
+    # Validators don't pickle, and the parent has no use for them.
+    for stream in summary.streams.values():
+        stream.validator = None
+    return summary
+
+
+def update_schema_versions(schemas, lines, next_version):
+    """Applies any SCHEMA messages in lines to schemas and returns the
+    next unused version number.
+
+    Only lines that could be a SCHEMA message are decoded, so this is
+    cheap enough to run on the dispatching thread. Anything malformed is
+    left for the worker to report.
+    """
+    for line in lines:
+        if '"SCHEMA"' not in line:
+            continue
+        try:
+            message = messages.parse_message(line)
+        except Exception: # pylint: disable=broad-except
+            continue
+        if not isinstance(message, messages.Schema):
+            continue
+        stream = schemas.get(message.stream)
+        if stream is None or stream[1] != message:
+            schemas[message.stream] = (next_version, message)
+            next_version += 1
+    return next_version
+
+
+def summarize_output_parallel(output, workers, **options):
+    """Like summarize_output, but parses and validates batches of lines on
+    a pool of worker processes.
+
+    Batch results are merged in the order the batches were read, so the
+    first error raised is the same one the serial path would raise.
+    """
+    summary = OutputSummary(**options)
+    batch_queue = queue.Queue(maxsize=workers * 2)
+    reader = BatchReader(output, batch_queue)
+    reader.start()
+
+    schemas = {}
+    next_version = 0
+    pending = deque()
+    from concurrent.futures import ProcessPoolExecutor # pylint: disable=import-outside-toplevel
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            item = batch_queue.get()
+            if item is None:
+                break
+            received_at, batch = item
+            pending.append(pool.submit(summarize_batch, batch, dict(schemas), received_at,
+                                       options))
+            next_version = update_schema_versions(schemas, batch, next_version)
+            if len(pending) >= workers * 2:
+                summary.merge(pending.popleft().result())
+        while pending:
+            summary.merge(pending.popleft().result())
+    summary.finish()
     return summary
 
 
-def print_summary(summary):
+def summarize_output(output, workers=1, **options):
+    """Summarizes the lines of output, on workers processes. options, such
+    as collect_stats, are passed on to OutputSummary."""
+    try:
+        if workers > 1:
+            return summarize_output_parallel(output, workers, **options)
+        summary = OutputSummary(**options)
+        for line in output:
+            summary.add_line(line)
+        summary.finish()
+        return summary
+    except RecordBeforeSchemaError as exc:
+        print(exc)
+        exit(1)
+
 
-    print('The output is valid.')
+def _format_rate(rate):
+    return '-' if rate is None else '{:.0f}'.format(rate)
+
+
+def _format_seconds(seconds):
+    return '-' if seconds is None else '{:.2f}'.format(seconds)
+
+
+def _table(data):
+    from terminaltables import AsciiTable # pylint: disable=import-outside-toplevel
+    return AsciiTable(data).table
+
+
+def print_summary(summary, status=None):
+    """Prints summary, beginning with status if it's given, or whether the
+    output is valid otherwise."""
+    if status is not None:
+        print(status)
+    elif summary.errors is None:
+        print('The output is valid.')
+    else:
+        print('The output is NOT valid: {} lines had errors.'.format(summary.errors.num_lines))
     print('It contained {} messages for {} streams.'.format(
         summary.num_messages(), len(summary.streams)))
     print('')
@@ -138,51 +635,393 @@ def print_summary(summary):
     print('{:7} record messages'.format(summary.num_records()))
     print('{:7} state messages'.format(summary.num_states))
     print('')
+    print('Read in {:.2f}s. Parsing took {:.2f}s and validation {:.2f}s.'.format(
+        summary.elapsed_seconds(), summary.parse_seconds, summary.validation_seconds))
+    if summary.max_state_gap is not None:
+        print('Longest time between state messages: {:.2f}s'.format(
+            summary.max_state_gap))
+    print('')
     print('Details by stream:')
-    headers = [['stream', 'records', 'schemas']]
-    rows = [[s.name, s.num_records, s.num_schemas]
-            for s in summary.streams.values()]
+    headers = [['stream', 'records', 'schemas', 'records/sec', 'bytes/sec',
+                'first record (s)']]
+    rows = []
+    stream_reports = summary.report()['streams']
+    for stream in summary.streams.values():
+        report = stream_reports[stream.name]
+        rows.append([stream.name, stream.num_records, stream.num_schemas,
+                     _format_rate(report['records_per_second']),
+                     _format_rate(report['bytes_per_second']),
+                     _format_seconds(report['time_to_first_record'])])
     data = headers + rows
 
-    table = AsciiTable(data)
-    print(table.table)
+    print(_table(data))
+
+    if any(stream.stats is not None for stream in summary.streams.values()):
+        print_stats(summary)
+    if summary.errors is not None:
+        print_errors(summary.errors)
+
+
+def _first_line(text, length=60):
+    line = text.splitlines()[0] if text else ''
+    return line if len(line) <= length else line[:length - 3] + '...'
+
+
+def print_errors(collector):
+    print('')
+    print('Errors, most common first:')
+    headers = [['#', 'lines', 'stream', 'error', 'schema path', 'first message']]
+    rows = []
+    ranked = collector.ranked()
+    for rank, group in enumerate(ranked, 1):
+        rows.append([rank, group.count, group.stream or '-', group.kind,
+                     group.schema_path or '-', _first_line(group.samples[0]['message'])])
+    print(_table(headers + rows))
+    if collector.num_ungrouped:
+        print('{} more errors were not grouped, as there were too many kinds.'.format(
+            collector.num_ungrouped))
+    print('')
+    print('Samples:')
+    for rank, group in enumerate(ranked, 1):
+        for sample in group.samples:
+            print('{}. {}'.format(rank, _first_line(sample['message'], 200)))
+            if sample.get('path'):
+                print('   at {}'.format(sample['path']))
+            if sample.get('record'):
+                print('   in {}'.format(sample['record']))
+
+
+def _format_replication_value(value):
+    if value is None:
+        return '-'
+    return str(value[0]) if len(value) == 1 else str(value)
+
+
+def print_stats(summary):
+    print('')
+    print('Statistics by stream (distinct keys are approximate):')
+    headers = [['stream', 'distinct keys', 'min replication key', 'max replication key',
+                'record bytes p50', 'p99', 'max', 'always null fields']]
+    rows = []
+    duplicated = []
+    for stream in summary.streams.values():
+        stream_stats = stream.stats
+        if stream_stats is None:
+            continue
+        distinct_keys = stream_stats.distinct_keys() if stream.key_properties else '-'
+        if stream.key_properties and stream_stats.likely_duplicate_keys():
+            duplicated.append((stream, distinct_keys))
+        rows.append([stream.name, distinct_keys,
+                     _format_replication_value(stream_stats.min_replication_value),
+                     _format_replication_value(stream_stats.max_replication_value),
+                     _format_rate(stream_stats.size_percentile(0.5)),
+                     _format_rate(stream_stats.size_percentile(0.99)),
+                     stream_stats.max_size,
+                     '{} of {}'.format(len(stream_stats.always_null()),
+                                       len(stream_stats.non_null))])
+    print(_table(headers + rows))
+    for stream, distinct_keys in duplicated:
+        print('WARNING: stream {} has about {} distinct values of its key properties {} '
+              'in {} records, so they may not identify its records.'.format(
+                  stream.name, distinct_keys, stream.key_properties, stream.num_records))
+
+
+def print_resume_check(check):
+    if check.stopped_early:
+        print('Stopped the tap after checking {} records of each stream.'.format(
+            check.limit))
+    if check.resumed():
+        print('The tap resumed from the state produced by the previous run.')
+    else:
+        print('WARNING: the tap re-emitted records from before its bookmark. '
+              'It may not be resuming from the state it was given.')
+    print('')
+    headers = [['stream', 'records', 're-emitted', 'new', 'before bookmark', 'resumed']]
+    rows = []
+    for acc in check.streams.values():
+        resumed = acc.resumed()
+        rows.append([acc.name, acc.num_records, acc.num_reemitted, acc.num_new,
+                     acc.num_before_bookmark,
+                     '-' if resumed is None else 'yes' if resumed else 'no'])
+    print(_table(headers + rows))
 
 
-def run_and_summarize(tap, config, state=None, debug=False):
+def tap_command(tap, config, state=None):
     cmd = [tap, '--config', config]
     if state:
         cmd += ['--state', state]
     print('Running command {}'.format(' '.join(cmd)))
+    return cmd
 
-    stderr = None if debug else subprocess.DEVNULL
-    tap = Popen(cmd,
-                stdout=subprocess.PIPE,
-                stderr=stderr,
-                bufsize=1,
-                universal_newlines=True)
-    summarizer = StdoutReader(tap)
-    summarizer.start()
-    returncode = tap.wait()
-    if returncode != 0:
-        print('ERROR: tap exited with status {}'.format(returncode))
-        exit(1)
 
-    return summarizer.summary
+def check_run(run, timeout, show_stderr=True):
+    """Exits with an error if the tap timed out or, unless it was stopped
+    early, exited non-zero. Shows the end of its stderr too, unless
+    show_stderr is off because it was already shown."""
+    if run.timed_out:
+        print('ERROR: tap did not finish within {} seconds'.format(timeout))
+    elif run.returncode != 0 and not run.stopped_early:
+        print('ERROR: tap exited with status {}'.format(run.returncode))
+    else:
+        return
+    if show_stderr and run.stderr_tail:
+        print('Last lines of its stderr:')
+        for line in run.stderr_lines():
+            print(line)
+    exit(1)
 
 
-def check_with_no_state(args):
-    return run_and_summarize(args.tap, args.config, debug=args.debug)
+def run_and_summarize(tap, config, state=None, debug=False, workers=1, # pylint: disable=too-many-arguments
+                      timeout=None, **options):
+    from singertools import runner # pylint: disable=import-outside-toplevel
+    run = runner.run_tap(
+        tap_command(tap, config, state),
+        lambda lines: summarize_output(lines, workers, **options),
+        echo_stderr=debug,
+        timeout=timeout)
+    check_run(run, timeout, show_stderr=not debug)
+    return run.result
 
 
-def check_with_state(args, state):
-    state_path = os.path.join(WORKING_DIR_NAME, 'state.json')
+def write_state(state, working_dir=WORKING_DIR_NAME):
+    state_path = os.path.join(working_dir, 'state.json')
     with open(state_path, mode='w') as state_file:
         json.dump(state, state_file)
+    return state_path
+
+
+def check_with_no_state(args):
+    return run_and_summarize(args.tap, args.config, state=args.state, debug=args.debug,
+                             workers=args.workers,
+                             collect_fingerprints=args.verify_resume is not None,
+                             collect_stats=args.stats, collect_errors=args.collect_errors,
+                             timeout=args.timeout)
+
+
+def check_with_state(args, state):
+    state_path = write_state(state, args.working_dir)
     return run_and_summarize(
-        args.tap, args.config, state=state_path, debug=args.debug)
+        args.tap, args.config, state=state_path, debug=args.debug,
+        workers=args.workers, collect_stats=args.stats, collect_errors=args.collect_errors,
+        timeout=args.timeout)
 
 
-def main():
+def verify_resume(args, first_run):
+    """Runs the tap with the state from first_run, checking its records
+    against first_run's fingerprints as they arrive.
+
+    Stops the tap once args.verify_resume records of every stream that
+    had records in the first run have been checked, or when the tap
+    finishes if that's sooner. Returns the summary of the output read and
+    the ResumeCheck.
+    """
+    state_path = write_state(first_run.latest_state, args.working_dir)
+    summary = OutputSummary(collect_stats=args.stats, collect_errors=args.collect_errors)
+    check = ResumeCheck(first_run.streams, args.verify_resume)
+
+    def consume(lines):
+        for line in lines:
+            message = summary.add_line(line)
+            if isinstance(message, messages.Record):
+                check.add_record(summary.streams[message.stream], message.record)
+                if check.done():
+                    return
+
+    from singertools import runner # pylint: disable=import-outside-toplevel
+    try:
+        run = runner.run_tap(tap_command(args.tap, args.config, state_path), consume,
+                             echo_stderr=args.debug, timeout=args.timeout)
+    except RecordBeforeSchemaError as exc:
+        print(exc)
+        exit(1)
+    check.stopped_early = run.stopped_early
+    check_run(run, args.timeout, show_stderr=not args.debug)
+    summary.finish()
+    return summary, check
+
+
+def _entry_name(name, names):
+    """Returns name as a single directory name that isn't one of names:
+    anything but letters, digits, '.', '_' and '-' becomes '-', leading
+    dots and dashes are dropped, and a number is added if it's taken."""
+    name = re.sub(r'[^\w.-]+', '-', name).lstrip('.-') or 'entry'
+    unique = name
+    suffix = 1
+    while unique in names:
+        unique = '{}-{}'.format(name, suffix)
+        suffix += 1
+    return unique
+
+
+def load_manifest(path):
+    """Reads a manifest: a JSON list of objects with "tap" and "config" and
+    optionally "state" and "name" keys.
+
+    Config and state paths, and tap paths with a directory, are relative
+    to the manifest; bare tap names are looked up on the PATH. Entries without
+    a name are named after their config file, and names are made safe to
+    use as a directory name and unique, so that each entry gets its own
+    working directory.
+    """
+    with open(path) as manifest_file:
+        entries = json.load(manifest_file)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    names = set()
+    for i, entry in enumerate(entries):
+        for key in ['tap', 'config']:
+            if key not in entry:
+                raise Exception('Entry {} of manifest {} is missing required key {}'
+                                .format(i, path, key))
+        for key in ['config', 'state']:
+            if entry.get(key):
+                entry[key] = os.path.join(base_dir, entry[key])
+        if os.sep in entry['tap']:
+            entry['tap'] = os.path.join(base_dir, entry['tap'])
+
+        name = _entry_name(entry.get('name') or
+                           os.path.splitext(os.path.basename(entry['config']))[0], names)
+        names.add(name)
+        entry['name'] = name
+    return entries
+
+
+@attr.s # pylint: disable=too-few-public-methods
+class EntryResult(object):
+
+    name = attr.ib()
+    returncode = attr.ib()
+    elapsed_seconds = attr.ib()
+    log_path = attr.ib()
+    # The runs' counts and timings from --report-json, or None if the
+    # check failed before writing them
+    report = attr.ib(default=None, repr=False)
+
+
+def check_entry(entry, args):
+    """Checks one manifest entry in a child singer-check-tap process, with
+    its own working directory, and returns an EntryResult. The child's
+    output goes to output.log in the working directory."""
+    working_dir = os.path.join(args.working_dir, entry['name'])
+    os.makedirs(working_dir, exist_ok=True)
+    report_path = os.path.join(working_dir, 'report.json')
+    log_path = os.path.join(working_dir, 'output.log')
+    if os.path.exists(report_path):
+        os.remove(report_path)
+
+    cmd = [sys.executable, '-m', 'singertools.check_tap',
+           '--tap', entry['tap'],
+           '--config', entry['config'],
+           '--working-dir', working_dir,
+           '--report-json', report_path,
+           '--workers', str(args.workers)]
+    if entry.get('state'):
+        cmd += ['--state', entry['state']]
+    if args.debug:
+        cmd.append('--debug')
+    if args.verify_resume is not None:
+        cmd += ['--verify-resume', str(args.verify_resume)]
+    if args.timeout is not None:
+        cmd += ['--timeout', str(args.timeout)]
+    if args.stats:
+        cmd.append('--stats')
+    if args.collect_errors:
+        cmd.append('--collect-errors')
+
+    start = time.time()
+    with open(log_path, 'w') as log:
+        returncode = subprocess.call(cmd, stdout=log, stderr=subprocess.STDOUT)
+    result = EntryResult(entry['name'], returncode, time.time() - start, log_path)
+    if os.path.exists(report_path):
+        with open(report_path) as report_file:
+            result.report = json.load(report_file)
+
+    print('{} {} in {:.2f}s'.format(entry['name'], 'passed' if returncode == 0 else 'FAILED',
+                                    result.elapsed_seconds))
+    return result
+
+
+def print_manifest_summary(results, elapsed_seconds):
+    failed = [result for result in results if result.returncode != 0]
+    print('')
+    print('Checked {} taps in {:.2f}s. {} passed, {} failed.'.format(
+        len(results), elapsed_seconds, len(results) - len(failed), len(failed)))
+    print('')
+    headers = [['name', 'result', 'records', 'records with state', 'seconds', 'log']]
+    rows = []
+    for result in results:
+        report = result.report or {}
+        rows.append([result.name,
+                     'ok' if result.returncode == 0 else 'exit {}'.format(result.returncode),
+                     report.get('without_state', {}).get('records', '-'),
+                     report.get('with_state', {}).get('records', '-'),
+                     '{:.2f}'.format(result.elapsed_seconds),
+                     result.log_path])
+    print(_table(headers + rows))
+
+
+def write_manifest_report(path, results):
+    """Writes each entry's result, and the report of its runs, keyed by
+    the entry's name, to path as JSON."""
+    with open(path, 'w') as report_file:
+        json.dump({result.name: {'returncode': result.returncode,
+                                 'elapsed_seconds': result.elapsed_seconds,
+                                 'log': result.log_path,
+                                 'report': result.report}
+                   for result in results}, report_file, indent=2)
+
+
+def run_manifest(args):
+    """Checks every entry of args.manifest, args.concurrency at a time, and
+    returns the exit status: zero if every check passed."""
+    from concurrent.futures import ThreadPoolExecutor # pylint: disable=import-outside-toplevel
+    entries = load_manifest(args.manifest)
+    os.makedirs(args.working_dir, exist_ok=True)
+    print('Checking {} taps from {}, {} at a time'.format(
+        len(entries), args.manifest, args.concurrency))
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda entry: check_entry(entry, args), entries))
+    print_manifest_summary(results, time.time() - start)
+    if args.report_json:
+        write_manifest_report(args.report_json, results)
+    return 0 if all(result.returncode == 0 for result in results) else 1
+
+
+def run_tee(args, input_stream, output):
+    """Checks input_stream while copying it to output, printing the summary,
+    and returns the exit status."""
+    from singertools import tee # pylint: disable=import-outside-toplevel
+    print('Checking stdin while copying it to stdout')
+    summary = OutputSummary(collect_stats=args.stats)
+    quarantine = open(args.quarantine_file, 'wb') if args.quarantine_file else None
+    try:
+        result = tee.tee(input_stream, output, summary, args.on_invalid, quarantine)
+    except BrokenPipeError:
+        print('ERROR: the command reading stdout exited before the end of the input')
+        return 1
+    finally:
+        if quarantine is not None:
+            quarantine.close()
+
+    report = summary.report()
+    report['invalid_records'] = result.num_invalid
+    if args.report_json:
+        with open(args.report_json, 'w') as report_file:
+            json.dump({'stdin': report}, report_file, indent=2)
+    if result.error is not None:
+        print('ERROR: {}'.format(result.error))
+        return 1
+    status = None
+    if result.num_invalid:
+        status = 'The output is NOT valid: {} invalid records were {}.'.format(
+            result.num_invalid,
+            'quarantined to {}'.format(args.quarantine_file) if quarantine else 'dropped')
+    print_summary(summary, status)
+    return 0
+
+
+def parse_args():
 
     parser = argparse.ArgumentParser(
         description='''Verifies that a Tap conforms to the Singer
@@ -191,7 +1030,8 @@ def main():
         exit zero if the Tap exits zero and produces valid output, or
         non-zero if the tap exits non-zero or if the output it
         produces is invalid. If no --tap is provided, exits zero if
-        the data on stdin is valid, non-zero otherwise.''')
+        the data on stdin, or in the --input files, is valid, non-zero
+        otherwise.''')
 
     parser.add_argument(
         '-t',
@@ -199,11 +1039,49 @@ def main():
         help='''Tap program to execute. If provided, I'll run this tap
         and check its output. Otherwise, I'll read from stdin.''')
 
+    parser.add_argument(
+        '-i',
+        '--input',
+        nargs='+',
+        help='''Files or globs of tap output to check instead of stdin,
+        optionally gzip or zstd compressed. They're checked as one
+        output, in the order given.''')
+
     parser.add_argument(
         '-c',
         '--config',
         help='Config file for tap. Only used of --tap is also specified.')
 
+    parser.add_argument(
+        '-s',
+        '--state',
+        help='''State file to start the first run of the tap from. Only
+        used if --tap is also specified.''')
+
+    parser.add_argument(
+        '-m',
+        '--manifest',
+        help='''JSON file listing taps to check, as a list of objects
+        with "tap", "config" and optionally "state" and "name" keys.
+        Each is checked as if passed with --tap, --config and --state,
+        in its own process and working directory, and a combined
+        summary is printed at the end.''')
+
+    parser.add_argument(
+        '-j',
+        '--concurrency',
+        type=int,
+        default=4,
+        help='''Number of taps from --manifest to check at once.
+        Defaults to 4.''')
+
+    parser.add_argument(
+        '--working-dir',
+        default=WORKING_DIR_NAME,
+        help='''Directory to save the state between runs in. Defaults
+        to {}. With --manifest, each tap gets a subdirectory named after
+        it.'''.format(WORKING_DIR_NAME))
+
     parser.add_argument(
         '-d',
         '--debug',
@@ -212,24 +1090,130 @@ def main():
         help='''Turn on debugging. Show log output from tap. By default
         logging output from tap is suppressed.''')
 
+    parser.add_argument(
+        '-w',
+        '--workers',
+        type=int,
+        default=1,
+        help='''Number of processes to parse and validate output with.
+        Defaults to 1, which does everything on a single thread.''')
+
+    parser.add_argument(
+        '--verify-resume',
+        type=int,
+        metavar='N',
+        help='''Instead of summarizing the whole run with state, check
+        that it resumes where the first run left off. Each record is
+        compared against the key and replication key of the records
+        from the first run, and the tap is stopped once N records of
+        every stream have been checked. 0 checks the whole run. The
+        run with state is always checked on a single thread.''')
+
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        help='''Fail if a run of the tap, including checking all of its
+        output, takes longer than this many seconds.''')
+
+    parser.add_argument(
+        '--tee',
+        action='store_true',
+        help='''Check the output on stdin while copying it to stdout
+        unchanged, so it can be piped on to a target. The summary goes
+        to stderr.''')
+
+    parser.add_argument(
+        '--on-invalid',
+        choices=['fail', 'drop', 'quarantine'],
+        default='fail',
+        help='''With --tee, what to do with records that don't match
+        their schema: fail the check (the default), leave them out of
+        the copy, or leave them out and write them to
+        --quarantine-file. Other errors always fail.''')
+
+    parser.add_argument(
+        '--quarantine-file',
+        help='''File to write invalid records to with --on-invalid
+        quarantine.''')
+
+    parser.add_argument(
+        '--collect-errors',
+        action='store_true',
+        help='''Keep checking after invalid output, and report every
+        kind of error found, grouped by stream, schema path and failed
+        keyword, most common first, with a few sample records of each.
+        Exits non-zero at the end if there were any.''')
+
+    parser.add_argument(
+        '--stats',
+        action='store_true',
+        help='''Also collect statistics for each stream: null counts by
+        field, the approximate number of distinct keys, the range of
+        the replication key and the distribution of record sizes.
+        They take constant memory per stream.''')
+
+    parser.add_argument(
+        '--report-json',
+        help='''Also write the counts and timings for each run to this
+        file as JSON. With --manifest, they are keyed by entry name.''')
+
     args = parser.parse_args()
+    if args.tee and (args.tap or args.manifest):
+        parser.error('--tee checks stdin, so it cannot be used with --tap or --manifest')
+    if args.input and (args.tap or args.manifest or args.tee):
+        parser.error('--input cannot be used with --tap, --manifest or --tee')
+    if args.tee and args.collect_errors:
+        parser.error('--collect-errors cannot be used with --tee; see --on-invalid')
+    if args.on_invalid != 'fail' and not args.tee:
+        parser.error('--on-invalid {} only applies to --tee'.format(args.on_invalid))
+    if (args.on_invalid == 'quarantine') != bool(args.quarantine_file):
+        parser.error('--on-invalid quarantine and --quarantine-file go together')
+    return args
 
-    try:
-        os.mkdir(WORKING_DIR_NAME)
-    except FileExistsError:
-        pass
+
+def check_output(args):
+    """Checks the --input files, or stdin, and returns the name of what was
+    checked in the report, and its summary."""
+    if args.input:
+        paths = inputs.expand_paths(args.input)
+        print('Checking {} for valid Singer-formatted data'.format(', '.join(paths)))
+        output, name = inputs.input_lines(paths), 'input'
+    else:
+        print('Checking stdin for valid Singer-formatted data')
+        output, name = sys.stdin, 'stdin'
+    return name, summarize_output(output, args.workers, collect_stats=args.stats,
+                                  collect_errors=args.collect_errors)
+
+
+def main():
+    args = parse_args()
+
+    if args.tee:
+        output = sys.stdout.buffer
+        with contextlib.redirect_stdout(sys.stderr):
+            exit(run_tee(args, sys.stdin.buffer, output))
+
+    if args.manifest:
+        exit(run_manifest(args))
+
+    os.makedirs(args.working_dir, exist_ok=True)
 
     if args.tap:
         if not args.config:
             print('If you provide --taps you must also provide --config')
             exit(1)
 
+    reports = {}
+    summaries = []
     if args.tap:
         print('Checking tap {} with config {}'.format(args.tap, args.config))
         summary = check_with_no_state(args)
+        reports['without_state'] = summary.report()
+        summaries.append(summary)
     else:
-        print('Checking stdin for valid Singer-formatted data')
-        summary = summarize_output(sys.stdin)
+        name, summary = check_output(args)
+        reports[name] = summary.report()
+        summaries.append(summary)
 
     print_summary(summary)
 
@@ -238,8 +1222,24 @@ def main():
             print('')
             print('')
             print('Now re-running tap with state produced by previous run')
-            summary = check_with_state(args, summary.latest_state)
-            print_summary(summary)
+            if args.verify_resume is not None:
+                summary, check = verify_resume(args, summary)
+                reports['with_state'] = summary.report()
+                reports['resume'] = check.report()
+                summaries.append(summary)
+                print_resume_check(check)
+            else:
+                summary = check_with_state(args, summary.latest_state)
+                reports['with_state'] = summary.report()
+                summaries.append(summary)
+                print_summary(summary)
+
+    if args.report_json:
+        with open(args.report_json, 'w') as report_file:
+            json.dump(reports, report_file, indent=2)
+
+    if any(summary.errors is not None and summary.errors.num_lines for summary in summaries):
+        exit(1)
 
 if __name__ == '__main__':
     main()
@@ -1,25 +1,427 @@
 import json
 import argparse
+from collections import Counter, deque
 import difflib
+import hashlib
+import heapq
+import os
+import sys
+import tempfile
+
+from singertools.inputs import is_splittable, read_lines, split_ranges
+from singertools.messages import loads
+
+# Default cap, in megabytes, on the canonical lines held in memory per
+# file by --streaming before they are spilled to disk.
+DEFAULT_MAX_MEMORY_MB = 256
+
+# Most spill files merged at once. Past this many, the spill files are
+# merged into one before reading continues, to bound open files.
+MAX_MERGE_FANIN = 64
+
+# Buckets each stream's records are hashed into, so that only the buckets
+# that differ between two files need diffing in detail
+NUM_BUCKETS = 256
+
+# Line hashes are 128 bits, and summed modulo 2 ** 128
+HASH_MASK = (1 << 128) - 1
 
 def load_jsonl_file(file_path):
-    with open(file_path) as file_obj:
-        lines = [json.loads(line) for line in file_obj.readlines()]
-    return lines
+    return [loads(line) for line in read_lines(file_path)]
 
 def prettify(lines):
     pretty_lines = [json.dumps(line, sort_keys=True, indent=4) for line in lines]
     pretty_lines = sorted(pretty_lines)
     return '\n'.join(pretty_lines)
 
+def canonicalize_value(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'))
+
+def canonicalize(line):
+    """Returns a compact form of a JSON line that is equal for any two
+    lines holding the same value."""
+    return canonicalize_value(loads(line))
+
+def line_hash(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=16).digest(), 'big')
+
+def _add_to_digest(digest, key, hashed):
+    count, total = digest.get(key, (0, 0))
+    digest[key] = (count + 1, (total + hashed) & HASH_MASK)
+
+def merge_digests(digest, other):
+    for key, (count, total) in other.items():
+        old_count, old_total = digest.get(key, (0, 0))
+        digest[key] = (old_count + count, (old_total + total) & HASH_MASK)
+    return digest
+
+def raw_digest(file_path, start=0, end=None):
+    """Returns an order-independent digest of the non-blank lines of
+    file_path, or of a byte range of it: their number and the sum of their
+    hashes. Two files have the same digest when they hold the same lines,
+    byte for byte, in any order. Lines aren't parsed, so this takes a
+    fraction of the time of a diff."""
+    digest = {}
+    for line in read_lines(file_path, start, end):
+        line = line.strip()
+        if line:
+            _add_to_digest(digest, None, line_hash(line))
+    return digest
+
+def raw_digest_parallel(file_path, workers):
+    """Like raw_digest, but digests byte ranges of file_path on a pool of
+    worker processes."""
+    from concurrent.futures import ProcessPoolExecutor # pylint: disable=import-outside-toplevel
+    digest = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(raw_digest, file_path, start, end)
+                   for start, end in split_ranges(file_path, workers)]
+        for future in futures:
+            merge_digests(digest, future.result())
+    return digest
+
+def file_digest(file_path, workers=1):
+    if workers > 1 and is_splittable(file_path):
+        return raw_digest_parallel(file_path, workers)
+    return raw_digest(file_path)
+
+def _stream_of(message):
+    """Returns the stream of a Singer message, or None for STATE messages
+    and lines that aren't Singer messages."""
+    if isinstance(message, dict) and 'type' in message:
+        stream = message.get('stream')
+        if isinstance(stream, str):
+            return stream
+    return None
+
+def bucket_messages(messages):
+    """Returns a list of (stream, bucket) keys, one per message, and a
+    digest of the messages' canonical forms with each key's number of
+    messages and sum of hashes."""
+    keys = []
+    digest = {}
+    for message in messages:
+        hashed = line_hash(canonicalize_value(message).encode('utf-8'))
+        key = (_stream_of(message), hashed % NUM_BUCKETS)
+        keys.append(key)
+        _add_to_digest(digest, key, hashed)
+    return keys, digest
+
+def differing_messages(messages1, messages2):
+    """Returns the messages of each list that hash into a stream and bucket
+    whose messages differ between the lists. Every message in one list
+    but not the other is kept, along with some that are in both."""
+    keys1, digest1 = bucket_messages(messages1)
+    keys2, digest2 = bucket_messages(messages2)
+    differing = {key for key in set(digest1) | set(digest2)
+                 if digest1.get(key) != digest2.get(key)}
+    return ([m for m, key in zip(messages1, keys1) if key in differing],
+            [m for m, key in zip(messages2, keys2) if key in differing])
+
+def _spill(chunk, tmp_dir):
+    chunk.sort()
+    spill_file = tempfile.TemporaryFile(mode='w+', dir=tmp_dir)
+    for canonical in chunk:
+        spill_file.write(canonical)
+        spill_file.write('\n')
+    spill_file.seek(0)
+    return spill_file
+
+def _read_spill(spill_file):
+    for line in spill_file:
+        yield line[:-1]
+
+def _merge_spills(spill_files, tmp_dir):
+    merged = tempfile.TemporaryFile(mode='w+', dir=tmp_dir)
+    for canonical in heapq.merge(*[_read_spill(f) for f in spill_files]):
+        merged.write(canonical)
+        merged.write('\n')
+    for spill_file in spill_files:
+        spill_file.close()
+    merged.seek(0)
+    return merged
+
+def sorted_canonical_lines(file_path, max_memory, tmp_dir=None):
+    """Yields the canonical form of every line in file_path in sorted
+    order.
+
+    Canonical lines are buffered until they take up max_memory bytes,
+    then sorted and spilled to a temporary file in tmp_dir. The spill
+    files are merged lazily, so only one line per spill file is held in
+    memory while merging.
+    """
+    chunk = []
+    chunk_size = 0
+    spill_files = []
+    try:
+        for line in read_lines(file_path):
+            if not line.strip():
+                continue
+            canonical = canonicalize(line)
+            chunk.append(canonical)
+            chunk_size += sys.getsizeof(canonical)
+            if chunk_size >= max_memory:
+                spill_files.append(_spill(chunk, tmp_dir))
+                chunk = []
+                chunk_size = 0
+                if len(spill_files) >= MAX_MERGE_FANIN:
+                    spill_files = [_merge_spills(spill_files, tmp_dir)]
+
+        chunk.sort()
+        if not spill_files:
+            yield from chunk
+        else:
+            if chunk:
+                spill_files.append(_spill(chunk, tmp_dir))
+                chunk = []
+            yield from heapq.merge(*[_read_spill(f) for f in spill_files])
+    finally:
+        for spill_file in spill_files:
+            spill_file.close()
+
+def _sort_range(file_path, start, end, tmp_dir):
+    """Canonicalizes and sorts a byte range of file_path in a worker
+    process, writing the lines to a spill file in tmp_dir. Returns the
+    spill file's path."""
+    chunk = [canonicalize(line) for line in read_lines(file_path, start, end)
+             if line.strip()]
+    chunk.sort()
+    spill_fd, spill_path = tempfile.mkstemp(dir=tmp_dir)
+    with os.fdopen(spill_fd, 'w') as spill_file:
+        for canonical in chunk:
+            spill_file.write(canonical)
+            spill_file.write('\n')
+    return spill_path
+
+def sorted_canonical_lines_parallel(file_path, max_memory, workers, tmp_dir=None):
+    """Like sorted_canonical_lines, but canonicalizes and sorts byte ranges
+    of file_path on a pool of worker processes, each small enough that
+    the ranges being sorted at once fit in max_memory."""
+    from concurrent.futures import ProcessPoolExecutor # pylint: disable=import-outside-toplevel
+    # Canonical lines take up about twice their size in bytes as strs
+    range_size = max(max_memory // (workers * 2), 1)
+    num_ranges = max(workers, -(-os.path.getsize(file_path) // range_size))
+    spill_files = []
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as spill_dir:
+        try:
+            pending = deque()
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for start, end in split_ranges(file_path, num_ranges):
+                    pending.append(pool.submit(_sort_range, file_path, start, end, spill_dir))
+                    if len(pending) >= workers:
+                        spill_files.append(open(pending.popleft().result()))
+                    if len(spill_files) >= MAX_MERGE_FANIN:
+                        spill_files = [_merge_spills(spill_files, tmp_dir)]
+                while pending:
+                    spill_files.append(open(pending.popleft().result()))
+                    if len(spill_files) >= MAX_MERGE_FANIN:
+                        spill_files = [_merge_spills(spill_files, tmp_dir)]
+            yield from heapq.merge(*[_read_spill(f) for f in spill_files])
+        finally:
+            for spill_file in spill_files:
+                spill_file.close()
+
+def merge_join(lines1, lines2):
+    """Walks two sorted iterables and yields ('-', line) for lines only
+    in lines1 and ('+', line) for lines only in lines2. Duplicates are
+    matched one for one."""
+    lines1 = iter(lines1)
+    lines2 = iter(lines2)
+    line1 = next(lines1, None)
+    line2 = next(lines2, None)
+    while line1 is not None or line2 is not None:
+        if line2 is None or (line1 is not None and line1 < line2):
+            yield '-', line1
+            line1 = next(lines1, None)
+        elif line1 is None or line2 < line1:
+            yield '+', line2
+            line2 = next(lines2, None)
+        else:
+            line1 = next(lines1, None)
+            line2 = next(lines2, None)
+
+def _sorted_lines(file_path, max_memory, tmp_dir, workers):
+    if workers > 1 and is_splittable(file_path):
+        return sorted_canonical_lines_parallel(file_path, max_memory, workers, tmp_dir)
+    return sorted_canonical_lines(file_path, max_memory, tmp_dir)
+
+def streaming_diff(file1, file2, max_memory, tmp_dir=None, workers=1):
+    """Yields a diff of two JSONL files, showing every record present in
+    one file but not the other as indented JSON prefixed with - or +.
+    With more than one worker, each file is sorted on a process pool."""
+    lines1 = _sorted_lines(file1, max_memory, tmp_dir, workers)
+    lines2 = _sorted_lines(file2, max_memory, tmp_dir, workers)
+    header_done = False
+    for sign, canonical in merge_join(lines1, lines2):
+        if not header_done:
+            yield '--- {}'.format(file1)
+            yield '+++ {}'.format(file2)
+            header_done = True
+        pretty = json.dumps(loads(canonical), sort_keys=True, indent=4)
+        for pretty_line in pretty.splitlines():
+            yield sign + ' ' + pretty_line
+
+def _record_key(record, key_properties):
+    if key_properties:
+        return json.dumps([record.get(k) for k in key_properties], sort_keys=True)
+    # Without a key, the record is only ever equal to itself.
+    return canonicalize_value(record)
+
+def index_by_key(file_path, keys=None):
+    """Reads a JSONL file into {stream: {key: Counter of canonical_record}}.
+
+    Keys are built from keys if given, otherwise from the key_properties
+    of the latest SCHEMA message for the record's stream. Lines that
+    aren't Singer messages are treated as records of stream None. Every
+    record sharing a key is kept, counted by how often it appears, so
+    changes to any of them show up.
+    """
+    key_properties = {}
+    index = {}
+    for line in read_lines(file_path):
+        if not line.strip():
+            continue
+        message = loads(line)
+        message_type = message.get('type') if isinstance(message, dict) else None
+        if message_type == 'SCHEMA':
+            key_properties[message['stream']] = message.get('key_properties')
+            continue
+        if message_type == 'RECORD':
+            stream, record = message['stream'], message['record']
+        elif message_type in ('STATE', 'ACTIVATE_VERSION'):
+            continue
+        else:
+            stream, record = None, message
+        key = _record_key(record, keys or key_properties.get(stream))
+        index.setdefault(stream, {}).setdefault(key, Counter())[canonicalize_value(record)] += 1
+    return index
+
+ABSENT = '<absent>'
+
+def diff_fields(old, new, path=()):
+    """Yields (path, old_value, new_value) for every field that differs
+    between two records, descending into nested objects."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        for field in sorted(set(old) | set(new)):
+            yield from diff_fields(old.get(field, ABSENT), new.get(field, ABSENT),
+                                   path + (field,))
+    elif old != new or type(old) != type(new): # pylint: disable=unidiomatic-typecheck
+        yield path, old, new
+
+def _format_changed_fields(canonical1, canonical2):
+    for path, old, new in diff_fields(loads(canonical1), loads(canonical2)):
+        yield '    {}: {} -> {}'.format('.'.join(path),
+                                        old if old is ABSENT else json.dumps(old),
+                                        new if new is ABSENT else json.dumps(new))
+
+def _format_changed_versions(versions1, versions2):
+    """Shows the fields that changed if the key has a single record on
+    each side, otherwise the records only on one side or the other."""
+    if sum(versions1.values()) == 1 and sum(versions2.values()) == 1:
+        [canonical1], [canonical2] = versions1, versions2
+        yield from _format_changed_fields(canonical1, canonical2)
+        return
+    for canonical in (versions1 - versions2).elements():
+        yield '    - {}'.format(canonical)
+    for canonical in (versions2 - versions1).elements():
+        yield '    + {}'.format(canonical)
+
+def key_diff(file1, file2, keys=None):
+    """Yields a report of the records added, removed and changed between
+    two JSONL files, matching records by primary key."""
+    index1 = index_by_key(file1, keys)
+    index2 = index_by_key(file2, keys)
+    yield '--- {}'.format(file1)
+    yield '+++ {}'.format(file2)
+    for stream in list(index1) + [s for s in index2 if s not in index1]:
+        records1 = index1.get(stream, {})
+        records2 = index2.get(stream, {})
+        removed = [k for k in records1 if k not in records2]
+        added = [k for k in records2 if k not in records1]
+        changed = [k for k in records1 if k in records2 and records1[k] != records2[k]]
+        if not (removed or added or changed):
+            continue
+
+        yield 'Stream {}: {} added, {} removed, {} changed'.format(
+            stream, len(added), len(removed), len(changed))
+        for key in added:
+            for canonical in records2[key].elements():
+                yield '+ {} {}'.format(key, canonical)
+        for key in removed:
+            for canonical in records1[key].elements():
+                yield '- {} {}'.format(key, canonical)
+        for key in changed:
+            yield '~ {}'.format(key)
+            yield from _format_changed_versions(records1[key], records2[key])
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("file1")
     parser.add_argument("file2")
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="""Sort both files externally and print only the records that
+        differ. Use this for files too large to diff in memory.""")
+    parser.add_argument(
+        "--max-memory",
+        type=int,
+        default=DEFAULT_MAX_MEMORY_MB,
+        help="""Megabytes of records to hold in memory per file before
+        spilling to disk with --streaming. Defaults to {}.""".format(
+            DEFAULT_MAX_MEMORY_MB))
+    parser.add_argument(
+        "--tmp-dir",
+        default=None,
+        help="Directory for --streaming spill files. Defaults to the system temp dir.")
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="""Number of processes to hash each uncompressed file with,
+        and to sort it with for --streaming. --max-memory is shared
+        between them.""")
+    parser.add_argument(
+        "--by-key",
+        action="store_true",
+        help="""Match records by the key_properties from each stream's
+        SCHEMA message and report added, removed and changed records.""")
+    parser.add_argument(
+        "--key",
+        action="append",
+        help="""Property to match records by. Implies --by-key and
+        overrides key_properties. May be repeated for compound keys.""")
+    parser.add_argument(
+        "--no-hash-check",
+        action="store_true",
+        help="""Diff every record in detail, rather than first hashing both
+        files to stop early if they hold the same lines, and only diffing
+        the streams and hash buckets that differ.""")
     args = parser.parse_args()
 
+    if args.by_key or args.key:
+        for line in key_diff(args.file1, args.file2, args.key):
+            print(line)
+        return
+
+    if not args.no_hash_check and (file_digest(args.file1, args.workers) ==
+                                   file_digest(args.file2, args.workers)):
+        return
+
+    if args.streaming:
+        if args.tmp_dir and not os.path.exists(args.tmp_dir):
+            os.makedirs(args.tmp_dir)
+        for line in streaming_diff(args.file1, args.file2,
+                                   args.max_memory * 1024 * 1024, args.tmp_dir,
+                                   args.workers):
+            print(line)
+        return
+
     lines1 = load_jsonl_file(args.file1)
     lines2 = load_jsonl_file(args.file2)
+    if not args.no_hash_check:
+        lines1, lines2 = differing_messages(lines1, lines2)
 
     pretty_lines1 = prettify(lines1)
     pretty_lines2 = prettify(lines2)
@@ -0,0 +1,112 @@
+"""Collects the errors in a tap's output instead of stopping at the first.
+
+Errors are grouped by stream, schema path and kind: the JSON schema
+keyword that failed, or the exception's class for anything else. Each
+group counts the records it affected and keeps the first few of them as
+samples. The number of groups is capped too, so memory stays bounded
+however many errors there are.
+"""
+
+from collections import OrderedDict
+import json
+
+import attr
+
+# Most groups to keep. Errors that would start a new group after this
+# are only counted.
+MAX_GROUPS = 1000
+
+# Samples to keep per group
+MAX_SAMPLES = 3
+
+# Longest sample message, or record in JSON, to keep, in characters
+MAX_SAMPLE_LENGTH = 1000
+
+
+def _describe(error):
+    """Returns the schema path, kind and message of an exception raised
+    for a line of output."""
+    if hasattr(error, 'absolute_schema_path'):
+        # A jsonschema ValidationError
+        return ('/'.join(str(p) for p in error.absolute_schema_path), error.validator,
+                error.message)
+    return '', type(error).__name__, str(error)
+
+
+def _sample(error, message, record):
+    path = getattr(error, 'absolute_path', None)
+    sample = {'message': message[:MAX_SAMPLE_LENGTH],
+              'path': None if path is None else '/'.join(str(p) for p in path)}
+    if record is not None:
+        sample['record'] = json.dumps(record, default=str)[:MAX_SAMPLE_LENGTH]
+    return sample
+
+
+@attr.s
+class ErrorGroup(object):
+
+    stream = attr.ib()
+    schema_path = attr.ib()
+    kind = attr.ib()
+    count = attr.ib(default=0)
+    samples = attr.ib(default=attr.Factory(list))
+
+    def report(self):
+        return {'stream': self.stream, 'schema_path': self.schema_path, 'kind': self.kind,
+                'count': self.count, 'samples': self.samples}
+
+
+@attr.s
+class ErrorCollector(object):
+
+    groups = attr.ib(default=attr.Factory(OrderedDict))
+    # Lines with at least one error
+    num_lines = attr.ib(default=0)
+    # Errors that didn't fit in a group
+    num_ungrouped = attr.ib(default=0)
+
+    def add(self, stream, errors, record=None):
+        """Adds the errors found in a line of output for stream, which is
+        None if the line couldn't be parsed. A group is counted once per
+        line, however many of its errors the line had."""
+        self.num_lines += 1
+        seen = set()
+        for error in errors:
+            schema_path, kind, message = _describe(error)
+            key = (stream, schema_path, kind)
+            if key in seen:
+                continue
+            seen.add(key)
+            group = self.groups.get(key)
+            if group is None:
+                if len(self.groups) >= MAX_GROUPS:
+                    self.num_ungrouped += 1
+                    continue
+                group = self.groups[key] = ErrorGroup(stream, schema_path, kind)
+            group.count += 1
+            if len(group.samples) < MAX_SAMPLES:
+                group.samples.append(_sample(error, message, record))
+
+    def merge(self, other):
+        """Folds in the errors of output that followed the output self
+        collected from."""
+        self.num_lines += other.num_lines
+        self.num_ungrouped += other.num_ungrouped
+        for key, other_group in other.groups.items():
+            group = self.groups.get(key)
+            if group is None:
+                if len(self.groups) >= MAX_GROUPS:
+                    self.num_ungrouped += other_group.count
+                    continue
+                group = self.groups[key] = ErrorGroup(*key)
+            group.count += other_group.count
+            group.samples.extend(other_group.samples[:MAX_SAMPLES - len(group.samples)])
+
+    def ranked(self):
+        """Returns the groups, most common first."""
+        return sorted(self.groups.values(), key=lambda group: -group.count)
+
+    def report(self):
+        return {'lines': self.num_lines,
+                'ungrouped': self.num_ungrouped,
+                'groups': [group.report() for group in self.ranked()]}
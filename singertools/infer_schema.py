@@ -1,13 +1,95 @@
 #!/usr/bin/env python3
 
 import argparse
+import base64
+from collections import OrderedDict, deque
+import copy
+import gzip
+import hashlib
 import os
 import json
+import random
+import re
 import sys
-import dateutil.parser
+
+import attr
+
+from singertools import inputs, stats
+from singertools.inputs import expand_paths, open_input
+from singertools.messages import loads
+
+# Number of lines handed to a worker process at a time when running with
+# --workers.
+CHUNK_SIZE = 10000
+
+# Bytes of a file observed by a worker at a time, when a single
+# uncompressed file is split up between workers
+RANGE_SIZE = 32 * 1024 * 1024
+
+# Distinct values kept per path when summarizing, and so the most values a
+# string enum can have. Strings longer than SUMMARY_VALUE_LENGTH aren't kept.
+SUMMARY_VALUES = 20
+SUMMARY_VALUE_LENGTH = 100
+
+# Times each of a string path's values must have been seen on average for
+# it to be inferred as an enum
+ENUM_MIN_REPEATS = 10
+
+# Version of the observation cache format written by save_observations
+CACHE_VERSION = 2
+
+ISO_8601_RE = re.compile(
+    r'^\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])'
+    r'([T ]([01]\d|2[0-3]):[0-5]\d(:[0-5]\d(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?)?$')
+
+# Dates like 02-22-1970, 22/02/1970 or 1970.02.22, optionally followed by
+# a time of day.
+NUMERIC_DATE_RE = re.compile(
+    r'^(?:(\d{1,2})[-/.](\d{1,2})[-/.](\d{4}|\d{2})|(\d{4})[-/.](\d{1,2})[-/.](\d{1,2}))'
+    r'(?:[ T]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?$')
+
+# Strings dateutil could plausibly read as a date: some digits plus a
+# separator, other than a plain number. This excludes strings like "3",
+# "1.5" and "May", which dateutil's parser happily turns into dates.
+PLAUSIBLE_DATE_RE = re.compile(r'\d.*[-/:., ]|[-/:., ].*\d')
+NUMBER_RE = re.compile(r'^[-+]?\d*\.?\d+$')
+
+
+def _is_numeric_date(match):
+    if match.group(4):
+        month, day = int(match.group(5)), int(match.group(6))
+        return 1 <= month <= 12 and 1 <= day <= 31
+    first, second = int(match.group(1)), int(match.group(2))
+    # Either month-day or day-month order.
+    return (1 <= first <= 31 and 1 <= second <= 31
+            and (first <= 12 or second <= 12))
+
+
+def is_date(value, use_dateutil=False):
+    """Returns True if the string value looks like a date.
+
+    ISO-8601 and common numeric formats are recognized with regular
+    expressions. If use_dateutil is set, other strings that plausibly
+    hold a date are handed to dateutil's much slower parser.
+    """
+    if ISO_8601_RE.match(value):
+        return True
+    match = NUMERIC_DATE_RE.match(value)
+    if match:
+        return _is_numeric_date(match)
+    if use_dateutil and PLAUSIBLE_DATE_RE.search(value) and not NUMBER_RE.match(value):
+        import dateutil.parser # pylint: disable=import-outside-toplevel
+        try:
+            dateutil.parser.parse(value)
+        except (ValueError, OverflowError):
+            return False
+        return True
+    return False
 
 
 def add_observation(acc, path):
+    """Adds path to the observation tree and returns 1 if it wasn't
+    already there, 0 otherwise."""
 
     node = acc
     for i in range(0, len(path) - 1):
@@ -16,40 +98,342 @@ def add_observation(acc, path):
             node[k] = {}
         node = node[k]
 
+    if path[-1] in node:
+        return 0
     node[path[-1]] = True
+    return 1
 
-# pylint: disable=too-many-branches
-def add_observations(acc, path, data):
-    if isinstance(data, dict):
-        for key in data:
-            add_observations(acc, path + ["object", key], data[key])
-    elif isinstance(data, list):
-        for item in data:
-            add_observations(acc, path + ["array"], item)
-    elif isinstance(data, str):
-        # If the string parses as a date, add an observation that its a date
-        try:
-            data = dateutil.parser.parse(data)
-        except (dateutil.parser.ParserError, OverflowError):
-            data = None
-        if data:
-            add_observation(acc, path + ["date"])
-        else:
-            add_observation(acc, path + ["string"])
+def _child(node, pending, key):
+    """Steps from a position in the observation tree to its child at key.
+
+    A position is the deepest existing node plus a tuple of keys below it
+    that don't exist yet. Nodes are only created once a value is observed
+    under them, so records holding empty objects or arrays leave the
+    tree alone, and paths that already exist cost no allocation.
+    """
+    if not pending:
+        child = node.get(key)
+        if child is not None:
+            return child, ()
+    return node, pending + (key,)
+
+
+def _object_children(data, node, pending):
+    node, pending = _child(node, pending, "object")
+    for key, value in data.items():
+        child, child_pending = _child(node, pending, key)
+        yield key, value, child, child_pending
 
+
+def _resolve(node, pending):
+    """Moves a position down through any of its pending keys that have
+    been created since it was found."""
+    for i, key in enumerate(pending):
+        child = node.get(key)
+        if child is None:
+            return node, pending[i:]
+        node = child
+    return node, ()
+
+
+def _array_children(data, node, pending):
+    node, pending = _resolve(node, pending + ("array",))
+    for item in data:
+        if pending:
+            # Items before this one may have created the nodes on its path
+            node, pending = _resolve(node, pending)
+        yield None, item, node, pending
+
+
+def _leaf_type(data, node, pending, use_dateutil): # pylint: disable=too-many-return-statements
+    if isinstance(data, str):
+        # Once a path has held a plain string its schema can't have a
+        # date-time format, so there's no point checking for dates again.
+        if (pending or 'string' not in node) and is_date(data, use_dateutil):
+            return "date"
+        return "string"
     elif isinstance(data, bool):
-        add_observation(acc, path + ["boolean"])
+        return "boolean"
     elif isinstance(data, int):
-        add_observation(acc, path + ["integer"])
+        return "integer"
     elif isinstance(data, float):
-        add_observation(acc, path + ["number"])
+        return "number"
     elif data is None:
-        add_observation(acc, path + ["null"])
-    else:
-        raise Exception("Unexpected value " + repr(data) + " at path " + repr(path))
+        return "null"
+    return None
+
+
+def _error_path(path, keys):
+    # keys holds, for each level below path, the object key that led there,
+    # or None for an array item.
+    for key in keys[1:]:
+        path = path + (["array"] if key is None else ["object", key])
+    return path
+
+
+def _observe(acc, path, data, use_dateutil):
+    """Adds observations for data and returns the number of new paths.
+
+    Walks data and the observation tree together, depth first, with an
+    explicit stack so that deeply nested documents can't exceed the
+    recursion limit.
+    """
+    node, pending = acc, ()
+    for key in path:
+        node, pending = _child(node, pending, key)
 
+    new_paths = 0
+    stack = [iter([(None, data, node, pending)])]
+    keys = [None]
+    while stack:
+        item = next(stack[-1], None)
+        if item is None:
+            stack.pop()
+            keys.pop()
+            continue
+        keys[-1], data, node, pending = item
+
+        if isinstance(data, dict):
+            stack.append(_object_children(data, node, pending))
+            keys.append(None)
+            continue
+        if isinstance(data, list):
+            stack.append(_array_children(data, node, pending))
+            keys.append(None)
+            continue
+
+        leaf = _leaf_type(data, node, pending, use_dateutil)
+        if leaf is None:
+            raise Exception("Unexpected value " + repr(data) + " at path " +
+                            repr(_error_path(path, keys)))
+        for key in pending:
+            node = node.setdefault(key, {})
+        if leaf not in node:
+            node[leaf] = True
+            new_paths += 1
+
+    return new_paths
+
+def add_observations(acc, path, data, use_dateutil=False):
+    _observe(acc, path, data, use_dateutil)
     return acc
 
+def merge_observations(acc, other):
+    """Merges the observation tree other into acc and returns acc.
+
+    Keys new to acc are added after its existing ones, in other's order,
+    so merging the trees of consecutive chunks of input gives the same
+    tree, down to key order, as observing all of the input at once.
+    """
+    # Iterative, as observation trees can be as deep as the documents
+    # that produced them.
+    stack = [(acc, other)]
+    while stack:
+        into, node = stack.pop()
+        for key, value in node.items():
+            if isinstance(value, dict):
+                stack.append((into.setdefault(key, {}), value))
+            else:
+                into[key] = value
+    return acc
+
+
+def _hash_scalar(value):
+    # Strings and integers are summarized separately, so "1" and 1 may
+    # hash alike
+    encoded = str(value).encode('utf-8', 'surrogatepass')
+    return int.from_bytes(hashlib.blake2b(encoded, digest_size=8).digest(), 'big')
+
+
+@attr.s
+class PathSummary(object):
+    """A bounded summary of the strings or integers seen at a path: how
+    many, the least and greatest integer or string length, up to
+    SUMMARY_VALUES distinct values, and for top-level fields a sketch of
+    the number of distinct values."""
+
+    count = attr.ib(default=0)
+    minimum = attr.ib(default=None)
+    maximum = attr.ib(default=None)
+    # None once there have been too many to keep
+    values = attr.ib(default=attr.Factory(set))
+    keys = attr.ib(default=None, cmp=False, repr=False)
+
+    def add(self, value, measure):
+        self.count += 1
+        if self.minimum is None or measure < self.minimum:
+            self.minimum = measure
+        if self.maximum is None or measure > self.maximum:
+            self.maximum = measure
+        values = self.values
+        if values is not None and value not in values:
+            if len(values) >= SUMMARY_VALUES or (isinstance(value, str) and
+                                                 len(value) > SUMMARY_VALUE_LENGTH):
+                self.values = None
+            else:
+                values.add(value)
+        if self.keys is not None:
+            self.keys.add(_hash_scalar(value))
+
+    def merge(self, other):
+        self.count += other.count
+        self.minimum = stats.min_value(self.minimum, other.minimum)
+        self.maximum = stats.max_value(self.maximum, other.maximum)
+        if self.values is not None and other.values is not None:
+            self.values |= other.values
+            if len(self.values) > SUMMARY_VALUES:
+                self.values = None
+        else:
+            self.values = None
+        if self.keys is not None and other.keys is not None:
+            self.keys.merge(other.keys)
+
+    def is_unique(self):
+        """Returns whether every value seen was distinct, exactly if the
+        values were all kept and approximately otherwise."""
+        if self.values is not None:
+            return len(self.values) == self.count
+        return self.keys is not None and not self.keys.fewer_than(self.count)
+
+    def to_json(self):
+        return {'count': self.count, 'minimum': self.minimum, 'maximum': self.maximum,
+                'values': None if self.values is None else sorted(self.values),
+                'keys': (None if self.keys is None
+                         else base64.b64encode(bytes(self.keys.registers)).decode('ascii'))}
+
+    @classmethod
+    def from_json(cls, data):
+        summary = cls(data['count'], data['minimum'], data['maximum'],
+                      None if data['values'] is None else set(data['values']))
+        if data['keys'] is not None:
+            summary.keys = stats.HyperLogLog()
+            summary.keys.registers = bytearray(base64.b64decode(data['keys']))
+        return summary
+
+
+def summarize_record(summaries, record):
+    """Adds the strings and integers in record to summaries, a dict of
+    (observation tree path, kind) to PathSummary, where kind is 'string'
+    or 'integer'. The measure of a string is its length."""
+    stack = [((), record)]
+    while stack:
+        path, data = stack.pop()
+        if isinstance(data, dict):
+            path = path + ('object',)
+            stack.extend((path + (key,), value) for key, value in data.items())
+            continue
+        if isinstance(data, list):
+            path = path + ('array',)
+            stack.extend((path, item) for item in data)
+            continue
+        if isinstance(data, str):
+            kind, measure = 'string', len(data)
+        elif isinstance(data, int) and not isinstance(data, bool):
+            kind, measure = 'integer', data
+        else:
+            continue
+        summary = summaries.get((path, kind))
+        if summary is None:
+            summary = summaries[(path, kind)] = PathSummary()
+            if len(path) == 2:
+                # A top-level field, which could be a key property
+                summary.keys = stats.HyperLogLog()
+        summary.add(data, measure)
+
+
+def merge_summaries(acc, other):
+    for key, summary in other.items():
+        if key in acc:
+            acc[key].merge(summary)
+        else:
+            acc[key] = summary
+    return acc
+
+
+def _schema_at(schema, path):
+    keys = iter(path)
+    for key in keys:
+        if key == 'object':
+            schema = schema.get('properties', {}).get(next(keys), {})
+        else:
+            schema = schema.get('items', {})
+    return schema
+
+
+def apply_summaries(schema, summaries):
+    """Adds maxLength, integer minimum and maximum, and enums of strings
+    with few distinct values to schema, from summaries. Fields that also
+    held non-integral numbers get no range."""
+    for (path, kind), summary in summaries.items():
+        sub_schema = _schema_at(schema, path)
+        types = sub_schema.get('type', [])
+        if kind == 'integer' and 'integer' in types and 'format' not in sub_schema:
+            # With a format, the field held other numbers too, which
+            # weren't summarized
+            sub_schema['minimum'] = summary.minimum
+            sub_schema['maximum'] = summary.maximum
+        elif kind == 'string' and 'string' in types and 'format' not in sub_schema:
+            sub_schema['maxLength'] = summary.maximum
+            if (types == ['null', 'string'] and summary.values is not None and
+                    summary.count >= ENUM_MIN_REPEATS * len(summary.values)):
+                sub_schema['enum'] = sorted(summary.values) + [None]
+    return schema
+
+
+@attr.s
+class Observations(object):
+    """The observation tree for a stream, plus the number of records
+    observed and the number skipped by sampling. merge is associative, so
+    observations of separate chunks of a stream can be combined in any
+    grouping as long as their order is kept.
+
+    summaries, if not None, holds PathSummaries of the values observed,
+    as built by summarize_record. It stays None after merging observations that
+    didn't collect them, as they would only cover some of the records."""
+
+    tree = attr.ib(default=attr.Factory(dict))
+    num_records = attr.ib(default=0)
+    num_skipped = attr.ib(default=0)
+    summaries = attr.ib(default=None, repr=False)
+
+    def add(self, record, use_dateutil=False):
+        """Observes record and returns True if it added any new paths to
+        the tree."""
+        self.num_records += 1
+        if self.summaries is not None:
+            summarize_record(self.summaries, record)
+        return _observe(self.tree, [], record, use_dateutil) > 0
+
+    def merge(self, other):
+        merge_observations(self.tree, other.tree)
+        self.num_records += other.num_records
+        self.num_skipped += other.num_skipped
+        if self.summaries is not None and other.summaries is not None:
+            merge_summaries(self.summaries, other.summaries)
+        else:
+            self.summaries = None
+        return self
+
+    def is_sampled(self):
+        return self.num_skipped > 0
+
+    def key_candidates(self):
+        """Returns the top-level fields that held a distinct string or
+        integer in every record, which could be key properties."""
+        if not self.summaries or not self.num_records:
+            return []
+        return sorted(path[1] for (path, _), summary in self.summaries.items()
+                      if len(path) == 2 and summary.count == self.num_records
+                      and summary.is_unique())
+
+    def to_json_schema(self):
+        schema = to_json_schema(self.tree)
+        if self.summaries:
+            apply_summaries(schema, self.summaries)
+        return schema
+
+
+# pylint: disable=too-many-branches
 def to_json_schema(obs):
     result = {'type': ['null']}
 
@@ -67,8 +451,10 @@ def to_json_schema(obs):
             result['items'] = to_json_schema(obs['array'])
 
         elif key == 'date':
-            result['type'] += ['string']
-            result['format'] = 'date-time'
+            # A path that also held plain strings is just a string.
+            if 'string' not in obs:
+                result['type'] += ['string']
+                result['format'] = 'date-time'
         elif key == 'string':
             result['type'] += ['string']
 
@@ -92,49 +478,508 @@ def to_json_schema(obs):
     return result
 
 
-def infer_schemas(record_inputs, out_dir):
-    """
-    The main logic that iterates record_inputs and prints the resulting
-    inferred schema to either outdir or stdout
+def _add_to_reservoir(reservoir, record, sample_size, num_seen, rand):
+    """Keeps reservoir a uniform random sample of the num_seen records
+    seen so far, including record."""
+    if len(reservoir) < sample_size:
+        reservoir.append(record)
+    else:
+        i = rand.randrange(num_seen)
+        if i < sample_size:
+            reservoir[i] = record
+
+
+def _record_prefixes(stream, as_bytes):
+    """Returns the ways a RECORD line of stream written by singer-python
+    starts, as bytes if as_bytes is set."""
+    prefixes = ['{"type": "RECORD", "stream": ' + json.dumps(stream),
+                '{"type":"RECORD","stream":' + json.dumps(stream, separators=(',', ':'))]
+    if as_bytes:
+        return [prefix.encode('utf-8') for prefix in prefixes]
+    return prefixes
+
+
+def _converged_stream(line, converged):
+    """Returns the stream of line if it starts like a RECORD of one of the
+    streams in converged, a list of (prefix, stream), without decoding it."""
+    for prefix, stream in converged:
+        if line.startswith(prefix):
+            return stream
+    return None
+
+
+def observe(record_inputs, use_dateutil=False, sample_size=None, converge_after=None,
+            summarize=False):
+    """Returns a dict of stream name to Observations for the RECORD
+    messages in record_inputs.
+
+    If sample_size is set, only a uniform random sample of that many
+    records per stream is observed. If converge_after is set, a stream
+    stops being observed once that many of its records in a row have
+    added no new paths to its tree, and its RECORD lines aren't decoded
+    any more if they start the way singer-python writes them. If
+    summarize is set, the observed values are summarized too.
     """
-    streams = {}
+    if sample_size and converge_after:
+        raise ValueError('sample_size and converge_after are mutually exclusive')
 
+    streams = {}
+    reservoirs = {}
+    unchanged = {}
+    converged = []
+    # Seeded so that repeated runs over the same input agree
+    rand = random.Random(0)
     for line in record_inputs:
-        rec = json.loads(line)
+        if converged:
+            stream = _converged_stream(line, converged)
+            if stream is not None:
+                streams[stream].num_skipped += 1
+                continue
+        rec = loads(line)
         if rec['type'] == 'RECORD':
             stream = rec['stream']
             if stream not in streams:
-                streams[stream] = {}
-            streams[stream] = add_observations(streams[stream], [], rec['record'])
+                streams[stream] = Observations(summaries={} if summarize else None)
+                reservoirs[stream] = []
+                unchanged[stream] = 0
+            obs = streams[stream]
+
+            if sample_size:
+                if len(reservoirs[stream]) >= sample_size:
+                    obs.num_skipped += 1
+                _add_to_reservoir(reservoirs[stream], rec['record'], sample_size,
+                                  len(reservoirs[stream]) + obs.num_skipped, rand)
+            elif converge_after and unchanged[stream] >= converge_after:
+                obs.num_skipped += 1
+            elif obs.add(rec['record'], use_dateutil):
+                unchanged[stream] = 0
+            else:
+                unchanged[stream] += 1
+                if converge_after and unchanged[stream] >= converge_after:
+                    converged.extend((prefix, stream) for prefix in
+                                     _record_prefixes(stream, isinstance(line, bytes)))
+
+    for stream, obs in streams.items():
+        for record in reservoirs[stream]:
+            obs.add(record, use_dateutil)
+    return streams
+
+
+def merge_streams(acc, other):
+    for stream, observations in other.items():
+        if stream in acc:
+            acc[stream].merge(observations)
+        else:
+            acc[stream] = observations
+    return acc
+
+
+def _observations_to_json(observations):
+    data = {'tree': observations.tree,
+            'num_records': observations.num_records,
+            'num_skipped': observations.num_skipped}
+    if observations.summaries is not None:
+        data['summaries'] = [[list(path), kind, summary.to_json()]
+                             for (path, kind), summary in observations.summaries.items()]
+    return data
+
+
+def _observations_from_json(data):
+    summaries = None
+    if 'summaries' in data:
+        summaries = {(tuple(path), kind): PathSummary.from_json(summary)
+                     for path, kind, summary in data['summaries']}
+    return Observations(data['tree'], data['num_records'], data['num_skipped'], summaries)
+
+
+def _streams_to_json(streams):
+    return {stream: _observations_to_json(observations)
+            for stream, observations in streams.items()}
+
+
+def _streams_from_json(data):
+    return {stream: _observations_from_json(obs) for stream, obs in data.items()}
+
+
+def save_observations(path, streams, files=None):
+    """Writes streams, a dict of stream name to Observations, to a gzip
+    compressed JSON cache at path, replacing any earlier version
+    atomically.
+
+    files maps the absolute path of each input file already observed to
+    a dict of its 'signature' and the 'streams' observed in it, so that
+    later runs can skip it, or observe it again if it has changed."""
+    cache = {
+        'version': CACHE_VERSION,
+        'streams': _streams_to_json(streams),
+        'files': {name: {'signature': entry['signature'],
+                         'streams': _streams_to_json(entry['streams'])}
+                  for name, entry in (files or {}).items()},
+    }
+    tmp_file = "{}.{}.tmp".format(path, os.getpid())
+    with gzip.open(tmp_file, 'wt', encoding='utf-8') as file:
+        json.dump(cache, file, separators=(',', ':'))
+    os.replace(tmp_file, path)
+
+
+def load_observations(path):
+    """Reads a cache written by save_observations and returns its streams
+    and files."""
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        cache = json.load(file)
+    if cache.get('version') != CACHE_VERSION:
+        raise ValueError('{} is not a version {} observation cache'.format(path, CACHE_VERSION))
+    files = OrderedDict(
+        (name, {'signature': entry['signature'],
+                'streams': _streams_from_json(entry['streams'])})
+        for name, entry in cache['files'].items())
+    return _streams_from_json(cache['streams']), files
+
+
+def load_caches(cache=None, merge_caches=()):
+    """Returns the streams and files of cache, if it exists, merged with
+    those of each of merge_caches, such as caches made on other machines.
+    A file seen by more than one of them is taken from the last."""
+    streams, files = {}, OrderedDict()
+    paths = list(merge_caches)
+    if cache and os.path.exists(cache):
+        paths.insert(0, cache)
+    for path in paths:
+        cached_streams, cached_files = load_observations(path)
+        merge_streams(streams, cached_streams)
+        files.update(cached_files)
+    return streams, files
+
 
+def combine_observations(streams, files):
+    """Returns the observations of streams merged with those of every file
+    in files, leaving both as they are."""
+    combined = {}
+    merge_streams(combined, copy.deepcopy(streams))
+    for entry in files.values():
+        merge_streams(combined, copy.deepcopy(entry['streams']))
+    return combined
+
+
+def file_signature(path):
+    """Returns the absolute path of a file along with its size and
+    modification time, which change if it is rewritten."""
+    stat = os.stat(path)
+    return os.path.abspath(path), [stat.st_size, stat.st_mtime_ns]
+
+
+def _process_pool(workers):
+    # Imported here, as it's slow to import and only used with --workers
+    from concurrent.futures import ProcessPoolExecutor # pylint: disable=import-outside-toplevel
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def _chunks(lines, size):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def observe_parallel(record_inputs, use_dateutil, workers, sample_size=None, # pylint: disable=too-many-arguments
+                     converge_after=None, summarize=False):
+    """Like observe, but observes chunks of record_inputs on a pool of
+    worker processes and merges the results in input order. Sampling and
+    convergence apply to each chunk separately."""
+    streams = {}
+    pending = deque()
+    with _process_pool(workers) as pool:
+        for chunk in _chunks(record_inputs, CHUNK_SIZE):
+            pending.append(pool.submit(observe, chunk, use_dateutil, sample_size,
+                                       converge_after, summarize))
+            if len(pending) >= workers * 2:
+                merge_streams(streams, pending.popleft().result())
+        while pending:
+            merge_streams(streams, pending.popleft().result())
+    return streams
+
+
+def write_schema(out_dir, stream, observations):
+    """Writes the schema for stream to <out_dir>/<stream>.inferred.json,
+    replacing any earlier version atomically."""
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    out_file = os.path.join(out_dir, "{}.inferred.json".format(stream))
+    tmp_file = "{}.{}.tmp".format(out_file, os.getpid())
+    with open(tmp_file, 'w') as file:
+        file.write(json.dumps(observations.to_json_schema(), indent=2))
+    os.replace(tmp_file, out_file)
+
+
+def write_schemas(out_dir, streams, names):
+    for stream in names:
+        write_schema(out_dir, stream, streams[stream])
+
+
+def print_schemas(streams, keyed=False):
+    """Prints the schemas of streams as an object keyed by stream name, or
+    the schema of a single stream as is, unless keyed is set."""
+    if len(streams) == 1 and not keyed:
+        for observations in streams.values():
+            print(json.dumps(observations.to_json_schema(), indent=2))
+    else:
+        print(json.dumps({stream: observations.to_json_schema()
+                          for stream, observations in streams.items()}, indent=2))
+
+
+def report_samples(streams):
     for stream, observations in streams.items():
+        if observations.is_sampled():
+            sys.stderr.write('{}: schema inferred from a sample of {} of {} records\n'.format(
+                stream, observations.num_records,
+                observations.num_records + observations.num_skipped))
+
+
+def report_key_candidates(streams):
+    for stream, observations in streams.items():
+        candidates = observations.key_candidates()
+        if candidates:
+            sys.stderr.write('{}: candidate key properties: {}\n'.format(
+                stream, ', '.join(candidates)))
+
+
+def infer_schemas(record_inputs, out_dir, use_dateutil=False, workers=1, # pylint: disable=too-many-arguments
+                  sample_size=None, converge_after=None, cache=None, merge_caches=(),
+                  summarize=False):
+    """
+    The main logic that iterates record_inputs and prints the resulting
+    inferred schema to either outdir or stdout
+
+    If cache is set, the observations saved there, and those of any
+    merge_caches, are added to before inferring, and the result is saved
+    back to cache.
+    """
+    streams, files = load_caches(cache, merge_caches)
+    if workers > 1:
+        observed = observe_parallel(record_inputs, use_dateutil, workers,
+                                    sample_size, converge_after, summarize)
+    else:
+        observed = observe(record_inputs, use_dateutil, sample_size, converge_after,
+                           summarize)
+    merge_streams(streams, observed)
+    if cache:
+        save_observations(cache, streams, files)
+    streams = combine_observations(streams, files)
+
+    report_samples(streams)
+    report_key_candidates(streams)
+    if out_dir:
+        for stream, observations in streams.items():
+            write_schema(out_dir, stream, observations)
+    else:
+        print_schemas(streams)
+
+
+def observe_range(path, start, end, use_dateutil=False, sample_size=None, converge_after=None, # pylint: disable=too-many-arguments
+                  summarize=False):
+    return observe(inputs.read_lines(path, start, end), use_dateutil, sample_size,
+                   converge_after, summarize)
+
+
+def observe_ranges(path, use_dateutil, workers, sample_size=None, converge_after=None, # pylint: disable=too-many-arguments
+                   summarize=False):
+    """Like observe_parallel for an uncompressed file, but each worker reads
+    its own byte range of the file, so lines aren't passed between
+    processes. Sampling and convergence apply to each range separately."""
+    num_ranges = max(workers, -(-os.path.getsize(path) // RANGE_SIZE))
+    streams = {}
+    pending = deque()
+    with _process_pool(workers) as pool:
+        for start, end in inputs.split_ranges(path, num_ranges):
+            pending.append(pool.submit(observe_range, path, start, end, use_dateutil,
+                                       sample_size, converge_after, summarize))
+            if len(pending) >= workers * 2:
+                merge_streams(streams, pending.popleft().result())
+        while pending:
+            merge_streams(streams, pending.popleft().result())
+    return streams
+
+
+def observe_file(path, use_dateutil=False, sample_size=None, converge_after=None, workers=1, # pylint: disable=too-many-arguments
+                 summarize=False):
+    if workers > 1 and inputs.is_splittable(path):
+        return observe_ranges(path, use_dateutil, workers, sample_size, converge_after,
+                              summarize)
+    with open_input(path, binary=True) as record_inputs:
+        if workers > 1:
+            return observe_parallel(record_inputs, use_dateutil, workers,
+                                    sample_size, converge_after, summarize)
+        return observe(record_inputs, use_dateutil, sample_size, converge_after, summarize)
+
+
+def observe_files(paths, use_dateutil=False, sample_size=None, converge_after=None, workers=1, # pylint: disable=too-many-arguments
+                  summarize=False):
+    """Yields the observations for each of paths, in order.
+
+    With more than one worker and more than one file, whole files are
+    observed concurrently on a process pool. A single file is split into
+    byte ranges if it is uncompressed, or chunks of lines otherwise.
+    """
+    if workers > 1 and len(paths) > 1:
+        pending = deque()
+        with _process_pool(workers) as pool:
+            for path in paths:
+                pending.append(pool.submit(observe_file, path, use_dateutil,
+                                           sample_size, converge_after, 1, summarize))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    else:
+        for path in paths:
+            yield observe_file(path, use_dateutil, sample_size, converge_after, workers,
+                               summarize)
+
+
+def _forget_changed_files(paths, files):
+    """Removes those of paths that files has, but with a different size or
+    modification time, from files, so that they are observed again."""
+    for path in paths:
+        name, signature = file_signature(path)
+        if name in files and files[name]['signature'] != signature:
+            sys.stderr.write('{} changed since it was cached, so observing it again\n'.format(
+                path))
+            del files[name]
+
+
+def _new_files(paths, files):
+    """Returns the signatures of those of paths that files doesn't already
+    have, in order."""
+    signatures = OrderedDict()
+    for path in paths:
+        name, signature = file_signature(path)
+        if name not in files:
+            signatures[path] = name, signature
+    if len(signatures) < len(paths):
+        sys.stderr.write('Skipping {} files already observed in the cache\n'.format(
+            len(paths) - len(signatures)))
+    return signatures
+
+
+def _add_files(files, streams, signatures, out_dir, observed_files):
+    """Adds each of observed_files, the observations of the files in
+    signatures, to files and streams as it arrives, rewriting the schemas
+    it touched in out_dir if set."""
+    for (name, signature), observed in zip(signatures.values(), observed_files):
+        files[name] = {'signature': signature, 'streams': observed}
+        merge_streams(streams, copy.deepcopy(observed))
         if out_dir:
-            if not os.path.exists(out_dir):
-                os.makedirs(out_dir)
+            write_schemas(out_dir, streams, observed)
 
-            out_file = os.path.join(out_dir, "{}.inferred.json".format(stream))
-            with open(out_file, 'w') as file:
-                file.write(json.dumps(to_json_schema(observations), indent=2))
-        else:
-            # This is less useful now when used with more than one stream in the input
-            print(json.dumps(to_json_schema(observations), indent=2))
+
+def infer_schemas_from_files(paths, out_dir, use_dateutil=False, workers=1, # pylint: disable=too-many-arguments
+                             sample_size=None, converge_after=None, cache=None,
+                             merge_caches=(), summarize=False):
+    """Like infer_schemas, but reads from files, which may be gzip or zstd
+    compressed.
+
+    With an out_dir, the schema of each stream in a file is rewritten as
+    soon as that file has been observed, so the schemas on disk always
+    cover every file read so far.
+
+    With a cache, files already observed into it, or into any of
+    merge_caches, are skipped. The observations of each file are kept
+    apart in the cache, so a file that has changed since is observed again
+    and replaces only its own observations.
+    """
+    cached_streams, files = load_caches(cache, merge_caches)
+    _forget_changed_files(paths, files)
+    signatures = _new_files(paths, files)
+    streams = combine_observations(cached_streams, files)
+    if out_dir:
+        write_schemas(out_dir, streams, streams)
+
+    _add_files(files, streams, signatures, out_dir,
+               observe_files(list(signatures), use_dateutil, sample_size, converge_after,
+                             workers, summarize))
+    if cache:
+        save_observations(cache, cached_streams, files)
+
+    report_samples(streams)
+    report_key_candidates(streams)
+    if not out_dir:
+        print_schemas(streams, keyed=True)
 
 
 def main():
     parser = argparse.ArgumentParser()
 
-    # records defaults to stdin or otherwise expects iterable strings
+    # records defaults to stdin, otherwise any number of files or globs
     parser.add_argument(
         '-r', '--records',
-        help='Iterable Records',
-        required=False,
-        default=sys.stdin)
+        help='Files of records, optionally gzip or zstd compressed. Defaults to stdin',
+        nargs='+',
+        required=False)
 
     # out-dir redirects inferred schemas to a directory with naming "<stream>.inferred.json"
     parser.add_argument(
         '-o', '--out-dir',
         help='Output directory',
         required=False)
+
+    # Only ISO-8601 and numeric dates are recognized by default
+    parser.add_argument(
+        '--dateutil',
+        action='store_true',
+        help='Also use dateutil to recognize dates in other formats (slow)')
+
+    # workers > 1 observes chunks of the input on a process pool
+    parser.add_argument(
+        '-w', '--workers',
+        help='Number of processes to infer with',
+        type=int,
+        default=1)
+
+    # Either look at a random sample of each stream, or stop looking at a
+    # stream once its schema has stopped changing
+    sampling = parser.add_mutually_exclusive_group()
+    sampling.add_argument(
+        '--sample',
+        help='Infer from a random sample of this many records per stream',
+        type=int)
+    sampling.add_argument(
+        '--converge-after',
+        help='Stop observing a stream after this many records in a row add nothing new',
+        type=int)
+
+    # Bounded summaries of the values add lengths, ranges and enums
+    parser.add_argument(
+        '--summaries',
+        action='store_true',
+        help='Also infer maxLength, integer ranges, enums and candidate key properties')
+
+    # Observations are saved to the cache, and later runs only observe new
+    # input on top of them
+    parser.add_argument(
+        '--cache',
+        help='File to load observations from, if it exists, and save them to')
+    parser.add_argument(
+        '--merge-cache',
+        help='Other observation caches to merge in. Without --records, stdin is not read',
+        nargs='+',
+        default=[])
     parsed = parser.parse_args()
+    # Each worker would sample, or converge, on its own share of the input
+    if parsed.workers > 1 and (parsed.sample or parsed.converge_after):
+        parser.error('--sample and --converge-after only work with a single worker')
 
-    infer_schemas(parsed.records, parsed.out_dir)
+    if parsed.records:
+        infer_schemas_from_files(expand_paths(parsed.records), parsed.out_dir,
+                                 parsed.dateutil, parsed.workers, parsed.sample,
+                                 parsed.converge_after, parsed.cache, parsed.merge_cache,
+                                 parsed.summaries)
+    else:
+        infer_schemas([] if parsed.merge_cache else sys.stdin, parsed.out_dir,
+                      parsed.dateutil, parsed.workers, parsed.sample,
+                      parsed.converge_after, parsed.cache, parsed.merge_cache,
+                      parsed.summaries)
@@ -0,0 +1,210 @@
+"""Helpers for reading tap output from files, which may be compressed."""
+
+import glob
+import gzip
+import io
+import mmap
+import os
+import queue
+import threading
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# Bytes decompressed at a time by a ReadAhead's thread
+READ_AHEAD_SIZE = 1024 * 1024
+
+# Decompressed blocks a ReadAhead may hold before its thread waits
+MAX_READ_AHEAD_BLOCKS = 4
+
+
+def expand_paths(patterns):
+    """Returns the files matching each of patterns, which may be plain paths
+    or globs, in the order given. Raises if a pattern matches nothing."""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            raise Exception('No input files match {}'.format(pattern))
+        paths.extend(matches)
+    return paths
+
+
+class ReadAhead(io.RawIOBase):
+    """A raw stream of the bytes read from reader, a decompressing stream,
+    by a background thread. The decompressors release the GIL, so
+    decompressing the next blocks overlaps with parsing this one."""
+
+    def __init__(self, reader):
+        super().__init__()
+        self.reader = reader
+        self.blocks = queue.Queue(maxsize=MAX_READ_AHEAD_BLOCKS)
+        self.block = memoryview(b'')
+        self.done = False
+        self.stopping = False
+        self.thread = threading.Thread(target=self._read_ahead, name='read-ahead', daemon=True)
+        self.thread.start()
+
+    def _read_ahead(self):
+        try:
+            while not self.stopping:
+                block = self.reader.read(READ_AHEAD_SIZE)
+                self.blocks.put(block)
+                if not block:
+                    return
+        except Exception as exc: # pylint: disable=broad-except
+            self.blocks.put(exc)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.block:
+            if self.done:
+                return 0
+            block = self.blocks.get()
+            if isinstance(block, Exception):
+                self.done = True
+                raise block
+            if not block:
+                self.done = True
+                return 0
+            self.block = memoryview(block)
+        size = min(len(buffer), len(self.block))
+        buffer[:size] = self.block[:size]
+        self.block = self.block[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            # Take blocks until the thread sees it should stop, in case
+            # it's waiting to put one
+            self.stopping = True
+            while self.thread.is_alive():
+                try:
+                    self.blocks.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self.reader.close()
+        super().close()
+
+
+def _wrap(reader, binary):
+    reader = io.BufferedReader(ReadAhead(reader))
+    if binary:
+        return reader
+    return io.TextIOWrapper(reader, encoding='utf-8')
+
+
+def _open_zstd(path, binary=False):
+    try:
+        import zstandard # pylint: disable=import-outside-toplevel
+    except ImportError:
+        raise Exception('Reading zstd-compressed file {} requires the zstandard '
+                        'package. Install it with pip install singer-tools[zstd]'
+                        .format(path))
+    raw = open(path, 'rb')
+    return _wrap(zstandard.ZstdDecompressor().stream_reader(
+        raw, read_across_frames=True, closefd=True), binary)
+
+
+def _read_magic(path):
+    with open(path, 'rb') as file_obj:
+        return file_obj.read(4)
+
+
+def open_input(path, binary=False):
+    """Opens path for reading lines of text, or of bytes if binary is set,
+    transparently decompressing gzip and zstd files. Compression is
+    detected from the file's magic number rather than its name, and
+    compressed files are decompressed ahead on a background thread.
+
+    Reading bytes skips decoding and building a str for every line; the
+    JSON decoders take bytes as they are.
+    """
+    magic = _read_magic(path)
+    if magic.startswith(GZIP_MAGIC):
+        return _wrap(gzip.open(path, 'rb'), binary)
+    if magic == ZSTD_MAGIC:
+        return _open_zstd(path, binary)
+    if binary:
+        return open(path, 'rb')
+    return open(path, 'r', encoding='utf-8')
+
+
+def input_lines(paths):
+    """Yields the lines of text of each of paths in turn, as one stream of
+    output."""
+    for path in paths:
+        with open_input(path) as file_obj:
+            yield from file_obj
+
+
+def is_splittable(path):
+    """Returns whether path is a non-empty, uncompressed regular file, which
+    split_ranges can divide up."""
+    if not os.path.isfile(path) or os.path.getsize(path) == 0:
+        return False
+    magic = _read_magic(path)
+    return not magic.startswith(GZIP_MAGIC) and magic != ZSTD_MAGIC
+
+
+def split_ranges(path, num_ranges):
+    """Divides path into at most num_ranges (start, end) byte ranges of
+    about equal size, each made of whole lines, for read_lines.
+
+    The file is memory mapped to find the newline nearest each split
+    point, so only the pages around those points are read.
+    """
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, 'rb') as file_obj, \
+         mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        for i in range(1, num_ranges):
+            newline = mapped.find(b'\n', max(size * i // num_ranges - 1, bounds[-1]))
+            if newline == -1 or newline + 1 >= size:
+                break
+            if newline + 1 > bounds[-1]:
+                bounds.append(newline + 1)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def read_lines(path, start=0, end=None):
+    """Yields the lines, as bytes, of path from offset start, which must be
+    the start of a line, up to offset end. A compressed file is
+    decompressed, but can only be read whole.
+
+    Lines are read through a buffered binary file rather than by slicing a
+    memory map: in CPython, a readline call per line on a map, plus its
+    page faults, is slower than buffered reads.
+    """
+    if not start and end is None:
+        with open_input(path, binary=True) as file_obj:
+            yield from file_obj
+        return
+    with open(path, 'rb') as file_obj:
+        file_obj.seek(start)
+        if end is None:
+            yield from file_obj
+            return
+        position = start
+        for line in file_obj:
+            position += len(line)
+            yield line
+            if position >= end:
+                return
+
+
+def complete_lines(pending, chunk):
+    """Adds chunk, read from a stream of lines, to pending, the pieces of
+    the incomplete line read so far. Returns the lines completed by chunk,
+    as bytes without their final newline, or None if it completed none."""
+    complete, newline, partial = chunk.rpartition(b'\n')
+    if not newline:
+        pending.append(chunk)
+        return None
+    pending.append(complete)
+    lines = b''.join(pending)
+    pending[:] = [partial] if partial else []
+    return lines
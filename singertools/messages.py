@@ -0,0 +1,144 @@
+"""JSON decoding and lightweight Singer message parsing shared by the tools.
+
+loads uses the fastest JSON library installed: orjson, then ujson, then
+the standard library. parse_message builds small namedtuples rather than
+singer-python's message objects, which is all the tools need to count,
+validate and compare messages.
+"""
+
+from collections import namedtuple
+import decimal
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+Record = namedtuple('Record', ['stream', 'record', 'version'])
+Schema = namedtuple('Schema', ['stream', 'schema', 'key_properties', 'bookmark_properties'])
+State = namedtuple('State', ['value'])
+ActivateVersion = namedtuple('ActivateVersion', ['stream', 'version'])
+
+# Integers of 20 or more digits may not fit in 64 bits, which some fast
+# decoders silently turn into floats. Lines with a run of digits that
+# long are decoded with the standard library instead. Mapping every digit
+# to 0 and searching for a run of zeros is much faster than a regex.
+_DIGITS_TO_ZERO = bytes.maketrans(b'123456789', b'000000000')
+_LONG_DIGITS = b'0' * 20
+
+
+def _stdlib_loads(line):
+    return json.loads(line)
+
+
+def _decoders():
+    decoders = {'json': _stdlib_loads}
+    if ujson is not None:
+        decoders['ujson'] = ujson.loads
+    if orjson is not None:
+        decoders['orjson'] = orjson.loads # pylint: disable=no-member
+    return decoders
+
+
+DECODERS = _decoders()
+
+# Name of the decoder loads uses. Change it with set_decoder.
+DECODER = 'orjson' if 'orjson' in DECODERS else 'ujson' if 'ujson' in DECODERS else 'json'
+_fast_loads = DECODERS[DECODER]
+
+
+def set_decoder(name):
+    """Makes loads use the named decoder, one of DECODERS."""
+    global DECODER, _fast_loads # pylint: disable=global-statement
+    if name not in DECODERS:
+        raise Exception('JSON decoder {} is not installed. Available: {}'.format(
+            name, ', '.join(sorted(DECODERS))))
+    DECODER = name
+    _fast_loads = DECODERS[name]
+
+
+def loads(line):
+    """Decodes a line of JSON with the current decoder.
+
+    Non-integral numbers become floats. Lines that might hold integers
+    wider than 64 bits, and anything the fast decoders reject but the
+    standard library accepts, such as NaN, are decoded with the standard
+    library.
+    """
+    if _fast_loads is _stdlib_loads:
+        return json.loads(line)
+    if isinstance(line, str):
+        line = line.encode('utf-8')
+    if _LONG_DIGITS in line.translate(_DIGITS_TO_ZERO):
+        return json.loads(line)
+    try:
+        return _fast_loads(line)
+    except ValueError:
+        return json.loads(line)
+
+
+def loads_exact(line):
+    """Decodes a line of JSON with non-integral numbers as Decimals, as
+    singer-python does."""
+    return json.loads(line, parse_float=decimal.Decimal)
+
+
+def _required_key(msg, k):
+    if k not in msg:
+        raise Exception("Message is missing required key '{}': {}".format(k, msg))
+    return msg[k]
+
+
+def parse_message(line, exact=False):
+    """Parses a line of tap output into a Record, Schema, State or
+    ActivateVersion, or None for any other message type.
+
+    Records are decoded with loads unless exact is set. SCHEMA messages
+    are always decoded with loads_exact, so schema constants keep their
+    precision.
+    """
+    obj = loads_exact(line) if exact else loads(line)
+    msg_type = _required_key(obj, 'type')
+
+    if msg_type == 'RECORD':
+        return Record(stream=_required_key(obj, 'stream'),
+                      record=_required_key(obj, 'record'),
+                      version=obj.get('version'))
+
+    elif msg_type == 'SCHEMA':
+        if not exact:
+            obj = loads_exact(line)
+        return Schema(stream=_required_key(obj, 'stream'),
+                      schema=_required_key(obj, 'schema'),
+                      key_properties=_required_key(obj, 'key_properties'),
+                      bookmark_properties=obj.get('bookmark_properties'))
+
+    elif msg_type == 'STATE':
+        return State(value=_required_key(obj, 'value'))
+
+    elif msg_type == 'ACTIVATE_VERSION':
+        return ActivateVersion(stream=_required_key(obj, 'stream'),
+                               version=_required_key(obj, 'version'))
+
+    return None
+
+
+def has_decimals(value):
+    """Returns True if value, a decoded JSON document, holds a Decimal."""
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, decimal.Decimal):
+            return True
+        if isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+    return False
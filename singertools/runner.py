@@ -0,0 +1,232 @@
+"""Runs a tap as an asyncio subprocess and feeds its output to a consumer.
+
+stdout is read in large binary chunks and split into lines here, rather
+than line by line through a text-mode pipe. Chunks of lines are handed to
+the consumer, which runs on its own thread, through a bounded queue, so a
+slow consumer slows the tap down instead of buffering its output. stderr
+is drained concurrently into a ring buffer of its last lines, so a chatty
+tap can't fill the pipe and block, and the tail can be shown if the tap
+fails.
+
+The tap is started in a session of its own, so that stopping it also
+stops any processes it started, such as the tap behind a shell wrapper,
+which would otherwise keep its pipes open.
+"""
+
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import os
+import queue
+import signal
+import sys
+import threading
+
+import attr
+
+from singertools.inputs import complete_lines
+
+# Bytes to read from the tap's stdout at a time
+READ_SIZE = 256 * 1024
+
+# Chunks of lines that may wait for the consumer before reading stops
+MAX_QUEUED_CHUNKS = 4
+
+# Lines of stderr to keep
+STDERR_LINES = 100
+
+# Longest partial line of stderr to keep while waiting for its newline
+MAX_STDERR_LINE = 64 * 1024
+
+# Seconds a terminated tap has to exit before it's killed
+TERMINATE_SECONDS = 5
+
+
+@attr.s
+class TapRun(object):
+
+    # What the consumer returned
+    result = attr.ib(default=None)
+    returncode = attr.ib(default=None)
+    # Whether the consumer returned before the end of the output, in which
+    # case the tap was terminated
+    stopped_early = attr.ib(default=False)
+    timed_out = attr.ib(default=False)
+    stderr_tail = attr.ib(default=attr.Factory(lambda: deque(maxlen=STDERR_LINES)),
+                          repr=False)
+
+    def stderr_lines(self):
+        return [line.decode('utf-8', 'replace') for line in self.stderr_tail]
+
+
+class LineQueue(object):
+    """A bounded queue of chunks of lines, iterated over line by line by
+    the consumer thread until the reader puts None or aborts."""
+
+    def __init__(self):
+        self.chunks = queue.Queue(maxsize=MAX_QUEUED_CHUNKS)
+        self.aborted = threading.Event()
+        self.reached_end = False
+
+    def __iter__(self):
+        while True:
+            lines = self.chunks.get()
+            if self.aborted.is_set():
+                return
+            if lines is None:
+                self.reached_end = True
+                return
+            for line in lines:
+                yield line
+
+    def abort(self):
+        """Makes the consumer stop at its next chunk, and frees space for
+        a reader blocked on a full queue."""
+        self.aborted.set()
+        while True:
+            try:
+                self.chunks.get_nowait()
+            except queue.Empty:
+                break
+        try:
+            self.chunks.put_nowait(None)
+        except queue.Full:
+            pass
+
+
+async def _put(line_queue, lines, loop, executor):
+    try:
+        line_queue.chunks.put_nowait(lines)
+    except queue.Full:
+        await loop.run_in_executor(executor, line_queue.chunks.put, lines)
+
+
+async def _read_stdout(stream, line_queue, loop, executor):
+    pending = []
+    while True:
+        chunk = await stream.read(READ_SIZE)
+        if not chunk:
+            break
+        complete = complete_lines(pending, chunk)
+        # Decode whole lines only, so a multi-byte character is never
+        # split across chunks
+        if complete is not None:
+            await _put(line_queue, complete.decode('utf-8').split('\n'), loop, executor)
+    if pending:
+        await _put(line_queue, [b''.join(pending).decode('utf-8')], loop, executor)
+    await _put(line_queue, None, loop, executor)
+
+
+async def _drain_stderr(stream, tail, echo):
+    pending = b''
+    while True:
+        chunk = await stream.read(READ_SIZE)
+        if not chunk:
+            break
+        if echo:
+            sys.stderr.write(chunk.decode('utf-8', 'replace'))
+            sys.stderr.flush()
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()[-MAX_STDERR_LINE:]
+        tail.extend(lines)
+    if pending:
+        tail.append(pending)
+
+
+def _abort_on_error(line_queue):
+    def callback(reader):
+        if not reader.cancelled() and reader.exception() is not None:
+            line_queue.abort()
+    return callback
+
+
+def _signal_tap(process, sig):
+    """Sends sig to the tap and every process in its session."""
+    try:
+        os.killpg(process.pid, sig)
+    except ProcessLookupError:
+        # Everything in it has exited already
+        pass
+
+
+async def _stop_tap(process, terminate):
+    """Terminates the tap and the processes it started, killing them if
+    they don't exit in time, or kills them at once."""
+    if terminate:
+        _signal_tap(process, signal.SIGTERM)
+        try:
+            await asyncio.wait_for(process.wait(), TERMINATE_SECONDS)
+            return
+        except asyncio.TimeoutError:
+            pass
+    _signal_tap(process, signal.SIGKILL)
+
+
+def _remaining(deadline, loop):
+    return None if deadline is None else max(deadline - loop.time(), 0)
+
+
+async def _run(cmd, consume, echo_stderr, timeout, loop, executor, started): # pylint: disable=too-many-arguments
+    process = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        limit=READ_SIZE, start_new_session=True)
+    started.append(process)
+    deadline = None if timeout is None else loop.time() + timeout
+    run = TapRun()
+    line_queue = LineQueue()
+    reader = loop.create_task(_read_stdout(process.stdout, line_queue, loop, executor))
+    reader.add_done_callback(_abort_on_error(line_queue))
+    drainer = loop.create_task(_drain_stderr(process.stderr, run.stderr_tail, echo_stderr))
+    consumer = loop.run_in_executor(executor, consume, line_queue)
+    try:
+        run.result = await asyncio.wait_for(consumer, _remaining(deadline, loop))
+        if line_queue.reached_end or line_queue.aborted.is_set():
+            # Raises anything that went wrong reading the output
+            await reader
+            await asyncio.wait_for(process.wait(), _remaining(deadline, loop))
+        else:
+            run.stopped_early = True
+    except asyncio.TimeoutError:
+        run.timed_out = True
+    finally:
+        line_queue.abort()
+        reader.cancel()
+        if not line_queue.reached_end or process.returncode is None:
+            # Even if the tap has exited, processes it started may still
+            # hold its pipes open
+            await _stop_tap(process, run.stopped_early)
+        await process.wait()
+        # Anything the tap wrote to stderr as it exited
+        await asyncio.wait([drainer], timeout=1)
+        drainer.cancel()
+    run.returncode = process.returncode
+    return run
+
+
+def run_tap(cmd, consume, echo_stderr=False, timeout=None):
+    """Runs cmd, passing an iterable of the lines of its stdout, without
+    newlines, to consume on another thread, and returns a TapRun.
+
+    If consume returns before the end of the output, the tap is
+    terminated. If it raises, the tap is killed and the exception is
+    raised here. If the tap and consume haven't both finished within
+    timeout seconds, the tap is killed and the run is marked timed_out.
+    With echo_stderr, the tap's stderr is copied to ours as it arrives.
+    """
+    loop = asyncio.new_event_loop()
+    # Attaches the child watcher to this loop on Pythons that need one
+    asyncio.set_event_loop(loop)
+    executor = ThreadPoolExecutor(max_workers=2)
+    started = []
+    try:
+        return loop.run_until_complete(
+            _run(cmd, consume, echo_stderr, timeout, loop, executor, started))
+    except KeyboardInterrupt:
+        # The tap's session doesn't get the terminal's interrupt
+        for process in started:
+            _signal_tap(process, signal.SIGKILL)
+        raise
+    finally:
+        executor.shutdown(wait=True)
+        asyncio.set_event_loop(None)
+        loop.close()
@@ -0,0 +1,204 @@
+"""Per-stream statistics collected by singer-check-tap in one pass, in
+memory that doesn't grow with the number of records."""
+
+import hashlib
+import json
+import math
+
+import attr
+
+# Fields per stream to count nulls for. Records with more distinct
+# top-level fields than this only have the first ones counted.
+MAX_FIELDS = 1000
+
+
+def hash64(value):
+    """Hashes a JSON value to 64 bits, the same way in every process."""
+    encoded = json.dumps(value, sort_keys=True, default=str).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(encoded, digest_size=8).digest(), 'big')
+
+
+class HyperLogLog(object):
+    """Estimates the number of distinct 64-bit hashes added, with a
+    standard error of about 1.04 / sqrt(2 ** precision), in 2 ** precision
+    bytes."""
+
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, hashed):
+        index = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def fewer_than(self, num):
+        """Returns whether clearly fewer than num distinct hashes were added,
+        beyond the error of the estimate."""
+        return self.count() < num * (1 - 3 * self.error())
+
+    def count(self):
+        num_registers = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / num_registers)
+        estimate = alpha * num_registers ** 2 / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * num_registers and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = num_registers * math.log(num_registers / zeros)
+        return int(round(estimate))
+
+
+def _bound(current, value, pick):
+    if value is None:
+        return current
+    if current is None:
+        return value
+    try:
+        return pick(current, value)
+    except TypeError:
+        # Values that don't compare, such as None against a string, can't
+        # move the bound
+        return current
+
+
+def min_value(current, value):
+    """Returns the lesser of two replication key values, either of which
+    may be None."""
+    return _bound(current, value, min)
+
+
+def max_value(current, value):
+    """Returns the greater of two replication key values, either of which
+    may be None."""
+    return _bound(current, value, max)
+
+
+def _to_json(value):
+    # Replication key values may be Decimals, which json can't encode
+    return json.loads(json.dumps(value, default=str))
+
+
+@attr.s
+class StreamStats(object): # pylint: disable=too-many-instance-attributes
+    """Statistics for one stream's records.
+
+    non_null counts the records with a non-null value for each top-level
+    field; a field's null count is the number of records less that, so
+    fields that are missing from a record count as null too.
+    """
+
+    num_records = attr.ib(default=0)
+    non_null = attr.ib(default=attr.Factory(dict))
+    fields_truncated = attr.ib(default=False)
+    keys = attr.ib(default=attr.Factory(HyperLogLog), cmp=False, repr=False)
+    min_replication_value = attr.ib(default=None)
+    max_replication_value = attr.ib(default=None)
+    # Records by the bit length of their size in bytes, i.e. size_histogram[i]
+    # counts records of 2 ** (i - 1) to 2 ** i - 1 bytes
+    size_histogram = attr.ib(default=attr.Factory(lambda: [0] * 64), repr=False)
+    max_size = attr.ib(default=0)
+
+    def add(self, record, key_properties, bookmark_properties):
+        self.num_records += 1
+        non_null = self.non_null
+        for field, value in record.items():
+            if value is not None:
+                if field in non_null:
+                    non_null[field] += 1
+                elif len(non_null) < MAX_FIELDS:
+                    non_null[field] = 1
+                else:
+                    self.fields_truncated = True
+            elif field not in non_null and len(non_null) < MAX_FIELDS:
+                non_null[field] = 0
+
+        if key_properties:
+            self.keys.add(hash64([record.get(p) for p in key_properties]))
+        if bookmark_properties:
+            value = tuple(record.get(p) for p in bookmark_properties)
+            if None in value:
+                # Records without a replication key don't bound it
+                return
+            self.min_replication_value = min_value(self.min_replication_value, value)
+            self.max_replication_value = max_value(self.max_replication_value, value)
+
+    def add_size(self, size):
+        self.size_histogram[size.bit_length()] += 1
+        self.max_size = max(self.max_size, size)
+
+    def add_fields(self, fields):
+        """Makes sure each of fields, such as the schema's properties, has a
+        null count, even if no record had it."""
+        for field in fields:
+            if field not in self.non_null and len(self.non_null) < MAX_FIELDS:
+                self.non_null[field] = 0
+
+    def merge(self, other):
+        self.num_records += other.num_records
+        for field, count in other.non_null.items():
+            if field in self.non_null:
+                self.non_null[field] += count
+            elif len(self.non_null) < MAX_FIELDS:
+                self.non_null[field] = count
+            else:
+                self.fields_truncated = True
+        self.fields_truncated = self.fields_truncated or other.fields_truncated
+        self.keys.merge(other.keys)
+        self.min_replication_value = min_value(self.min_replication_value,
+                                               other.min_replication_value)
+        self.max_replication_value = max_value(self.max_replication_value,
+                                               other.max_replication_value)
+        self.size_histogram = [a + b for a, b in zip(self.size_histogram, other.size_histogram)]
+        self.max_size = max(self.max_size, other.max_size)
+
+    def null_counts(self):
+        return {field: self.num_records - count for field, count in self.non_null.items()}
+
+    def always_null(self):
+        return sorted(field for field, count in self.non_null.items() if count == 0)
+
+    def distinct_keys(self):
+        return self.keys.count()
+
+    def likely_duplicate_keys(self):
+        """Returns whether there are clearly fewer distinct keys than
+        records, beyond the error of the estimate."""
+        return self.keys.fewer_than(self.num_records)
+
+    def size_percentile(self, fraction):
+        """Returns an upper bound on the given percentile of record sizes,
+        from the histogram: the top of the bucket it falls in."""
+        if not self.num_records:
+            return None
+        wanted = fraction * self.num_records
+        seen = 0
+        for bits, count in enumerate(self.size_histogram):
+            seen += count
+            if seen >= wanted:
+                return min(2 ** bits - 1, self.max_size)
+        return self.max_size
+
+    def report(self, key_properties):
+        return {
+            'null_counts': self.null_counts(),
+            'fields_truncated': self.fields_truncated,
+            'distinct_keys': self.distinct_keys() if key_properties else None,
+            'likely_duplicate_keys': bool(key_properties) and self.likely_duplicate_keys(),
+            'min_replication_value': _to_json(self.min_replication_value),
+            'max_replication_value': _to_json(self.max_replication_value),
+            'record_bytes': {
+                'p50': self.size_percentile(0.5),
+                'p99': self.size_percentile(0.99),
+                'max': self.max_size,
+                'histogram': {2 ** bits - 1: count
+                              for bits, count in enumerate(self.size_histogram) if count},
+            },
+        }
@@ -0,0 +1,164 @@
+"""Checks Singer output while passing it through, so that singer-check-tap
+can sit in a pipeline between a tap and a target.
+
+Output is read in chunks of whatever is available and validated on a
+separate thread, fed through a bounded queue. When invalid records fail
+the check, complete lines are forwarded as soon as they are read, before
+they are validated, except that a STATE message is only forwarded once
+everything before it has been validated. A target therefore never sees a
+state that would let it resume past an invalid record. When invalid
+records are dropped or quarantined instead, the validating thread
+forwards the lines that pass, unchanged.
+"""
+
+import queue
+import threading
+
+import attr
+
+from singertools import messages
+from singertools.inputs import complete_lines
+
+# Most bytes to read from the input at a time
+READ_SIZE = 64 * 1024
+
+# Blocks of lines that may wait for validation before reading stops
+MAX_QUEUED_BLOCKS = 16
+
+ON_INVALID = ['fail', 'drop', 'quarantine']
+
+
+@attr.s
+class TeeResult(object):
+
+    summary = attr.ib()
+    # Invalid records dropped or quarantined
+    num_invalid = attr.ib(default=0)
+    # What stopped the check, if anything
+    error = attr.ib(default=None)
+
+
+def _is_invalid_record(summary, line):
+    """Returns whether line, which failed to be added to summary, is a
+    well-formed record that didn't match its stream's schema."""
+    try:
+        message = messages.parse_message(line)
+    except Exception: # pylint: disable=broad-except
+        return False
+    if not isinstance(message, messages.Record):
+        return False
+    stream = summary.streams.get(message.stream)
+    return stream is not None and stream.latest_schema is not None
+
+
+class Validator(threading.Thread):
+    """Adds blocks of lines to summary. With output, also writes the lines
+    that were added, and drops invalid records, writing them to quarantine
+    if it's set. Stops checking at the first other error, or at the first
+    invalid record without output, but keeps taking blocks so the reader
+    never blocks."""
+
+    def __init__(self, summary, output=None, quarantine=None):
+        super().__init__(name='tee-validator', daemon=True)
+        self.summary = summary
+        self.output = output
+        self.quarantine = quarantine
+        self.blocks = queue.Queue(maxsize=MAX_QUEUED_BLOCKS)
+        self.num_invalid = 0
+        self.error = None
+
+    def run(self):
+        while True:
+            item = self.blocks.get()
+            try:
+                if item is None:
+                    return
+                if self.error is None:
+                    self.check(*item)
+            except Exception as exc: # pylint: disable=broad-except
+                self.error = exc
+            finally:
+                self.blocks.task_done()
+
+    def check(self, block, terminator):
+        """Checks block, lines of bytes joined by newlines, the last of
+        which ends with terminator."""
+        raw_lines = block.split(b'\n')
+        lines = block.decode('utf-8').split('\n')
+        kept = []
+        for i, (raw, line) in enumerate(zip(raw_lines, lines)):
+            try:
+                self.summary.add_line(line)
+            except Exception as exc: # pylint: disable=broad-except
+                if self.output is None or not _is_invalid_record(self.summary, line):
+                    self.error = exc
+                    break
+                self.num_invalid += 1
+                if self.quarantine is not None:
+                    self.quarantine.write(raw + b'\n')
+                continue
+            kept.append(raw + (terminator if i == len(raw_lines) - 1 else b'\n'))
+        if self.output is not None and kept:
+            self.output.write(b''.join(kept))
+            self.output.flush()
+
+
+def _forward(output, data):
+    output.write(data)
+    output.flush()
+
+
+def tee(input_stream, output, summary, on_invalid='fail', quarantine=None):
+    """Copies the lines of input_stream, a binary stream, to output while
+    adding them to summary, and returns a TeeResult.
+
+    on_invalid is one of ON_INVALID. With 'fail', every line is copied
+    until a line fails to check. With 'drop' or 'quarantine', invalid
+    records are left out, and with 'quarantine' they're written to
+    quarantine, a binary file, instead. Other errors stop copying.
+    """
+    forward = on_invalid == 'fail'
+    validator = Validator(summary, None if forward else output,
+                          quarantine if on_invalid == 'quarantine' else None)
+    validator.start()
+    pending = []
+    try:
+        while validator.error is None:
+            chunk = input_stream.read1(READ_SIZE)
+            if not chunk:
+                break
+            complete = complete_lines(pending, chunk)
+            if complete is None:
+                continue
+            if not forward:
+                validator.blocks.put((complete, b'\n'))
+                continue
+
+            state_at = complete.find(b'"STATE"')
+            if state_at == -1:
+                _forward(output, complete + b'\n')
+                validator.blocks.put((complete, b'\n'))
+                continue
+            # Hold back what may be a STATE message until everything
+            # before it is known to be valid
+            line_start = complete.rfind(b'\n', 0, state_at) + 1
+            _forward(output, complete[:line_start])
+            validator.blocks.put((complete, b'\n'))
+            validator.blocks.join()
+            if validator.error is None:
+                _forward(output, complete[line_start:] + b'\n')
+
+        if pending and validator.error is None:
+            pending = b''.join(pending)
+            if forward:
+                validator.blocks.put((pending, b''))
+                validator.blocks.join()
+                if validator.error is None:
+                    _forward(output, pending)
+            else:
+                validator.blocks.put((pending, b''))
+    finally:
+        validator.blocks.put(None)
+        validator.join()
+    summary.finish()
+    return TeeResult(summary, validator.num_invalid, validator.error)
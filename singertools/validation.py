@@ -0,0 +1,321 @@
+"""Compiles JSON schemas into specialized validation functions.
+
+jsonschema's validators walk the schema generically for every record.
+compile_schema instead turns a schema into nested closures that check
+types, properties and formats directly. A compiled check only says
+whether an instance is valid. CompiledValidator re-validates invalid
+instances with jsonschema to raise its error, so errors are exactly the
+same as without compilation. Schemas using keywords the compiler doesn't
+handle raise UnsupportedSchema, and should be validated with jsonschema.
+"""
+
+from datetime import datetime
+import numbers
+import re
+
+from strict_rfc3339 import rfc3339_to_timestamp
+
+PYTHON_TYPES = {
+    'array': list,
+    'boolean': bool,
+    'integer': int,
+    'null': type(None),
+    'number': numbers.Number,
+    'object': dict,
+    'string': str,
+}
+
+SUPPORTED_KEYWORDS = {
+    'additionalProperties', 'allOf', 'anyOf', 'enum', 'format', 'items', 'maxItems',
+    'maxLength', 'maximum', 'minItems', 'minLength', 'minimum', 'multipleOf', 'pattern',
+    'properties', 'required', 'type',
+}
+
+# Keywords jsonschema's Draft4Validator acts on that compile_schema
+# doesn't. It ignores any other keywords, and so does compile_schema. These
+# are listed rather than taken from Draft4Validator so that jsonschema is
+# only imported if a schema needs it.
+UNSUPPORTED_KEYWORDS = {
+    '$ref', 'additionalItems', 'dependencies', 'maxProperties', 'minProperties', 'not',
+    'oneOf', 'patternProperties', 'uniqueItems',
+}
+
+_FORMAT_CHECKER = None
+
+
+class UnsupportedSchema(Exception):
+    pass
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Number) and not isinstance(value, bool)
+
+
+def _always_valid(_value):
+    return True
+
+
+def _all(checks, exhaustive=False):
+    if not checks:
+        return _always_valid
+    if len(checks) == 1:
+        return checks[0]
+    if exhaustive:
+        def check_every(value):
+            valid = True
+            for check_one in checks:
+                if not check_one(value):
+                    valid = False
+            return valid
+        return check_every
+    if len(checks) == 2:
+        first, second = checks
+        return lambda value: first(value) and second(value)
+
+    def check(value):
+        for check_one in checks:
+            if not check_one(value):
+                return False
+        return True
+    return check
+
+
+def _check_every_value(check, values):
+    valid = True
+    for value in values:
+        if not check(value):
+            valid = False
+    return valid
+
+
+def _compile_type(types, _schema, _exhaustive):
+    if isinstance(types, str):
+        types = [types]
+    if not isinstance(types, list) or not all(t in PYTHON_TYPES for t in types):
+        raise UnsupportedSchema('Unsupported type {!r}'.format(types))
+    python_types = tuple(PYTHON_TYPES[t] for t in types)
+    if 'boolean' in types:
+        return lambda value: isinstance(value, python_types)
+    # bool is an int, but only a boolean to JSON schema
+    return lambda value: isinstance(value, python_types) and not isinstance(value, bool)
+
+
+def _compile_properties(properties, _schema, exhaustive):
+    if not isinstance(properties, dict):
+        raise UnsupportedSchema('properties must be an object')
+    compiled = []
+    date_times = []
+    for name, subschema in properties.items():
+        date_time = isinstance(subschema, dict) and subschema.get('format') == 'date-time'
+        if date_time:
+            date_times.append(name)
+        # Date-time properties are parsed below, which checks the format too
+        compiled.append((name, compile_schema(subschema, not date_time, exhaustive)))
+
+    def check(value):
+        valid = True
+        if isinstance(value, dict):
+            for name, check_property in compiled:
+                if name in value and not check_property(value[name]):
+                    if not exhaustive:
+                        return False
+                    valid = False
+        elif not date_times:
+            return True
+        # As check_tap.extend_with_default does, parse every date-time
+        # property, raising if it doesn't parse
+        for name in date_times:
+            prop = value.get(name)
+            if prop is not None:
+                datetime.utcfromtimestamp(rfc3339_to_timestamp(prop))
+        return valid
+    return check
+
+
+def _compile_required(required, _schema, _exhaustive):
+    return lambda value: not isinstance(value, dict) or all(p in value for p in required)
+
+
+def _compile_additional_properties(additional, schema, exhaustive):
+    known = set(schema.get('properties', {}))
+    if isinstance(additional, dict):
+        check_extra = compile_schema(additional, exhaustive=exhaustive)
+        if exhaustive:
+            return lambda value: not isinstance(value, dict) or _check_every_value(
+                check_extra, [v for k, v in value.items() if k not in known])
+        return lambda value: not isinstance(value, dict) or all(
+            check_extra(v) for k, v in value.items() if k not in known)
+    if not additional:
+        return lambda value: not isinstance(value, dict) or all(k in known for k in value)
+    return None
+
+
+def _compile_items(items, _schema, exhaustive):
+    if not isinstance(items, dict):
+        raise UnsupportedSchema('Only a single schema for items is supported')
+    check_item = compile_schema(items, exhaustive=exhaustive)
+    if exhaustive:
+        return lambda value: not isinstance(value, list) or _check_every_value(check_item, value)
+    return lambda value: not isinstance(value, list) or all(check_item(i) for i in value)
+
+
+def _compile_any_of(subschemas, _schema, _exhaustive):
+    # jsonschema collects every error of each subschema until one is
+    # valid, so anything that raises anywhere in a subschema is reached
+    checks = [compile_schema(subschema, exhaustive=True) for subschema in subschemas]
+    return lambda value: any(check(value) for check in checks)
+
+
+def _compile_all_of(subschemas, _schema, exhaustive):
+    return _all([compile_schema(subschema, exhaustive=exhaustive) for subschema in subschemas],
+                exhaustive)
+
+
+def _compile_enum(enums, _schema, _exhaustive):
+    return lambda value: value in enums
+
+
+def _compile_minimum(minimum, schema, _exhaustive):
+    if schema.get('exclusiveMinimum', False):
+        return lambda value: not _is_number(value) or not value <= minimum
+    return lambda value: not _is_number(value) or not value < minimum
+
+
+def _compile_maximum(maximum, schema, _exhaustive):
+    if schema.get('exclusiveMaximum', False):
+        return lambda value: not _is_number(value) or not value >= maximum
+    return lambda value: not _is_number(value) or not value > maximum
+
+
+def _compile_multiple_of(multiple, _schema, _exhaustive):
+    if isinstance(multiple, float):
+        def check(value):
+            if not _is_number(value):
+                return True
+            quotient = value / multiple
+            return int(quotient) == quotient
+        return check
+    return lambda value: not _is_number(value) or not value % multiple
+
+
+def _compile_min_length(length, _schema, _exhaustive):
+    return lambda value: not isinstance(value, str) or not len(value) < length
+
+
+def _compile_max_length(length, _schema, _exhaustive):
+    return lambda value: not isinstance(value, str) or not len(value) > length
+
+
+def _compile_pattern(pattern, _schema, _exhaustive):
+    try:
+        regex = re.compile(pattern)
+    except re.error:
+        # jsonschema only fails on it when validating a string
+        raise UnsupportedSchema('Invalid pattern {!r}'.format(pattern))
+    return lambda value: not isinstance(value, str) or regex.search(value) is not None
+
+
+def _compile_min_items(length, _schema, _exhaustive):
+    return lambda value: not isinstance(value, list) or not len(value) < length
+
+
+def _compile_max_items(length, _schema, _exhaustive):
+    return lambda value: not isinstance(value, list) or not len(value) > length
+
+
+def format_checker():
+    """Returns a jsonschema FormatChecker, shared by every compiled
+    schema."""
+    global _FORMAT_CHECKER # pylint: disable=global-statement
+    if _FORMAT_CHECKER is None:
+        from jsonschema import FormatChecker # pylint: disable=import-outside-toplevel
+        _FORMAT_CHECKER = FormatChecker()
+    return _FORMAT_CHECKER
+
+
+def _compile_format(format_name, check_date_time):
+    if format_name == 'date-time' and not check_date_time:
+        return None
+    checker = format_checker()
+    if format_name not in checker.checkers:
+        # As for jsonschema, formats without a checker always conform
+        return None
+    conforms = checker.conforms
+    return lambda value: conforms(value, format_name)
+
+
+COMPILERS = {
+    'additionalProperties': _compile_additional_properties,
+    'allOf': _compile_all_of,
+    'anyOf': _compile_any_of,
+    'enum': _compile_enum,
+    'items': _compile_items,
+    'maxItems': _compile_max_items,
+    'maxLength': _compile_max_length,
+    'maximum': _compile_maximum,
+    'minItems': _compile_min_items,
+    'minLength': _compile_min_length,
+    'minimum': _compile_minimum,
+    'multipleOf': _compile_multiple_of,
+    'pattern': _compile_pattern,
+    'properties': _compile_properties,
+    'required': _compile_required,
+    'type': _compile_type,
+}
+
+
+def compile_schema(schema, check_date_time=True, exhaustive=False):
+    """Returns a function of an instance that returns whether it is valid
+    under schema, with the date-time parsing of check_tap's validator.
+
+    The function may raise, where jsonschema would have raised something
+    other than a ValidationError. If check_date_time is off, date-time
+    formats aren't checked, as the caller parses them instead. If
+    exhaustive is set, every check is made even after one fails, as
+    jsonschema does when it collects all of the errors, so that anything
+    that would raise does.
+    """
+    if not isinstance(schema, dict):
+        raise UnsupportedSchema('Schema must be an object: {!r}'.format(schema))
+    unsupported = UNSUPPORTED_KEYWORDS.intersection(schema)
+    if unsupported:
+        raise UnsupportedSchema('Unsupported keywords: {}'.format(', '.join(sorted(unsupported))))
+
+    checks = []
+    for keyword, value in schema.items():
+        if keyword == 'format':
+            check = _compile_format(value, check_date_time)
+        elif keyword in COMPILERS:
+            check = COMPILERS[keyword](value, schema, exhaustive)
+        else:
+            continue
+        if check is not None:
+            checks.append(check)
+    return _all(checks, exhaustive)
+
+
+class CompiledValidator(object): # pylint: disable=too-few-public-methods
+    """Validates with a compiled check, falling back to a jsonschema
+    validator, built by build_fallback when first needed, to raise the
+    error for an invalid instance."""
+
+    def __init__(self, check, build_fallback):
+        self.check = check
+        self.build_fallback = build_fallback
+        self.fallback = None
+
+    def iter_errors(self, instance):
+        """Yields every error in instance, as jsonschema does."""
+        if self.fallback is None:
+            self.fallback = self.build_fallback()
+        return self.fallback.iter_errors(instance)
+
+    def validate(self, instance):
+        try:
+            if self.check(instance):
+                return
+        except Exception: # pylint: disable=broad-except
+            pass
+        if self.fallback is None:
+            self.fallback = self.build_fallback()
+        self.fallback.validate(instance)
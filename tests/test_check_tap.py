@@ -0,0 +1,436 @@
+import argparse
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import singer
+from jsonschema import ValidationError
+
+import singertools.check_tap as check_tap
+from singertools.check_tap import OutputSummary, ResumeCheck, StreamAcc, summarize_output
+
+SAMPLES = os.path.join(os.path.dirname(__file__), '..', 'samples')
+
+schema = {'type': 'object',
+          'properties': {'id': {'type': 'integer'},
+                         'updated_at': {'type': 'string', 'format': 'date-time'}}}
+schema2 = {'type': 'object',
+           'properties': {'id': {'type': 'string'}}}
+
+
+def schema_message(stream, schema):
+    return singer.SchemaMessage(stream=stream, schema=schema, key_properties=['id'])
+
+
+def record_message(stream, record):
+    return singer.RecordMessage(stream=stream, record=record)
+
+
+class TestOutputSummary(unittest.TestCase):
+
+    def test_validator_reused_for_same_schema(self):
+        summary = OutputSummary()
+        summary.add(schema_message('users', schema))
+        validator = summary.streams['users'].validator
+        summary.add(record_message('users', {'id': 1}))
+        summary.add(schema_message('users', dict(schema)))
+        self.assertIs(validator, summary.streams['users'].validator)
+        self.assertEqual(2, summary.streams['users'].num_schemas)
+
+    def test_validator_rebuilt_when_schema_changes(self):
+        summary = OutputSummary()
+        summary.add(schema_message('users', schema))
+        summary.add(record_message('users', {'id': 1}))
+        summary.add(schema_message('users', schema2))
+        summary.add(record_message('users', {'id': 'abc'}))
+        with self.assertRaises(ValidationError):
+            summary.add(record_message('users', {'id': 1}))
+
+    def test_record_is_not_mutated(self):
+        summary = OutputSummary()
+        summary.add(schema_message('users', schema))
+        record = {'id': 1, 'updated_at': '2017-01-01T00:00:00Z'}
+        summary.add(record_message('users', record))
+        self.assertEqual({'id': 1, 'updated_at': '2017-01-01T00:00:00Z'}, record)
+
+    def test_invalid_date_time(self):
+        summary = OutputSummary()
+        summary.add(schema_message('users', schema))
+        with self.assertRaises(Exception):
+            summary.add(record_message('users', {'id': 1, 'updated_at': 'yesterday'}))
+
+    def test_summarize_output(self):
+        with open(os.path.join(SAMPLES, 'fixerio-valid-initial.json')) as sample:
+            summary = summarize_output(sample)
+        self.assertEqual(15, summary.num_records())
+        self.assertEqual(1, summary.num_schemas())
+        self.assertEqual(1, summary.num_states)
+
+
+def lines(*messages):
+    return [json.dumps(message) + '\n' for message in messages]
+
+
+def schema_line(stream, schema):
+    return {'type': 'SCHEMA', 'stream': stream, 'schema': schema, 'key_properties': ['id']}
+
+
+def record_line(stream, record):
+    return {'type': 'RECORD', 'stream': stream, 'record': record}
+
+
+@mock.patch.object(check_tap, 'BATCH_SIZE', 2)
+class TestSummarizeOutputParallel(unittest.TestCase):
+
+    def test_matches_serial(self):
+        output = lines(schema_line('users', schema),
+                       record_line('users', {'id': 1}),
+                       record_line('users', {'id': 2}),
+                       {'type': 'STATE', 'value': {'users': 2}},
+                       schema_line('users', schema2),
+                       schema_line('orders', schema),
+                       record_line('users', {'id': 'a'}),
+                       record_line('orders', {'id': 1}),
+                       record_line('users', {'id': 'b'}),
+                       {'type': 'STATE', 'value': {'users': 'b'}})
+        serial = summarize_output(output)
+        parallel = summarize_output(output, workers=2)
+        self.assertEqual(serial, parallel)
+        self.assertEqual(['users', 'orders'], list(parallel.streams))
+        self.assertEqual({'users': 'b'}, parallel.latest_state)
+        self.assertEqual(schema2, parallel.streams['users'].latest_schema)
+
+    def test_validates_against_schema_in_force(self):
+        output = lines(schema_line('users', schema),
+                       record_line('users', {'id': 1}),
+                       schema_line('users', schema2),
+                       record_line('users', {'id': 'a'}),
+                       record_line('users', {'id': 2}))
+        with self.assertRaises(ValidationError):
+            summarize_output(output, workers=2)
+
+    def test_record_before_schema(self):
+        output = lines(schema_line('users', schema),
+                       record_line('users', {'id': 1}),
+                       record_line('orders', {'id': 1}))
+        with self.assertRaises(SystemExit):
+            summarize_output(output, workers=2)
+
+
+class TestTimings(unittest.TestCase):
+
+    output = lines(schema_line('users', schema),
+                   record_line('users', {'id': 1}),
+                   {'type': 'STATE', 'value': {}},
+                   record_line('users', {'id': 2}),
+                   {'type': 'STATE', 'value': {}},
+                   record_line('users', {'id': 3}),
+                   {'type': 'STATE', 'value': {}})
+    received_at = [100, 101, 102, 103, 107, 108, 110]
+
+    def summarize(self, summary, output, received_at):
+        for line, at in zip(output, received_at):
+            summary.add_line(line, at)
+        return summary
+
+    def test_add_line_records_timings(self):
+        summary = self.summarize(OutputSummary(started_at=99), self.output, self.received_at)
+        summary.finish()
+        report = summary.report()
+        self.assertEqual(report['max_seconds_between_states'], 5)
+        self.assertEqual(report['records'], 3)
+        users = report['streams']['users']
+        self.assertEqual(users['time_to_first_record'], 2)
+        self.assertEqual(users['records_per_second'], 3 / 7)
+        self.assertEqual(users['bytes'], sum(len(l) for l in self.output if 'RECORD' in l))
+        self.assertGreater(report['parse_seconds'], 0)
+        self.assertGreater(report['validation_seconds'], 0)
+
+    def test_bytes_are_counted_encoded(self):
+        record = json.dumps(record_line('users', {'id': 1, 'name': 'Zoë'}),
+                            ensure_ascii=False) + '\n'
+        summary = summarize_output(lines(schema_line('users', schema)) + [record],
+                                   collect_stats=True)
+        users = summary.report()['streams']['users']
+        self.assertEqual(len(record) + 1, users['bytes'])
+        self.assertEqual(len(record) + 1, users['stats']['record_bytes']['max'])
+
+    def test_merge_combines_timings(self):
+        serial = self.summarize(OutputSummary(started_at=99), self.output, self.received_at)
+        merged = self.summarize(OutputSummary(started_at=99), self.output[:3], self.received_at[:3])
+        second = OutputSummary()
+        second.streams['users'] = StreamAcc('users', latest_schema=schema,
+                                            validator=serial.streams['users'].validator)
+        merged.merge(self.summarize(second, self.output[3:], self.received_at[3:]))
+        merged_report = merged.report()
+        serial_report = serial.report()
+        for key in ['max_seconds_between_states', 'records', 'streams']:
+            self.assertEqual(merged_report[key], serial_report[key])
+
+
+class TestDecoding(unittest.TestCase):
+
+    def test_schema_with_decimals_validates_records_exactly(self):
+        money = {'type': 'object', 'properties': {'amount': {'type': 'number', 'multipleOf': 0.01}}}
+        summary = summarize_output(lines(schema_line('payments', money),
+                                         record_line('payments', {'amount': 1.1}),
+                                         record_line('payments', {'amount': 19.99})))
+        self.assertEqual(2, summary.num_records())
+        self.assertTrue(summary.streams['payments'].exact_numbers)
+        self.assertFalse(summarize_output(lines(schema_line('users', schema)))
+                         .streams['users'].exact_numbers)
+
+    @mock.patch.object(check_tap, 'BATCH_SIZE', 1)
+    def test_records_in_later_batches_validated_exactly(self):
+        money = {'type': 'object', 'properties': {'amount': {'type': 'number', 'multipleOf': 0.01}}}
+        output = lines(schema_line('payments', money),
+                       record_line('payments', {'amount': 1.1}),
+                       record_line('payments', {'amount': 19.99}),
+                       record_line('payments', {'amount': 0.07}))
+        self.assertEqual(3, summarize_output(output).num_records())
+        self.assertEqual(3, summarize_output(output, workers=2).num_records())
+
+
+def bookmarked_schema_line(stream):
+    return dict(schema_line(stream, schema), bookmark_properties=['updated_at'])
+
+
+class TestResumeCheck(unittest.TestCase):
+
+    first_output = lines(bookmarked_schema_line('users'),
+                         record_line('users', {'id': 1, 'updated_at': '2017-01-01T00:00:00Z'}),
+                         record_line('users', {'id': 2, 'updated_at': '2017-01-02T00:00:00Z'}),
+                         record_line('users', {'id': 3, 'updated_at': '2017-01-03T00:00:00Z'}),
+                         {'type': 'STATE', 'value': {'users': '2017-01-03T00:00:00Z'}})
+
+    def check(self, second_output, limit=0, workers=1):
+        first = summarize_output(self.first_output, workers=workers, collect_fingerprints=True)
+        second = OutputSummary()
+        check = ResumeCheck(first.streams, limit)
+        for line in second_output:
+            message = second.add_line(line)
+            if isinstance(message, check_tap.messages.Record):
+                check.add_record(second.streams[message.stream], message.record)
+        return check
+
+    def test_resumed(self):
+        check = self.check(lines(
+            bookmarked_schema_line('users'),
+            record_line('users', {'id': 3, 'updated_at': '2017-01-03T00:00:00Z'}),
+            record_line('users', {'id': 1, 'updated_at': '2017-01-04T00:00:00Z'}),
+            record_line('users', {'id': 4, 'updated_at': '2017-01-04T00:00:00Z'})))
+        users = check.streams['users']
+        self.assertEqual((3, 1, 2, 0), (users.num_records, users.num_reemitted,
+                                        users.num_new, users.num_before_bookmark))
+        self.assertTrue(check.resumed())
+
+    def test_started_over(self):
+        check = self.check(lines(
+            bookmarked_schema_line('users'),
+            record_line('users', {'id': 1, 'updated_at': '2017-01-01T00:00:00Z'}),
+            record_line('users', {'id': 2, 'updated_at': '2017-01-02T00:00:00Z'})))
+        self.assertEqual(2, check.streams['users'].num_before_bookmark)
+        self.assertFalse(check.resumed())
+        self.assertFalse(check.report()['streams']['users']['resumed'])
+
+    @mock.patch.object(check_tap, 'BATCH_SIZE', 2)
+    def test_fingerprints_collected_in_parallel(self):
+        serial = summarize_output(self.first_output, collect_fingerprints=True)
+        parallel = summarize_output(self.first_output, workers=2, collect_fingerprints=True)
+        self.assertEqual(3, len(parallel.streams['users'].fingerprints))
+        self.assertEqual(serial.streams['users'].fingerprints,
+                         parallel.streams['users'].fingerprints)
+        self.assertEqual(('2017-01-03T00:00:00Z',),
+                         parallel.streams['users'].max_replication_value)
+
+    def test_done_after_limit_records_of_each_stream(self):
+        check = self.check(lines(
+            bookmarked_schema_line('users'),
+            record_line('users', {'id': 3, 'updated_at': '2017-01-03T00:00:00Z'})), limit=2)
+        self.assertFalse(check.done())
+        second = OutputSummary()
+        second.add_line(lines(bookmarked_schema_line('users'))[0])
+        check.add_record(second.streams['users'], {'id': 4, 'updated_at': '2017-01-04T00:00:00Z'})
+        self.assertTrue(check.done())
+        self.assertFalse(ResumeCheck(check.first_run).done())
+
+
+class TestStats(unittest.TestCase):
+
+    output = lines(bookmarked_schema_line('users'),
+                   record_line('users', {'id': 1, 'updated_at': '2017-01-02T00:00:00Z'}),
+                   record_line('users', {'id': 2, 'name': None}),
+                   record_line('users', {'id': 1, 'updated_at': '2017-01-01T00:00:00Z'}),
+                   record_line('users', {'id': 1}),
+                   {'type': 'STATE', 'value': {'users': '2017-01-02T00:00:00Z'}})
+
+    def test_stats(self):
+        summary = summarize_output(self.output, collect_stats=True)
+        stats = summary.report()['streams']['users']['stats']
+        self.assertEqual({'id': 0, 'updated_at': 2, 'name': 4}, stats['null_counts'])
+        self.assertEqual(2, stats['distinct_keys'])
+        self.assertTrue(stats['likely_duplicate_keys'])
+        self.assertEqual(['2017-01-01T00:00:00Z'], stats['min_replication_value'])
+        self.assertEqual(['2017-01-02T00:00:00Z'], stats['max_replication_value'])
+        self.assertEqual(len(self.output[1]), stats['record_bytes']['max'])
+        self.assertEqual(4, sum(stats['record_bytes']['histogram'].values()))
+
+    def test_not_collected_by_default(self):
+        self.assertNotIn('stats', summarize_output(self.output).report()['streams']['users'])
+
+    @mock.patch.object(check_tap, 'BATCH_SIZE', 2)
+    def test_collected_in_parallel(self):
+        serial = summarize_output(self.output, collect_stats=True)
+        parallel = summarize_output(self.output, workers=2, collect_stats=True)
+        self.assertEqual(serial.report()['streams']['users']['stats'],
+                         parallel.report()['streams']['users']['stats'])
+
+
+class TestErrorCollection(unittest.TestCase):
+
+    output = lines(record_line('users', {'id': 1}),
+                   schema_line('users', schema),
+                   record_line('users', {'id': 'a'}),
+                   record_line('users', {'id': 2}),
+                   record_line('users', {'id': 'b'}),
+                   record_line('users', {'id': 'c'}),
+                   {'type': 'STATE', 'value': {}}) + ['not json']
+
+    def test_errors_grouped_and_ranked(self):
+        summary = summarize_output(self.output, collect_errors=True)
+        report = summary.report()['errors']
+        self.assertEqual(5, report['lines'])
+        groups = [(g['stream'], g['schema_path'], g['kind'], g['count'])
+                  for g in report['groups']]
+        self.assertEqual(('users', 'properties/id/type', 'type', 3), groups[0])
+        self.assertEqual({('users', '', 'RecordBeforeSchemaError', 1),
+                          (None, '', 'JSONDecodeError', 1)}, set(groups[1:]))
+        self.assertEqual('id', report['groups'][0]['samples'][0]['path'])
+        self.assertEqual(1, summary.streams['users'].num_records)
+        self.assertIsNotNone(summary.latest_state)
+
+    def test_valid_output_has_no_errors(self):
+        summary = summarize_output(lines(schema_line('users', schema),
+                                         record_line('users', {'id': 1})),
+                                   collect_errors=True)
+        self.assertIsNone(summary.report()['errors'])
+
+    @mock.patch.object(check_tap, 'BATCH_SIZE', 2)
+    def test_collected_in_parallel(self):
+        serial = summarize_output(self.output, collect_errors=True)
+        parallel = summarize_output(self.output, workers=2, collect_errors=True)
+        self.assertEqual(serial.report()['errors'], parallel.report()['errors'])
+
+
+class TestInput(unittest.TestCase):
+
+    def test_checks_files_as_one_output(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path1 = os.path.join(tmp_dir, 'one.jsonl')
+            path2 = os.path.join(tmp_dir, 'two.jsonl.gz')
+            with open(path1, 'w') as file_obj:
+                file_obj.writelines(lines(schema_line('users', schema),
+                                          record_line('users', {'id': 1})))
+            with gzip.open(path2, 'wt') as file_obj:
+                file_obj.writelines(lines(record_line('users', {'id': 2})))
+            report_path = os.path.join(tmp_dir, 'report.json')
+            argv = ['singer-check-tap', '--input', path1, path2, '--report-json', report_path,
+                    '--working-dir', tmp_dir]
+            with mock.patch('sys.argv', argv), mock.patch('builtins.print'):
+                check_tap.main()
+            with open(report_path) as report:
+                self.assertEqual(2, json.load(report)['input']['records'])
+
+
+FAKE_TAP = os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'fake_tap.py')
+
+
+class TestManifest(unittest.TestCase):
+
+    def write_json(self, tmp_dir, name, value):
+        with open(os.path.join(tmp_dir, name), 'w') as out:
+            json.dump(value, out)
+
+    def test_load_manifest(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.write_json(tmp_dir, 'manifest.json', [
+                {'tap': 'tap-foo', 'config': 'foo.json'},
+                {'tap': 'taps/tap-foo', 'config': 'foo.json', 'state': 'state.json'},
+                {'tap': 'tap-bar', 'config': 'bar.json', 'name': 'bar'}])
+            entries = check_tap.load_manifest(os.path.join(tmp_dir, 'manifest.json'))
+            self.assertEqual(['foo', 'foo-1', 'bar'], [entry['name'] for entry in entries])
+            self.assertEqual('tap-foo', entries[0]['tap'])
+            self.assertEqual(os.path.join(tmp_dir, 'taps/tap-foo'), entries[1]['tap'])
+            self.assertEqual(os.path.join(tmp_dir, 'state.json'), entries[1]['state'])
+
+    def test_manifest_names_are_unique_directory_names(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.write_json(tmp_dir, 'manifest.json', [
+                {'tap': 'tap-a', 'config': 'a.json', 'name': name}
+                for name in ['a', 'a', 'a-1', '../escape', 'x/y', '..']])
+            entries = check_tap.load_manifest(os.path.join(tmp_dir, 'manifest.json'))
+        self.assertEqual(['a', 'a-1', 'a-1-1', 'escape', 'x-y', 'entry'],
+                         [entry['name'] for entry in entries])
+
+    def test_run_manifest(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name in ['valid-initial', 'invalid-doesnt-match-schema']:
+                self.write_json(tmp_dir, name + '.json', {
+                    'replay': os.path.join(SAMPLES, 'fixerio-{}.json'.format(name))})
+            self.write_json(tmp_dir, 'manifest.json', [
+                {'tap': FAKE_TAP, 'config': 'valid-initial.json'},
+                {'tap': FAKE_TAP, 'config': 'invalid-doesnt-match-schema.json'}])
+            args = argparse.Namespace(
+                manifest=os.path.join(tmp_dir, 'manifest.json'), concurrency=2,
+                working_dir=os.path.join(tmp_dir, 'data'), workers=1, debug=False,
+                verify_resume=None, timeout=None, stats=False,
+                collect_errors=False, report_json=os.path.join(tmp_dir, 'report.json'))
+
+            with mock.patch('builtins.print'):
+                self.assertEqual(1, check_tap.run_manifest(args))
+            with open(os.path.join(tmp_dir, 'data', 'valid-initial', 'report.json')) as report:
+                self.assertEqual(15, json.load(report)['with_state']['records'])
+            with open(args.report_json) as report_file:
+                report = json.load(report_file)
+            self.assertEqual(['valid-initial', 'invalid-doesnt-match-schema'], list(report))
+            self.assertEqual(0, report['valid-initial']['returncode'])
+            self.assertEqual(15, report['valid-initial']['report']['with_state']['records'])
+            self.assertNotEqual(0, report['invalid-doesnt-match-schema']['returncode'])
+            self.assertTrue(os.path.exists(
+                os.path.join(tmp_dir, 'data', 'valid-initial', 'state.json')))
+
+
+class TestVerifyResume(unittest.TestCase):
+
+    def test_stops_wrapped_tap_early(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            wrapper = os.path.join(tmp_dir, 'tap-wrapper')
+            with open(wrapper, 'w') as file_obj:
+                # Runs the tap in a child process rather than exec'ing it
+                file_obj.write('#!/bin/sh\n"{}" "{}" "$@"\nexit $?\n'.format(
+                    sys.executable, os.path.abspath(FAKE_TAP)))
+            os.chmod(wrapper, 0o755)
+            configs = {}
+            for name, spec in [('short', {'synthetic': {'records': 20}, 'state_every': 5}),
+                               ('slow', {'synthetic': {'records': 100000}, 'rate': 100})]:
+                configs[name] = os.path.join(tmp_dir, name + '.json')
+                with open(configs[name], 'w') as file_obj:
+                    json.dump(spec, file_obj)
+            args = argparse.Namespace(
+                tap=wrapper, config=configs['short'], state=None, debug=False, workers=1,
+                verify_resume=1, stats=False, collect_errors=False, timeout=None,
+                working_dir=tmp_dir)
+
+            with mock.patch('builtins.print'):
+                first_run = check_tap.check_with_no_state(args)
+                args.config = configs['slow']
+                start = time.time()
+                _, check = check_tap.verify_resume(args, first_run)
+        self.assertTrue(check.stopped_early)
+        self.assertTrue(check.resumed())
+        self.assertLess(time.time() - start, 10)
@@ -0,0 +1,180 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import singertools.diff_jsonl as diff_jsonl
+
+records1 = [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}, {"id": 3, "name": "c"},
+            {"id": 3, "name": "c"}]
+records2 = [{"name": "c", "id": 3}, {"id": 2, "name": "B"}, {"id": 1, "name": "a"},
+            {"id": 4, "name": "d"}]
+
+
+def write_jsonl(dir_path, name, records):
+    path = os.path.join(dir_path, name)
+    with open(path, 'w') as file_obj:
+        for record in records:
+            file_obj.write(json.dumps(record) + '\n')
+    return path
+
+
+class TestStreamingDiff(unittest.TestCase):
+
+    def test_merge_join(self):
+        self.assertEqual(list(diff_jsonl.merge_join(['a', 'b', 'b', 'd'], ['b', 'c', 'd', 'e'])),
+                         [('-', 'a'), ('-', 'b'), ('+', 'c'), ('+', 'e')])
+
+    def test_identical_files_have_no_diff(self):
+        with tempfile.TemporaryDirectory() as td:
+            path1 = write_jsonl(td, 'one.jsonl', records1)
+            path2 = write_jsonl(td, 'two.jsonl', list(reversed(records1)))
+            self.assertEqual(list(diff_jsonl.streaming_diff(path1, path2, 0, td)), [])
+
+    @mock.patch.object(diff_jsonl, 'MAX_MERGE_FANIN', 2)
+    def test_spilled_sort_matches_in_memory_sort(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = write_jsonl(td, 'one.jsonl', records1 + records2)
+            spilled = list(diff_jsonl.sorted_canonical_lines(path, 0, td))
+            in_memory = list(diff_jsonl.sorted_canonical_lines(path, 1024 * 1024, td))
+        self.assertEqual(spilled, in_memory)
+        self.assertEqual(spilled, sorted(json.dumps(r, sort_keys=True, separators=(',', ':'))
+                                         for r in records1 + records2))
+
+    def test_parallel_sort_matches_serial_sort(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = write_jsonl(td, 'one.jsonl', (records1 + records2) * 5)
+            serial = list(diff_jsonl.sorted_canonical_lines(path, 0, td))
+            with mock.patch.object(diff_jsonl, 'MAX_MERGE_FANIN', 3):
+                parallel = list(diff_jsonl.sorted_canonical_lines_parallel(path, 200, 2, td))
+            self.assertEqual(['one.jsonl'], os.listdir(td))
+        self.assertEqual(serial, parallel)
+
+    def test_only_differing_records_are_printed(self):
+        with tempfile.TemporaryDirectory() as td:
+            path1 = write_jsonl(td, 'one.jsonl', records1)
+            path2 = write_jsonl(td, 'two.jsonl', records2)
+            lines = list(diff_jsonl.streaming_diff(path1, path2, 0, td))
+        removed = '\n'.join(l[2:] for l in lines[2:] if l.startswith('-'))
+        added = '\n'.join(l[2:] for l in lines[2:] if l.startswith('+'))
+        self.assertEqual(lines[:2], ['--- ' + path1, '+++ ' + path2])
+        self.assertEqual(removed, json.dumps({"id": 2, "name": "b"}, indent=4) + '\n' +
+                         json.dumps({"id": 3, "name": "c"}, indent=4))
+        self.assertEqual(added, json.dumps({"id": 2, "name": "B"}, indent=4) + '\n' +
+                         json.dumps({"id": 4, "name": "d"}, indent=4))
+
+
+def singer_messages(records):
+    messages = [{"type": "SCHEMA", "stream": "users", "schema": {}, "key_properties": ["id"]}]
+    messages += [{"type": "RECORD", "stream": "users", "record": r} for r in records]
+    messages += [{"type": "STATE", "value": {}}]
+    return messages
+
+
+class TestHashCheck(unittest.TestCase):
+
+    def test_raw_digest(self):
+        with tempfile.TemporaryDirectory() as td:
+            path1 = write_jsonl(td, 'one.jsonl', records1)
+            path2 = write_jsonl(td, 'two.jsonl', list(reversed(records1)))
+            path3 = write_jsonl(td, 'three.jsonl', records1[:3])
+            self.assertEqual(diff_jsonl.raw_digest(path1), diff_jsonl.raw_digest(path2))
+            self.assertNotEqual(diff_jsonl.raw_digest(path1), diff_jsonl.raw_digest(path3))
+
+    def test_parallel_digest_matches_serial(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = write_jsonl(td, 'one.jsonl', (records1 + records2) * 5)
+            self.assertEqual(diff_jsonl.raw_digest(path),
+                             diff_jsonl.raw_digest_parallel(path, 2))
+
+    def test_differing_messages(self):
+        other = [{"type": "RECORD", "stream": "orders", "record": {"id": 1}}]
+        messages1 = singer_messages(records1 + records2 * 3) + other
+        messages2 = singer_messages(records2 + records1 * 3) + other
+        narrowed1, narrowed2 = diff_jsonl.differing_messages(messages1, messages2)
+        self.assertLess(len(narrowed1), len(messages1))
+        self.assertNotIn(other[0], narrowed1)
+        self.assertEqual(diff_jsonl.prettify(narrowed1) == diff_jsonl.prettify(narrowed2),
+                         diff_jsonl.prettify(messages1) == diff_jsonl.prettify(messages2))
+        self.assertEqual(([], []), diff_jsonl.differing_messages(records1, records1[::-1]))
+
+    def test_compressed_files(self):
+        with tempfile.TemporaryDirectory() as td:
+            path1 = write_jsonl(td, 'one.jsonl', records1)
+            path2 = os.path.join(td, 'two.jsonl.gz')
+            with open(write_jsonl(td, 'two.jsonl', records2), 'rb') as plain, \
+                 gzip.open(path2, 'wb') as compressed:
+                compressed.write(plain.read())
+            self.assertEqual(diff_jsonl.raw_digest(write_jsonl(td, 'three.jsonl', records2)),
+                             diff_jsonl.file_digest(path2, workers=2))
+            self.assertEqual(list(diff_jsonl.streaming_diff(path1, path2[:-3], 0, td))[2:],
+                             list(diff_jsonl.streaming_diff(path1, path2, 0, td))[2:])
+
+    def test_identical_files_are_not_loaded(self):
+        with tempfile.TemporaryDirectory() as td:
+            path1 = write_jsonl(td, 'one.jsonl', records1)
+            path2 = write_jsonl(td, 'two.jsonl', list(reversed(records1)))
+            with mock.patch('sys.argv', ['diff-jsonl', path1, path2]), \
+                 mock.patch.object(diff_jsonl, 'load_jsonl_file') as load, \
+                 mock.patch('builtins.print') as mock_print:
+                diff_jsonl.main()
+        load.assert_not_called()
+        mock_print.assert_not_called()
+
+
+class TestKeyDiff(unittest.TestCase):
+
+    def test_diff_fields(self):
+        self.assertEqual(list(diff_jsonl.diff_fields({"a": 1, "b": {"c": 1, "d": 2}, "e": True},
+                                                     {"a": 1, "b": {"c": 2}, "e": 1, "f": None})),
+                         [(("b", "c"), 1, 2),
+                          (("b", "d"), 2, diff_jsonl.ABSENT),
+                          (("e",), True, 1),
+                          (("f",), diff_jsonl.ABSENT, None)])
+
+    def test_index_by_key_uses_key_properties(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = write_jsonl(td, 'one.jsonl', singer_messages(records1))
+            index = diff_jsonl.index_by_key(path)
+        self.assertEqual(list(index), ["users"])
+        self.assertEqual(sorted(index["users"]), ["[1]", "[2]", "[3]"])
+
+    def test_key_diff_by_key_properties(self):
+        with tempfile.TemporaryDirectory() as td:
+            path1 = write_jsonl(td, 'one.jsonl', singer_messages(records1))
+            path2 = write_jsonl(td, 'two.jsonl', singer_messages(records2))
+            lines = list(diff_jsonl.key_diff(path1, path2))
+        # records1 has id 3 twice, records2 only once
+        self.assertEqual(lines[2:], ['Stream users: 1 added, 0 removed, 2 changed',
+                                     '+ [4] {"id":4,"name":"d"}',
+                                     '~ [2]',
+                                     '    name: "b" -> "B"',
+                                     '~ [3]',
+                                     '    - {"id":3,"name":"c"}'])
+
+    def test_key_diff_sees_changes_to_earlier_duplicates(self):
+        old = [{"date": "2017-01-01", "rate": 1}, {"date": "2017-01-01", "rate": 2}]
+        new = [{"date": "2017-01-01", "rate": 3}, {"date": "2017-01-01", "rate": 2}]
+        with tempfile.TemporaryDirectory() as td:
+            path1 = write_jsonl(td, 'one.jsonl', old)
+            path2 = write_jsonl(td, 'two.jsonl', new)
+            self.assertEqual([], list(diff_jsonl.key_diff(path1, path1, ["date"]))[2:])
+            lines = list(diff_jsonl.key_diff(path1, path2, ["date"]))
+        self.assertEqual(lines[2:], ['Stream None: 0 added, 0 removed, 1 changed',
+                                     '~ ["2017-01-01"]',
+                                     '    - {"date":"2017-01-01","rate":1}',
+                                     '    + {"date":"2017-01-01","rate":3}'])
+
+    def test_key_diff_with_key_option_on_plain_jsonl(self):
+        with tempfile.TemporaryDirectory() as td:
+            path1 = write_jsonl(td, 'one.jsonl', records1)
+            path2 = write_jsonl(td, 'two.jsonl', records2)
+            lines = list(diff_jsonl.key_diff(path1, path2, ["name"]))
+        self.assertEqual(lines[2:], ['Stream None: 2 added, 1 removed, 1 changed',
+                                     '+ ["B"] {"id":2,"name":"B"}',
+                                     '+ ["d"] {"id":4,"name":"d"}',
+                                     '- ["b"] {"id":2,"name":"b"}',
+                                     '~ ["c"]',
+                                     '    - {"id":3,"name":"c"}'])
@@ -0,0 +1,63 @@
+import unittest
+from unittest import mock
+
+from jsonschema import Draft4Validator
+
+from singertools import errors
+from singertools.errors import ErrorCollector
+
+schema = {'type': 'object',
+          'properties': {'id': {'type': 'integer'}, 'name': {'type': 'string'}}}
+
+
+def validation_errors(record):
+    return list(Draft4Validator(schema).iter_errors(record))
+
+
+class TestErrorCollector(unittest.TestCase):
+
+    def test_group_counted_once_per_line(self):
+        collector = ErrorCollector()
+        collector.add('users', [ValueError('a'), ValueError('b')])
+        collector.add('users', validation_errors({'id': 'x', 'name': 1}))
+        self.assertEqual(2, collector.num_lines)
+        self.assertEqual([1, 1, 1], [group.count for group in collector.ranked()])
+
+    def test_samples_capped_and_truncated(self):
+        collector = ErrorCollector()
+        for i in range(5):
+            collector.add('users', validation_errors({'id': str(i), 'name': 'x' * 2000}),
+                          {'id': str(i), 'name': 'x' * 2000})
+        group, = collector.ranked()
+        self.assertEqual(5, group.count)
+        self.assertEqual(errors.MAX_SAMPLES, len(group.samples))
+        self.assertEqual(errors.MAX_SAMPLE_LENGTH, len(group.samples[0]['record']))
+
+    def test_sample_message_truncated(self):
+        collector = ErrorCollector()
+        collector.add('users', [ValueError('x' * 2000)])
+        group, = collector.ranked()
+        self.assertEqual(errors.MAX_SAMPLE_LENGTH, len(group.samples[0]['message']))
+
+    @mock.patch.object(errors, 'MAX_GROUPS', 2)
+    def test_groups_capped(self):
+        collector = ErrorCollector()
+        for stream in ['a', 'b', 'c', 'c']:
+            collector.add(stream, [ValueError()])
+        self.assertEqual(['a', 'b'], [group.stream for group in collector.ranked()])
+        self.assertEqual(2, collector.num_ungrouped)
+        self.assertEqual(4, collector.num_lines)
+
+    def test_merge(self):
+        first, second = ErrorCollector(), ErrorCollector()
+        for _ in range(2):
+            first.add('users', [ValueError()], {'id': 1})
+        for _ in range(3):
+            second.add('users', [ValueError()], {'id': 2})
+        second.add('orders', [KeyError()])
+        first.merge(second)
+        report = first.report()
+        self.assertEqual(6, report['lines'])
+        self.assertEqual([('users', 5), ('orders', 1)],
+                         [(group['stream'], group['count']) for group in report['groups']])
+        self.assertEqual(errors.MAX_SAMPLES, len(report['groups'][0]['samples']))
@@ -3,9 +3,13 @@ import sys
 import tempfile
 import os
 import io
+import gzip
 import json
+from contextlib import redirect_stdout
+from unittest import mock
 
 import singertools.infer_schema as infer
+from singertools.inputs import expand_paths
 
 rec = {"name": "Joe", "age": 55, "money": 5.87, "is_cool": True, "birthday": "02-22-1970"}
 rec2 = {"name": "Joe", "age": 55, "money": 5.87, "is_cool": True, "birthday": "02-22-1970",
@@ -33,6 +37,62 @@ class InferSchema(unittest.TestCase):
                                      'age': {'integer': True}}})
 
 
+    def test_empty_containers_add_nothing(self):
+        self.assertEqual(infer.add_observations({}, [], {"a": {}, "b": []}), {})
+        self.assertEqual(infer.add_observations({}, [], {"a": {}, "b": [1]}),
+                         {'object': {'b': {'array': {'integer': True}}}})
+
+    def test_deeply_nested_record(self):
+        record = {"leaf": 1}
+        for _ in range(sys.getrecursionlimit() + 100):
+            record = {"nested": record}
+        obs = infer.add_observations({}, [], record)
+        node = obs
+        while 'leaf' not in node['object']:
+            node = node['object']['nested']
+        self.assertEqual(node['object']['leaf'], {'integer': True})
+
+    def test_unexpected_value_reports_path(self):
+        with self.assertRaisesRegex(Exception, "'object', 'a', 'array', 'object', 'b'"):
+            infer.add_observations({}, [], {"a": [{"b": object()}]})
+
+    def test_is_date(self):
+        for value in ["2017-02-15T00:00:00Z", "2017-02-15", "2017-02-15 10:00:00.123+00:00",
+                      "02-22-1970", "22/02/1970", "1970.02.22"]:
+            self.assertTrue(infer.is_date(value), value)
+        for value in ["3", "May", "1.5", "13-13-1970", "2017-13-01", "hello world"]:
+            self.assertFalse(infer.is_date(value), value)
+            self.assertFalse(infer.is_date(value, use_dateutil=True), value)
+        self.assertFalse(infer.is_date("Feb 22, 1970"))
+        self.assertTrue(infer.is_date("Feb 22, 1970", use_dateutil=True))
+
+    def test_strings_stop_date_detection(self):
+        obs = {}
+        for value in ["hello", "2017-02-15T00:00:00Z"]:
+            obs = infer.add_observations(obs, [], {"field": value})
+        self.assertEqual(obs, {'object': {'field': {'string': True}}})
+
+    def test_strings_stop_date_detection_within_an_array(self):
+        for record in [{"tags": ["hello", "2017-02-15"]},
+                       {"new": [{"tags": ["hello", "2017-02-15"]}]}]:
+            with mock.patch.object(infer, 'is_date', wraps=infer.is_date) as is_date:
+                obs = infer.add_observations({}, [], record)
+            is_date.assert_called_once_with("hello", False)
+            node = obs['object']
+            if 'new' in node:
+                node = node['new']['array']['object']
+            self.assertEqual({'array': {'string': True}}, node['tags'])
+        # Only the string is a new path, which --converge-after counts on
+        self.assertEqual(1, infer._observe({}, [], {"tags": ["hello", "2017-02-15"]}, False))
+
+    def test_dates_and_strings_are_strings(self):
+        obs = {}
+        for value in ["2017-02-15T00:00:00Z", "hello"]:
+            obs = infer.add_observations(obs, [], {"field": value})
+        self.assertEqual(infer.to_json_schema(obs),
+                         {'type': ['null', 'object'],
+                          'properties': {'field': {'type': ['null', 'string']}}})
+
     def test_to_json_schema(self):
         obs1 = infer.add_observations({}, [], rec)
         result = infer.to_json_schema(obs1)
@@ -81,3 +141,292 @@ class InferSchema(unittest.TestCase):
             self.assertEqual(three, three_schema)
             
             
+
+
+class InferFromFiles(unittest.TestCase):
+
+    def write(self, path, messages, opener=open):
+        with opener(path, 'wt') as file_obj:
+            for message in messages:
+                file_obj.write(json.dumps(message) + '\n')
+
+    def test_plain_and_gzip_files_and_globs(self):
+        with tempfile.TemporaryDirectory() as td:
+            self.write(os.path.join(td, 'part-1.jsonl'),
+                       [{"type": "RECORD", "stream": "one", "record": {"a": 1}}])
+            self.write(os.path.join(td, 'part-2.jsonl.gz'),
+                       [{"type": "RECORD", "stream": "one", "record": {"b": True}},
+                        {"type": "RECORD", "stream": "two", "record": {"c": "x"}}],
+                       gzip.open)
+            out_dir = os.path.join(td, 'out')
+            paths = expand_paths([os.path.join(td, 'part-*')])
+            self.assertEqual(len(paths), 2)
+            infer.infer_schemas_from_files(paths, out_dir)
+
+            self.assertEqual(sorted(os.listdir(out_dir)),
+                             ['one.inferred.json', 'two.inferred.json'])
+            with open(os.path.join(out_dir, 'one.inferred.json')) as file_obj:
+                self.assertEqual(json.load(file_obj),
+                                 {'type': ['null', 'object'],
+                                  'properties': {'a': {'type': ['null', 'integer']},
+                                                 'b': {'type': ['null', 'boolean']}}})
+
+    def test_multiple_streams_on_stdout_are_keyed_by_name(self):
+        messages = [json.dumps({"type": "RECORD", "stream": "one", "record": {"a": 1}}),
+                    json.dumps({"type": "RECORD", "stream": "two", "record": {"b": 1}})]
+        out = io.StringIO()
+        with redirect_stdout(out):
+            infer.infer_schemas(messages, None)
+        self.assertEqual(sorted(json.loads(out.getvalue())), ['one', 'two'])
+
+        out = io.StringIO()
+        with redirect_stdout(out):
+            infer.infer_schemas(messages[:1], None)
+        self.assertEqual(json.loads(out.getvalue())['type'], ['null', 'object'])
+
+    def test_files_on_stdout_are_always_keyed_by_name(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = os.path.join(td, 'one.jsonl')
+            with open(path, 'w') as file_obj:
+                file_obj.write(json.dumps({"type": "RECORD", "stream": "one",
+                                           "record": {"a": 1}}) + '\n')
+            out = io.StringIO()
+            with redirect_stdout(out):
+                infer.infer_schemas_from_files([path], None)
+        self.assertEqual(['one'], list(json.loads(out.getvalue())))
+
+
+class ObservationCache(unittest.TestCase):
+
+    def write(self, path, records):
+        with open(path, 'w') as file_obj:
+            for record in records:
+                file_obj.write(json.dumps({"type": "RECORD", "stream": "one",
+                                           "record": record}) + '\n')
+
+    def test_only_new_files_are_observed(self):
+        with tempfile.TemporaryDirectory() as td:
+            cache = os.path.join(td, 'cache.json.gz')
+            out_dir = os.path.join(td, 'out')
+            self.write(os.path.join(td, 'day-1.jsonl'), [{"a": 1}, {"a": 2}])
+            paths = [os.path.join(td, 'day-1.jsonl')]
+            infer.infer_schemas_from_files(paths, out_dir, cache=cache)
+
+            self.write(os.path.join(td, 'day-2.jsonl'), [{"b": "x"}])
+            paths.append(os.path.join(td, 'day-2.jsonl'))
+            with mock.patch('sys.stderr', new_callable=io.StringIO) as stderr:
+                infer.infer_schemas_from_files(paths, out_dir, cache=cache)
+            self.assertIn('Skipping 1 files', stderr.getvalue())
+
+            streams, files = infer.load_observations(cache)
+            self.assertEqual({}, streams)
+            self.assertEqual(2, len(files))
+            self.assertEqual(3, infer.combine_observations(streams, files)['one'].num_records)
+            with open(os.path.join(out_dir, 'one.inferred.json')) as file_obj:
+                self.assertEqual(['a', 'b'], list(json.load(file_obj)['properties']))
+
+    def test_changed_file_is_observed_again(self):
+        with tempfile.TemporaryDirectory() as td:
+            cache = os.path.join(td, 'cache.json.gz')
+            out_dir = os.path.join(td, 'out')
+            paths = [os.path.join(td, 'day-1.jsonl'), os.path.join(td, 'day-2.jsonl')]
+            self.write(paths[0], [{"a": 1}, {"a": 2}])
+            self.write(paths[1], [{"a": 3}])
+            infer.infer_schemas_from_files(paths, out_dir, cache=cache)
+
+            # Appended to, so its size changes
+            self.write(paths[0], [{"a": 1}, {"a": 2}, {"a": 4}])
+            with mock.patch('sys.stderr', new_callable=io.StringIO) as stderr:
+                infer.infer_schemas_from_files(paths, out_dir, cache=cache)
+            self.assertIn(paths[0] + ' changed since it was cached', stderr.getvalue())
+            self.assertIn('Skipping 1 files', stderr.getvalue())
+            streams, files = infer.load_observations(cache)
+            self.assertEqual(4, infer.combine_observations(streams, files)['one'].num_records)
+            self.assertEqual(1, files[os.path.abspath(paths[1])]['streams']['one'].num_records)
+
+    def test_merge_caches(self):
+        records = [{"a": 1}, {"b": [1.5]}, {"a": None, "c": "2017-01-01"}]
+        with tempfile.TemporaryDirectory() as td:
+            caches = []
+            for i, record in enumerate(records):
+                path = os.path.join(td, 'part-{}.jsonl'.format(i))
+                self.write(path, [record])
+                caches.append(os.path.join(td, 'cache-{}.json.gz'.format(i)))
+                with redirect_stdout(io.StringIO()):
+                    infer.infer_schemas_from_files([path], None, cache=caches[-1])
+
+            merged = os.path.join(td, 'merged.json.gz')
+            with redirect_stdout(io.StringIO()) as out:
+                infer.infer_schemas([], None, cache=merged, merge_caches=caches)
+            serial = infer.observe(json.dumps({"type": "RECORD", "stream": "one", "record": r})
+                                   for r in records)
+            self.assertEqual(serial['one'].to_json_schema(), json.loads(out.getvalue()))
+            self.assertEqual(serial, infer.combine_observations(*infer.load_observations(merged)))
+
+    def test_wrong_version(self):
+        with tempfile.TemporaryDirectory() as td:
+            cache = os.path.join(td, 'cache.json.gz')
+            with gzip.open(cache, 'wt') as file_obj:
+                json.dump({'version': 0}, file_obj)
+            with self.assertRaises(ValueError):
+                infer.load_observations(cache)
+
+
+class MergeObservations(unittest.TestCase):
+
+    records = [{"a": 1, "b": "x"},
+               {"a": None, "c": [{"d": 1.5}]},
+               {"b": "2017-01-01T00:00:00Z", "c": [{"e": True}], "a": "one"},
+               {"f": {"g": "08-03-2020"}, "a": 2}]
+
+    def observe(self, records):
+        obs = infer.Observations()
+        for record in records:
+            obs.add(record)
+        return obs
+
+    def test_merge_is_associative_and_matches_serial(self):
+        a, b, c = [self.observe(self.records[i:i + 1]) for i in range(3)]
+        left = self.observe(self.records[0:1]).merge(b).merge(c)
+        right = a.merge(self.observe(self.records[1:2]).merge(c))
+        serial = self.observe(self.records[0:3])
+        self.assertEqual(json.dumps(left.tree), json.dumps(right.tree))
+        self.assertEqual(json.dumps(left.to_json_schema()), json.dumps(serial.to_json_schema()))
+        self.assertEqual(serial.num_records, right.num_records)
+
+    @mock.patch.object(infer, 'CHUNK_SIZE', 2)
+    def test_parallel_matches_serial(self):
+        messages = [json.dumps({"type": "RECORD", "stream": "s{}".format(i % 2), "record": r})
+                    for i, r in enumerate(self.records * 3)]
+        serial = infer.observe(messages)
+        parallel = infer.observe_parallel(messages, False, 2)
+        self.assertEqual(list(serial), list(parallel))
+        for stream in serial:
+            self.assertEqual(json.dumps(serial[stream].to_json_schema()),
+                             json.dumps(parallel[stream].to_json_schema()))
+
+    @mock.patch.object(infer, 'RANGE_SIZE', 64)
+    def test_file_ranges_match_serial(self):
+        messages = [json.dumps({"type": "RECORD", "stream": "s{}".format(i % 2), "record": r})
+                    for i, r in enumerate(self.records * 3)]
+        with tempfile.TemporaryDirectory() as td:
+            path = os.path.join(td, 'records.jsonl')
+            with open(path, 'w') as file_obj:
+                file_obj.write('\n'.join(messages) + '\n')
+            ranged = infer.observe_file(path, workers=2)
+        serial = infer.observe(messages)
+        self.assertEqual(sorted(serial), sorted(ranged))
+        for stream in serial:
+            self.assertEqual(serial[stream].num_records, ranged[stream].num_records)
+            self.assertEqual(json.dumps(serial[stream].to_json_schema()),
+                             json.dumps(ranged[stream].to_json_schema()))
+
+
+class Summaries(unittest.TestCase):
+
+    messages = [json.dumps({"type": "RECORD", "stream": "s", "record": {
+        "id": i, "status": ["open", "closed"][i % 2], "name": "n" * (i % 7),
+        "at": "2017-01-01T00:00:00Z", "tags": [{"size": i - 5}], "price": 1.5}})
+                for i in range(40)]
+
+    def test_schema(self):
+        schema = infer.observe(self.messages, summarize=True)['s'].to_json_schema()
+        properties = schema['properties']
+        self.assertEqual((0, 39), (properties['id']['minimum'], properties['id']['maximum']))
+        self.assertEqual(['closed', 'open', None], properties['status']['enum'])
+        self.assertEqual(6, properties['status']['maxLength'])
+        # Too many distinct values for the number of records
+        self.assertNotIn('enum', properties['name'])
+        self.assertEqual(6, properties['name']['maxLength'])
+        self.assertNotIn('maxLength', properties['at'])
+        self.assertNotIn('maxLength', properties['price'])
+        self.assertEqual(-5, properties['tags']['items']['properties']['size']['minimum'])
+
+    def test_no_range_for_integers_mixed_with_other_numbers(self):
+        mixed = [json.dumps({"type": "RECORD", "stream": "s", "record": {"b": b}})
+                 for b in [5, 100.5, -3.25]]
+        schema = infer.observe(mixed, summarize=True)['s'].to_json_schema()
+        self.assertEqual('singer.decimal', schema['properties']['b']['format'])
+        self.assertNotIn('minimum', schema['properties']['b'])
+        self.assertNotIn('maximum', schema['properties']['b'])
+
+    def test_not_summarized_by_default(self):
+        schema = infer.observe(self.messages)['s'].to_json_schema()
+        self.assertNotIn('minimum', schema['properties']['id'])
+
+    def test_key_candidates(self):
+        streams = infer.observe(self.messages, summarize=True)
+        self.assertEqual(['id'], streams['s'].key_candidates())
+
+        many = [json.dumps({"type": "RECORD", "stream": "s", "record": {"id": "k{}".format(i)}})
+                for i in range(5000)]
+        self.assertEqual(['id'], infer.observe(many, summarize=True)['s'].key_candidates())
+        duplicated = infer.observe(many + many[:1000], summarize=True)['s']
+        self.assertEqual([], duplicated.key_candidates())
+
+    @mock.patch.object(infer, 'CHUNK_SIZE', 7)
+    def test_parallel_matches_serial(self):
+        serial = infer.observe(self.messages, summarize=True)
+        parallel = infer.observe_parallel(self.messages, False, 2, summarize=True)
+        self.assertEqual(serial['s'].summaries, parallel['s'].summaries)
+        self.assertEqual(serial['s'].key_candidates(), parallel['s'].key_candidates())
+
+    def test_merge_with_unsummarized_drops_summaries(self):
+        streams = infer.observe(self.messages, summarize=True)
+        streams['s'].merge(infer.observe(self.messages)['s'])
+        self.assertIsNone(streams['s'].summaries)
+
+    def test_cache_round_trip(self):
+        streams = infer.observe(self.messages, summarize=True)
+        with tempfile.TemporaryDirectory() as td:
+            cache = os.path.join(td, 'cache.json.gz')
+            infer.save_observations(cache, streams)
+            loaded, _ = infer.load_observations(cache)
+        self.assertEqual(streams, loaded)
+        self.assertEqual(streams['s'].summaries[(('object', 'id'), 'integer')].keys.registers,
+                         loaded['s'].summaries[(('object', 'id'), 'integer')].keys.registers)
+
+
+class Sampling(unittest.TestCase):
+
+    messages = [json.dumps({"type": "RECORD", "stream": "one", "record": {"a": i}})
+                for i in range(100)]
+    messages.append(json.dumps({"type": "RECORD", "stream": "one", "record": {"b": "late"}}))
+    messages.append(json.dumps({"type": "RECORD", "stream": "two", "record": {"c": 1}}))
+
+    def test_converge_after(self):
+        streams = infer.observe(self.messages, converge_after=10)
+        self.assertEqual(streams['one'].num_records, 11)
+        self.assertEqual(streams['one'].num_skipped, 90)
+        self.assertTrue(streams['one'].is_sampled())
+        self.assertNotIn('b', streams['one'].tree['object'])
+        self.assertFalse(streams['two'].is_sampled())
+
+    def test_converged_stream_isnt_decoded(self):
+        with mock.patch.object(infer, 'loads', wraps=infer.loads) as loads:
+            streams = infer.observe([m.encode('utf-8') for m in self.messages],
+                                    converge_after=10)
+        # The 11 records observed of 'one', then the record of 'two'
+        self.assertEqual(12, loads.call_count)
+        self.assertEqual(90, streams['one'].num_skipped)
+        self.assertEqual(1, streams['two'].num_records)
+
+    def test_workers_rejected(self):
+        for option in ['--sample', '--converge-after']:
+            with mock.patch('sys.argv', ['singer-infer-schema', '--workers', '2', option, '10']), \
+                 mock.patch('sys.stderr', new_callable=io.StringIO) as stderr:
+                with self.assertRaises(SystemExit):
+                    infer.main()
+            self.assertIn('only work with a single worker', stderr.getvalue())
+
+    def test_sample(self):
+        streams = infer.observe(self.messages, sample_size=20)
+        self.assertEqual(streams['one'].num_records, 20)
+        self.assertEqual(streams['one'].num_skipped, 81)
+        self.assertEqual(streams['two'].num_records, 1)
+        self.assertEqual(streams['two'].num_skipped, 0)
+        self.assertEqual(streams, infer.observe(self.messages, sample_size=20))
+
+    def test_sample_larger_than_stream(self):
+        self.assertEqual(infer.observe(self.messages, sample_size=1000),
+                         infer.observe(self.messages))
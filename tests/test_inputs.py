@@ -0,0 +1,94 @@
+import gzip
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from singertools import inputs
+
+LINES = [b'{"a": 1}\n', b'\n', b'{"b": "\xc3\xa9"}\n', b'{"c": [1, 2, 3]}\n', b'{"d": null}']
+DATA = b''.join(LINES[:-1]) * 50
+
+
+class TestReadLines(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'lines.jsonl')
+        with open(self.path, 'wb') as file_obj:
+            file_obj.write(b''.join(LINES))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_ranges_cover_whole_lines(self):
+        for num_ranges in range(1, 10):
+            ranges = inputs.split_ranges(self.path, num_ranges)
+            self.assertLessEqual(len(ranges), num_ranges)
+            lines = [line for start, end in ranges
+                     for line in inputs.read_lines(self.path, start, end)]
+            self.assertEqual(LINES, lines)
+
+    def test_is_splittable(self):
+        gzip_path = os.path.join(self.tmp_dir.name, 'lines.jsonl.gz')
+        with gzip.open(gzip_path, 'wb') as file_obj:
+            file_obj.write(b''.join(LINES))
+        empty_path = os.path.join(self.tmp_dir.name, 'empty.jsonl')
+        open(empty_path, 'w').close()
+
+        self.assertTrue(inputs.is_splittable(self.path))
+        self.assertFalse(inputs.is_splittable(gzip_path))
+        self.assertFalse(inputs.is_splittable(empty_path))
+        with inputs.open_input(gzip_path, binary=True) as file_obj:
+            self.assertEqual(LINES, list(file_obj))
+
+    def test_plain_text_is_utf_8(self):
+        # Not the locale's encoding, which may not be UTF-8
+        with inputs.open_input(self.path) as file_obj:
+            self.assertEqual('utf-8', file_obj.encoding)
+            self.assertEqual(b''.join(LINES).decode('utf-8'), file_obj.read())
+
+
+class TestReadAhead(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'lines.jsonl.gz')
+        with gzip.open(self.path, 'wb') as file_obj:
+            file_obj.write(DATA)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    @mock.patch.object(inputs, 'READ_AHEAD_SIZE', 7)
+    @mock.patch.object(inputs, 'MAX_READ_AHEAD_BLOCKS', 2)
+    def test_reads_every_line(self):
+        with inputs.open_input(self.path, binary=True) as file_obj:
+            self.assertEqual(DATA, b''.join(file_obj))
+        with inputs.open_input(self.path) as file_obj:
+            self.assertEqual(DATA.decode('utf-8'), ''.join(file_obj))
+
+    @mock.patch.object(inputs, 'READ_AHEAD_SIZE', 7)
+    @mock.patch.object(inputs, 'MAX_READ_AHEAD_BLOCKS', 1)
+    def test_closed_early(self):
+        file_obj = inputs.open_input(self.path, binary=True)
+        self.assertEqual(LINES[0], file_obj.readline())
+        file_obj.close()
+        self.assertTrue(file_obj.closed)
+
+    def test_read_lines_of_whole_compressed_file(self):
+        self.assertEqual(DATA, b''.join(inputs.read_lines(self.path)))
+
+    def test_input_lines(self):
+        plain_path = os.path.join(self.tmp_dir.name, 'lines.jsonl')
+        with open(plain_path, 'wb') as file_obj:
+            file_obj.write(b''.join(LINES[:2]))
+        lines = list(inputs.input_lines([plain_path, self.path]))
+        self.assertEqual(LINES[0].decode('utf-8'), lines[0])
+        self.assertEqual((b''.join(LINES[:2]) + DATA).decode('utf-8'), ''.join(lines))
+
+    def test_errors_are_raised_to_the_reader(self):
+        with open(self.path, 'r+b') as file_obj:
+            file_obj.truncate(os.path.getsize(self.path) - 10)
+        with self.assertRaises(EOFError):
+            list(inputs.read_lines(self.path))
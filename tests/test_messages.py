@@ -0,0 +1,55 @@
+import decimal
+import json
+import unittest
+
+from singertools import messages
+
+
+class TestParseMessage(unittest.TestCase):
+
+    def test_message_types(self):
+        record = messages.parse_message(json.dumps(
+            {"type": "RECORD", "stream": "users", "record": {"id": 1, "amount": 1.5}}))
+        self.assertEqual(record, messages.Record("users", {"id": 1, "amount": 1.5}, None))
+        self.assertIsInstance(record.record["amount"], float)
+
+        schema = messages.parse_message(json.dumps(
+            {"type": "SCHEMA", "stream": "users", "key_properties": ["id"],
+             "schema": {"type": "number", "multipleOf": 0.01}}))
+        self.assertEqual(schema.schema["multipleOf"], decimal.Decimal("0.01"))
+        self.assertIsNone(schema.bookmark_properties)
+
+        self.assertEqual(messages.parse_message('{"type": "STATE", "value": {"a": 1}}'),
+                         messages.State({"a": 1}))
+        self.assertEqual(messages.parse_message('{"type": "ACTIVATE_VERSION", "stream": "s", "version": 1}'),
+                         messages.ActivateVersion("s", 1))
+        self.assertIsNone(messages.parse_message('{"type": "FOO"}'))
+
+    def test_exact(self):
+        record = messages.parse_message(
+            '{"type": "RECORD", "stream": "users", "record": {"amount": 1.1}}', exact=True)
+        self.assertEqual(record.record["amount"], decimal.Decimal("1.1"))
+
+    def test_missing_key(self):
+        with self.assertRaisesRegex(Exception, "Message is missing required key 'stream'"):
+            messages.parse_message('{"type": "RECORD", "record": {}}')
+
+    def test_falls_back_to_stdlib(self):
+        self.assertEqual(messages.loads('{"big": 123456789012345678901234567890}'),
+                         {"big": 123456789012345678901234567890})
+        with self.assertRaises(ValueError):
+            messages.loads('{"truncated": ')
+
+    def test_set_decoder(self):
+        original = messages.DECODER
+        try:
+            messages.set_decoder('json')
+            self.assertEqual(messages.loads('[1.5]'), [1.5])
+            with self.assertRaises(Exception):
+                messages.set_decoder('no-such-decoder')
+        finally:
+            messages.set_decoder(original)
+
+    def test_has_decimals(self):
+        self.assertTrue(messages.has_decimals({"a": [{"b": decimal.Decimal("0.1")}]}))
+        self.assertFalse(messages.has_decimals({"a": [{"b": 1}], "c": "0.1"}))
@@ -0,0 +1,88 @@
+import sys
+import time
+import unittest
+from unittest import mock
+
+from singertools import runner
+
+
+def python(script):
+    return [sys.executable, '-c', script]
+
+
+def wrapped(script):
+    """Returns a command for a wrapper that runs script in a child process,
+    which inherits its stdout and stderr, as a shell wrapper's tap does."""
+    return python('import subprocess, sys; sys.exit(subprocess.call({!r}))'.format(
+        python(script)))
+
+
+class TestRunTap(unittest.TestCase):
+
+    @mock.patch.object(runner, 'READ_SIZE', 7)
+    def test_lines_split_across_chunks(self):
+        lines = ['{"a": "ééé"}', '', 'plain', 'no newline at end']
+        script = 'import sys; sys.stdout.buffer.write({!r})'.format(
+            '\n'.join(lines).encode('utf-8'))
+        run = runner.run_tap(python(script), list)
+        self.assertEqual(lines, run.result)
+        self.assertEqual(0, run.returncode)
+        self.assertFalse(run.stopped_early)
+
+    def test_stderr_tail(self):
+        script = ('import sys\n'
+                  'for i in range(1000): print("log", i, file=sys.stderr)\n'
+                  'print("out")\n'
+                  'sys.exit(3)')
+        run = runner.run_tap(python(script), list)
+        self.assertEqual(['out'], run.result)
+        self.assertEqual(3, run.returncode)
+        self.assertEqual(runner.STDERR_LINES, len(run.stderr_tail))
+        self.assertEqual('log 999', run.stderr_lines()[-1])
+
+    def test_stopped_early(self):
+        script = 'while True: print("line")'
+
+        def first_three(lines):
+            taken = []
+            for line in lines:
+                taken.append(line)
+                if len(taken) == 3:
+                    return taken
+            return taken
+
+        run = runner.run_tap(python(script), first_three)
+        self.assertEqual(['line'] * 3, run.result)
+        self.assertTrue(run.stopped_early)
+        self.assertNotEqual(0, run.returncode)
+
+    def test_consumer_error_kills_tap(self):
+        script = 'while True: print("line")'
+
+        def fail(lines):
+            next(iter(lines))
+            raise ValueError('bad line')
+
+        with self.assertRaisesRegex(ValueError, 'bad line'):
+            runner.run_tap(python(script), fail)
+
+    def test_timeout(self):
+        script = 'import time; print("started", flush=True); time.sleep(60)'
+        run = runner.run_tap(python(script), list, timeout=0.5)
+        self.assertTrue(run.timed_out)
+        self.assertNotEqual(0, run.returncode)
+
+    def test_timeout_stops_wrapped_tap(self):
+        script = 'import time; print("started", flush=True); time.sleep(60)'
+        start = time.time()
+        run = runner.run_tap(wrapped(script), list, timeout=0.5)
+        self.assertTrue(run.timed_out)
+        self.assertLess(time.time() - start, 10)
+
+    def test_stopped_early_stops_wrapped_tap(self):
+        script = 'while True: print("line")'
+        start = time.time()
+        run = runner.run_tap(wrapped(script), lambda lines: next(iter(lines)))
+        self.assertEqual('line', run.result)
+        self.assertTrue(run.stopped_early)
+        self.assertLess(time.time() - start, 10)
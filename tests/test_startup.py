@@ -0,0 +1,43 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+SAMPLES = os.path.join(os.path.dirname(__file__), '..', 'samples')
+
+DEFERRED = ['asyncio', 'concurrent.futures.process', 'dateutil', 'jsonschema', 'singer',
+            'terminaltables', 'zstandard']
+
+
+def imported_modules(script):
+    """Runs script in a new interpreter and returns the modules that were
+    imported by the end of it."""
+    script += '\nimport sys, json; print(json.dumps(sorted(sys.modules)))'
+    output = subprocess.check_output([sys.executable, '-c', script],
+                                     universal_newlines=True)
+    return json.loads(output.splitlines()[-1])
+
+
+def deferred(modules):
+    return [name for name in modules
+            if any(name == d or name.startswith(d + '.') for d in DEFERRED)]
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_entry_points_defer_slow_imports(self):
+        for module in ['check_tap', 'infer_schema', 'diff_jsonl', 'release']:
+            modules = imported_modules('import singertools.{}'.format(module))
+            self.assertEqual([], deferred(modules), module)
+
+    def test_valid_output_is_checked_without_jsonschema(self):
+        modules = imported_modules(
+            'import io, contextlib\n'
+            'from singertools import check_tap\n'
+            'with open({!r}) as output, contextlib.redirect_stdout(io.StringIO()):\n'
+            '    check_tap.print_summary(check_tap.summarize_output(output))'.format(
+                os.path.join(SAMPLES, 'fixerio-valid-initial.json')))
+        self.assertNotIn('jsonschema', modules)
+        self.assertNotIn('singer', modules)
+        self.assertIn('terminaltables', modules)
@@ -0,0 +1,65 @@
+import unittest
+from unittest import mock
+
+from singertools.stats import HyperLogLog, StreamStats, hash64
+
+
+class TestHyperLogLog(unittest.TestCase):
+
+    def sketch(self, values):
+        sketch = HyperLogLog()
+        for value in values:
+            sketch.add(hash64(value))
+        return sketch
+
+    def test_small_counts(self):
+        self.assertEqual(0, HyperLogLog().count())
+        self.assertAlmostEqual(100, self.sketch(list(range(100)) * 3).count(), delta=2)
+
+    def test_large_count_within_error(self):
+        sketch = self.sketch(range(100000))
+        self.assertLess(abs(sketch.count() - 100000), 100000 * 3 * sketch.error())
+
+    def test_merge_is_union(self):
+        merged = self.sketch(range(0, 20000))
+        merged.merge(self.sketch(range(10000, 30000)))
+        self.assertEqual(self.sketch(range(30000)).registers, merged.registers)
+
+
+class TestStreamStats(unittest.TestCase):
+
+    def test_fields_are_bounded(self):
+        stats = StreamStats()
+        with mock.patch('singertools.stats.MAX_FIELDS', 2):
+            stats.add({'a': 1, 'b': None, 'c': 3}, None, None)
+        self.assertEqual({'a': 0, 'b': 1}, stats.null_counts())
+        self.assertTrue(stats.fields_truncated)
+
+    def test_unique_keys(self):
+        stats = StreamStats()
+        for i in range(5000):
+            stats.add({'id': i}, ['id'], None)
+        self.assertFalse(stats.likely_duplicate_keys())
+        stats.add({'id': 0}, ['id'], None)
+        # One duplicate is within the error of the estimate
+        self.assertFalse(stats.likely_duplicate_keys())
+        for i in range(1000):
+            stats.add({'id': i}, ['id'], None)
+        self.assertTrue(stats.likely_duplicate_keys())
+
+    def test_uncomparable_replication_values(self):
+        stats = StreamStats()
+        stats.add({'v': 2}, None, ['v'])
+        stats.add({'v': 'a'}, None, ['v'])
+        stats.add({'v': 1}, None, ['v'])
+        self.assertEqual((1,), stats.min_replication_value)
+        self.assertEqual((2,), stats.max_replication_value)
+
+    def test_size_percentiles(self):
+        stats = StreamStats()
+        for size in [10] * 98 + [1000, 5000]:
+            stats.add_size(size)
+        stats.num_records = 100
+        self.assertEqual(15, stats.size_percentile(0.5))
+        self.assertEqual(1023, stats.size_percentile(0.99))
+        self.assertEqual(5000, stats.size_percentile(1))
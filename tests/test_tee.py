@@ -0,0 +1,93 @@
+import argparse
+from contextlib import redirect_stderr, redirect_stdout
+import io
+import json
+import unittest
+from unittest import mock
+
+from jsonschema import ValidationError
+
+from singertools import check_tap, tee
+from singertools.check_tap import OutputSummary
+
+SCHEMA = {'type': 'SCHEMA', 'stream': 'users', 'key_properties': ['id'],
+          'schema': {'type': 'object', 'properties': {'id': {'type': 'integer'}}}}
+
+
+def record(record_id):
+    return {'type': 'RECORD', 'stream': 'users', 'record': {'id': record_id}}
+
+
+def state(value):
+    return {'type': 'STATE', 'value': value}
+
+
+def output_of(*messages):
+    return ''.join(json.dumps(message) + '\n' for message in messages).encode('utf-8')
+
+
+def run(data, on_invalid='fail', quarantine=None):
+    output = io.BytesIO()
+    result = tee.tee(io.BufferedReader(io.BytesIO(data)), output, OutputSummary(),
+                     on_invalid, quarantine)
+    return result, output.getvalue()
+
+
+@mock.patch.object(tee, 'READ_SIZE', 7)
+class TestTee(unittest.TestCase):
+
+    def test_copies_valid_output_unchanged(self):
+        data = output_of(SCHEMA, record(1), state(1), record(2)) + b'{"type": "STATE", "value": 2}'
+        result, copied = run(data)
+        self.assertIsNone(result.error)
+        self.assertEqual(data, copied)
+        self.assertEqual(2, result.summary.num_records())
+        self.assertEqual(2, result.summary.num_states)
+
+    def test_invalid_record_fails_before_next_state(self):
+        data = output_of(SCHEMA, record(1), state(1), record('a'), record(3), state(3))
+        result, copied = run(data)
+        self.assertIsInstance(result.error, ValidationError)
+        self.assertTrue(data.startswith(copied))
+        self.assertNotIn(b'"value": 3', copied)
+
+    def test_drop(self):
+        data = output_of(SCHEMA, record(1), record('a'), state(1))
+        result, copied = run(data, 'drop')
+        self.assertIsNone(result.error)
+        self.assertEqual(1, result.num_invalid)
+        self.assertEqual(output_of(SCHEMA, record(1), state(1)), copied)
+
+    def test_quarantine(self):
+        quarantine = io.BytesIO()
+        data = output_of(SCHEMA, record('a'), record(2), record('b'))
+        result, copied = run(data, 'quarantine', quarantine)
+        self.assertEqual(2, result.num_invalid)
+        self.assertEqual(output_of(SCHEMA, record(2)), copied)
+        self.assertEqual(output_of(record('a'), record('b')), quarantine.getvalue())
+
+    def test_other_errors_are_not_dropped(self):
+        data = output_of(SCHEMA, record(1)) + b'not json\n' + output_of(record(2))
+        result, copied = run(data, 'drop')
+        self.assertIsNotNone(result.error)
+        self.assertEqual(output_of(SCHEMA, record(1)), copied)
+
+
+class TestRunTee(unittest.TestCase):
+
+    def test_summary_says_records_were_dropped(self):
+        args = argparse.Namespace(stats=False, on_invalid='drop', quarantine_file=None,
+                                  report_json=None)
+        data = output_of(SCHEMA, record(1), record('a'), state(1))
+        with redirect_stdout(io.StringIO()) as out:
+            self.assertEqual(0, check_tap.run_tee(args, io.BufferedReader(io.BytesIO(data)),
+                                                  io.BytesIO()))
+        self.assertIn('The output is NOT valid: 1 invalid records were dropped.',
+                      out.getvalue())
+        self.assertNotIn('The output is valid.', out.getvalue())
+
+    def test_on_invalid_requires_tee(self):
+        with mock.patch('sys.argv', ['singer-check-tap', '--on-invalid', 'drop']), \
+             redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                check_tap.parse_args()
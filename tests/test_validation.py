@@ -0,0 +1,114 @@
+import decimal
+import unittest
+from unittest import mock
+
+from jsonschema import Draft4Validator, ValidationError
+
+from singertools import validation
+from singertools.check_tap import build_jsonschema_validator, build_validator
+
+schema = {
+    'type': 'object',
+    'properties': {
+        'id': {'type': 'integer', 'minimum': 1},
+        'name': {'type': ['null', 'string'], 'maxLength': 5},
+        'updated_at': {'type': 'string', 'format': 'date-time'},
+        'amount': {'type': ['null', 'number'], 'multipleOf': decimal.Decimal('0.01')},
+        'tags': {'type': 'array', 'items': {'type': 'string', 'enum': ['a', 'b']}},
+        'nested': {'type': ['null', 'object'],
+                   'properties': {'at': {'type': ['null', 'string'], 'format': 'date-time'}},
+                   'additionalProperties': False},
+        'either': {'anyOf': [{'type': 'integer'}, {'type': 'string', 'pattern': '^x'}]},
+    },
+    'required': ['id'],
+}
+
+valid = [
+    {'id': 1},
+    {'id': 2, 'name': None, 'updated_at': '2017-01-01T00:00:00Z',
+     'amount': decimal.Decimal('1.25'), 'tags': ['a', 'b'], 'nested': {'at': None},
+     'either': 'xyz'},
+    {'id': 3, 'either': 4},
+]
+
+invalid = [
+    {},
+    {'id': True},
+    {'id': 0},
+    {'id': 1, 'name': 'too long'},
+    {'id': 1, 'updated_at': 'yesterday'},
+    {'id': 1, 'updated_at': 5},
+    {'id': 1, 'amount': decimal.Decimal('1.255')},
+    {'id': 1, 'tags': ['c']},
+    {'id': 1, 'nested': {'other': 1}},
+    {'id': 1, 'nested': {'at': '2017-02-30T00:00:00Z'}},
+    {'id': 1, 'either': 'y'},
+    [],
+]
+
+
+def error_of(validator, instance):
+    try:
+        validator.validate(instance)
+    except Exception as exc: # pylint: disable=broad-except
+        return type(exc), str(exc)
+    return None
+
+
+class TestCompiledValidator(unittest.TestCase):
+
+    def test_keywords_cover_draft4(self):
+        self.assertEqual(set(Draft4Validator.VALIDATORS),
+                         validation.SUPPORTED_KEYWORDS | validation.UNSUPPORTED_KEYWORDS)
+
+    def test_compiles_supported_schema(self):
+        self.assertIsInstance(build_validator(schema), validation.CompiledValidator)
+
+    def test_valid_records(self):
+        validator = build_validator(schema)
+        for record in valid:
+            validator.validate(record)
+        self.assertIsNone(validator.fallback)
+
+    def test_same_errors_as_jsonschema(self):
+        compiled = build_validator(schema)
+        for record in invalid:
+            expected = error_of(build_jsonschema_validator(schema), record)
+            self.assertIsNotNone(expected, record)
+            self.assertEqual(expected, error_of(compiled, record))
+
+    def test_date_time_parsed_once(self):
+        validator = build_validator(schema)
+        with mock.patch('singertools.validation.rfc3339_to_timestamp',
+                        wraps=validation.rfc3339_to_timestamp) as parse:
+            validator.validate({'id': 1, 'updated_at': '2017-01-01T00:00:00Z'})
+        self.assertEqual(1, parse.call_count)
+
+    def test_raises_inside_any_of_like_jsonschema(self):
+        # jsonschema checks every property of a failing anyOf branch, so it
+        # parses the date-time even though the branch has already failed
+        any_of = {'anyOf': [{'type': 'object',
+                             'properties': {'a': {'type': 'string'},
+                                            'at': {'format': 'date-time'}}},
+                            {}]}
+        record = {'a': 1, 'at': 'yesterday'}
+        compiled = build_validator(any_of)
+        self.assertEqual(error_of(build_jsonschema_validator(any_of), record),
+                         error_of(compiled, record))
+        self.assertIsNotNone(error_of(compiled, record))
+
+    def test_unsupported_keywords_use_jsonschema(self):
+        for unsupported in [{'type': 'object', 'patternProperties': {'^a': {}}},
+                            {'oneOf': [{'type': 'string'}]},
+                            {'$ref': '#/definitions/a', 'definitions': {'a': {}}},
+                            {'type': 'strange'}]:
+            with self.assertRaises(validation.UnsupportedSchema):
+                validation.compile_schema(unsupported)
+            self.assertNotIsInstance(build_validator(unsupported),
+                                     validation.CompiledValidator)
+
+    def test_unknown_format_is_ignored(self):
+        validator = build_validator({'type': 'string', 'format': 'singer.decimal'})
+        validator.validate('not a decimal')
+        with self.assertRaises(ValidationError):
+            validator.validate(1)